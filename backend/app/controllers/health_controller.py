@@ -1,5 +1,12 @@
-from app.models.health_model import HealthCheckResponse
+import asyncio
+import sqlite3
+
+from app.models.health_model import HealthCheckResponse, MetricsResponse, ReadinessResponse
 from app.utilities.logger import get_logger
+from app.utilities.metrics import get_metrics
+from app.utilities.warmup import get_warmup_state
+from app.utilities.youtube_quota import get_quota_meter
+from app.utilities.email_outbox import get_email_outbox
 
 
 def health_check() -> HealthCheckResponse:
@@ -21,3 +28,38 @@ def health_check() -> HealthCheckResponse:
     except Exception as e:
         logger.error("Health check failed")
         raise
+
+
+def readiness_check() -> ReadinessResponse:
+    """
+    Readiness endpoint handler
+    Returns:
+        ReadinessResponse: Whether warmup has finished, with per-step results
+    """
+    state = get_warmup_state()
+    return ReadinessResponse(
+        ready=state.ready,
+        steps=state.steps
+    )
+
+
+async def metrics() -> MetricsResponse:
+    """
+    Metrics endpoint handler
+    Returns:
+        MetricsResponse: Counters and timings for this worker process
+    """
+    logger = get_logger(__name__)
+    logger.debug("Metrics requested")
+    try:
+        # Quota usage is shared by all workers; refresh it even if this one made no calls.
+        # Both reads block (flock, SQLite), so they run in a thread
+        await asyncio.to_thread(get_quota_meter().usage)
+    except OSError as e:
+        logger.warning(f"Failed to read YouTube quota usage: {str(e)}")
+    try:
+        # Likewise the outbox backlog
+        await asyncio.to_thread(get_email_outbox().stats)
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to read email outbox stats: {str(e)}")
+    return MetricsResponse(**get_metrics().snapshot())
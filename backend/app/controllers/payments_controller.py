@@ -1,6 +1,9 @@
-from typing import List
-from fastapi import HTTPException, status, Request
+import html
+import time
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import List, Tuple
+from fastapi import HTTPException, status, Request
 
 import stripe
 
@@ -9,23 +12,33 @@ from app.models.payments_model import (
     CheckoutTokenRequest,
     CheckoutTokenResponse,
     CheckoutTokenData,
-    PdfAttachment, 
-    PROGRAM_PI_MAPPING,
-    FULFILLMENT_EMAIL_BODY 
+    FULFILLMENT_EMAIL_BODY,
+    FULFILLMENT_LINKS_EMAIL_BODY,
+    FULFILLMENT_LINK_ITEM,
+    PROGRAM_LINKS_MARKER,
+    LINKS_EXPIRE_MARKER
 )
 from app.utilities.logger import get_logger
-from app.utilities.doppler_utils import get_doppler_secret
 from app.utilities.hmac import generate_hmac_token, verify_hmac_token
-from app.utilities.helpers import get_cfg
+from app.utilities.settings import get_settings
 from app.utilities.email import send_email_util
+from app.utilities.catalog import get_catalog
+from app.utilities.program_assets import get_program_assets
+from app.utilities.download_links import create_download_url, verify_download_link
+from app.utilities.watermark import get_watermark_renderer, get_watermark_text
+from app.utilities.nonce_store import consume_nonce, NonceStoreFullError
+from app.utilities.stripe_client import StripeClient, get_stripe_api
 
 
-async def get_stripe_client():
+async def get_stripe_client() -> StripeClient:
     """
-    Get configured Stripe client with API key from Doppler and version from config.
+    Get the process-wide Stripe client, checking its API key is available.
+    
+    The API key (from Doppler) and version (from config) are passed with each
+    call, so nothing is assigned to the stripe module globals.
     
     Returns:
-        stripe: Configured Stripe client
+        StripeClient: Configured Stripe client
         
     Raises:
         HTTPException: If Stripe client initialization fails
@@ -33,15 +46,9 @@ async def get_stripe_client():
     logger = get_logger(__name__)
     
     try:
-        # Get API key from Doppler
-        stripe.api_key = await get_doppler_secret("STRIPE_SECRET_KEY")
-        
-        # Get API version from config file
-        cfg = get_cfg()
-        stripe.api_version = cfg.get('STRIPE', 'api_version')
-        
-        logger.debug(f"Initialized Stripe client with API version: {stripe.api_version}")
-        return stripe
+        stripe_client = get_stripe_api()
+        await stripe_client.load()
+        return stripe_client
     except Exception as e:
         logger.error(f"Failed to initialize Stripe client: {str(e)}")
         raise HTTPException(
@@ -52,7 +59,10 @@ async def get_stripe_client():
 
 async def get_token_data(token: str) -> CheckoutTokenData:
     """
-    Get and validate token data from an HMAC token.
+    Get and validate token data from an HMAC token, consuming the token.
+    
+    Tokens are single-use: once a token has been validated here, presenting
+    it again is rejected.
     
     Args:
         token: The HMAC token
@@ -76,9 +86,22 @@ async def get_token_data(token: str) -> CheckoutTokenData:
                 detail="Token has expired"
             )
         
+        if not consume_nonce(token_dict['nonce'], token_data.expires_at):
+            logger.warning("Token validation failed: token already used")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has already been used"
+            )
+        
         return token_data
     except HTTPException:
         raise
+    except NonceStoreFullError as e:
+        logger.error("Token validation failed: nonce store is full")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Checkout is temporarily unavailable, please try again"
+        ) from e
     except Exception as e:
         logger.error(f"Token validation failed: {str(e)}")
         raise HTTPException(
@@ -156,7 +179,7 @@ async def create_checkout_session(
         token_data = await get_token_data(token)
         
         # Get the configured Stripe client
-        stripe = await get_stripe_client()
+        stripe_client = await get_stripe_client()
         
         # Get the price_ids from the token data 
         price_ids = token_data.price_ids
@@ -172,13 +195,21 @@ async def create_checkout_session(
         } for price_id in price_ids]
 
         # Save file names of the programs based on price_id to fulfill later 
+        catalog = get_catalog()
         fulfillment_dict = {}
         for i, price_id in enumerate(price_ids):
-            fulfillment_dict[str(i)] = PROGRAM_PI_MAPPING[price_id]
+            program = catalog.get_program(price_id)
+            if program is None:
+                # The catalog was reloaded without this price since the token was issued
+                logger.warning(f"Price ID no longer in catalog - Price ID: {price_id}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid price ID: {price_id}"
+                )
+            fulfillment_dict[str(i)] = program.file_name
         
         # Get payment method configuration ID from config
-        cfg = get_cfg()
-        payment_method_config_id = cfg.get('STRIPE', 'payment_method_configuration_id')
+        payment_method_config_id = get_settings().stripe.payment_method_configuration_id
         
         # Create a new checkout session with Stripe
         session_params = {
@@ -192,8 +223,8 @@ async def create_checkout_session(
             }
         }
         
-        # Create the Stripe checkout session
-        session = stripe.checkout.Session.create(**session_params)
+        # Create the Stripe checkout session off the event loop
+        session = await stripe_client.call(stripe.checkout.Session.create, **session_params)
         
         logger.info(f"Created checkout session - Session ID: {session.id}")
         
@@ -222,22 +253,30 @@ async def create_checkout_session(
 
 async def handle_webhook(request: Request) -> None:
     """
-    Process a Stripe webhook event in the background.
+    Process a verified Stripe webhook event.
     
     This function processes the webhook event that has already been verified
     by the router. The event object is expected to be stored in request.state.
     
+    Events that are only logged are always acknowledged; a failure to fulfill
+    a payment is raised so the router answers with a 5xx and Stripe redelivers
+    the event.
+    
     Args:
         request: The incoming webhook request with the Stripe event in request.state.event
+        
+    Raises:
+        Exception: If a payment_intent.succeeded event could not be fulfilled
     """
     logger = get_logger(__name__)
+    event = None
     
     try:
         # Get the event from request state (already verified in the router)
         event = request.state.event
         
         logger.info(
-            f"Processing webhook event in background - Event ID: {event.id}, Type: {event.type}, Live Mode: {event.livemode}"
+            f"Processing webhook event - Event ID: {event.id}, Type: {event.type}, Live Mode: {event.livemode}"
         )
         
         # Handle the event based on its type
@@ -299,6 +338,8 @@ async def handle_webhook(request: Request) -> None:
             f"Error: {str(e)}, "
             f"Error Type: {type(e).__name__}"
         )
+        if getattr(event, 'type', None) == 'payment_intent.succeeded':
+            raise
 
 
 async def handle_payment_intent_succeeded(payment_intent: stripe.PaymentIntent) -> None:
@@ -334,48 +375,73 @@ async def handle_payment_intent_succeeded(payment_intent: stripe.PaymentIntent)
         # Get the email
         customer_email = payment_intent.receipt_email
 
-        # Get the current directory and construct the programs directory path
-        current_dir = Path(__file__).parent
-        programs_dir = current_dir.parent / "static" / "programs"
-        
-        # Create PdfAttachment objects for each program file
-        pdf_attachments = []
+        # Collect the program files to deliver; attachments are queued as references
+        # and streamed from the shared program asset cache on delivery
+        catalog = get_catalog()
+        program_assets = get_program_assets()
+        program_files = []
         for file_name in payment_intent.metadata.values():
-            file_path = programs_dir / file_name
-            if not file_path.exists():
-                logger.warning(f"Program file not found - Path: {file_path}, File: {file_name}, Payment Intent ID: {payment_intent.id}")
+            program = catalog.get_program_by_file(file_name)
+            if program is None:
+                logger.warning(f"Unknown program file in metadata - File: {file_name}, Payment Intent ID: {payment_intent.id}")
                 continue
             try:
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                    pdf_attachment = PdfAttachment(
-                        filename=file_name,
-                        content=content,
-                        content_type="application/pdf"
-                    )
-                    pdf_attachments.append(pdf_attachment)
-                    logger.info(f"Added program file for delivery - File: {file_name}, Payment Intent ID: {payment_intent.id}")
-            except Exception as e:
-                logger.error(f"Error reading program file - Path: {file_path}, Error: {str(e)}")
+                await program_assets.get_async(file_name)
+            except OSError as e:
+                logger.warning(f"Program file not available - Path: {program.pdf_path}, File: {file_name}, Payment Intent ID: {payment_intent.id}, Error: {str(e)}")
                 continue
+            program_files.append(file_name)
+            logger.info(f"Added program file for delivery - File: {file_name}, Payment Intent ID: {payment_intent.id}")
         
-        if not pdf_attachments:
+        if not program_files:
             logger.error(f"No valid program files found for delivery - Payment Intent ID: {payment_intent.id}")
             raise ValueError("No valid program files found for delivery")
         
-        # Send email with attached programs
-        email_body = FULFILLMENT_EMAIL_BODY
-        
-        await send_email_util(
-            name="Brawny Originals Customer",
-            email=customer_email,
-            message=email_body,
-            files=pdf_attachments,
-            mode="fulfillment",
-            is_html=True
-        )
+        # Stamped on every page of the delivered copies when watermarking is enabled
+        watermark = get_watermark_text(customer_email, payment_intent.id)
+        fulfillment_settings = get_settings().fulfillment
+        if fulfillment_settings.delivery == "link":
+            # Queue email with signed download links; the PDFs never go through Mailgun.
+            # The links name the stamped copies by their render key; the outbox sender
+            # renders them before the email goes out, so the webhook never waits on it
+            expires_at = int(time.time()) + fulfillment_settings.link_lifetime
+            renderer = get_watermark_renderer()
+            links = []
+            for file_name in program_files:
+                render_id = renderer.render_key(await program_assets.get_async(file_name), watermark) if renderer.enabled else None
+                url = await create_download_url(file_name, expires_at, render_id)
+                links.append(FULFILLMENT_LINK_ITEM.format(
+                    name=html.escape(catalog.get_program_by_file(file_name).name.replace("_", " ")),
+                    url=html.escape(url)
+                ))
+            expires_on = datetime.fromtimestamp(expires_at, timezone.utc).strftime("%B %d, %Y")
+            email_body = (
+                FULFILLMENT_LINKS_EMAIL_BODY
+                .replace(PROGRAM_LINKS_MARKER, "\n".join(links))
+                .replace(LINKS_EXPIRE_MARKER, expires_on)
+            )
+            await send_email_util(
+                name="Brawny Originals Customer",
+                email=customer_email,
+                message=email_body,
+                watermark=watermark if renderer.enabled else None,
+                linked_files=program_files,
+                mode="fulfillment",
+                is_html=True
+            )
+        else:
+            # Queue email with attached programs
+            await send_email_util(
+                name="Brawny Originals Customer",
+                email=customer_email,
+                message=FULFILLMENT_EMAIL_BODY,
+                program_files=program_files,
+                watermark=watermark,
+                mode="fulfillment",
+                is_html=True
+            )
         
-        logger.info(f"Successfully sent programs to customer - Payment Intent ID: {payment_intent.id}, Email: {customer_email}")
+        logger.info(f"Queued programs for delivery to customer - Payment Intent ID: {payment_intent.id}, Email: {customer_email}")
         
     except Exception as e:
         logger.error(
@@ -384,3 +450,53 @@ async def handle_payment_intent_succeeded(payment_intent: stripe.PaymentIntent)
             f"Error: {str(e)}"
         )
         raise
+
+
+async def get_program_download(token: str, file_name: str) -> Tuple[Path, str]:
+    """
+    Resolve a signed download link to the program file it grants.
+    
+    Args:
+        token: Token from the download link
+        file_name: Program PDF file name from the download link
+        
+    Returns:
+        Tuple[Path, str]: The file to serve (the buyer's watermarked copy if
+        the link has one) and its ETag
+        
+    Raises:
+        HTTPException: If the link is invalid or expired (403) or the file is unavailable (404)
+    """
+    logger = get_logger(__name__)
+    
+    try:
+        _, render_id = await verify_download_link(token, file_name)
+    except ValueError as e:
+        logger.warning(f"Rejected download link - File: {file_name}, Reason: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired download link"
+        )
+    except RuntimeError as e:
+        logger.error(f"Failed to verify download link: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server configuration error"
+        )
+    
+    try:
+        asset = await get_program_assets().get_async(file_name)
+    except (KeyError, OSError) as e:
+        logger.error(f"Program file not available for download - File: {file_name}, Error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    if render_id is not None:
+        path = get_watermark_renderer().get_path(render_id, file_name)
+        if path.exists():
+            return path, f'"{render_id.hex()}"'
+        # Lost with the state directory: still serve the purchase, unstamped
+        logger.warning(f"Watermarked copy missing, serving unstamped file - File: {file_name}, Render ID: {render_id.hex()}")
+    return asset.path, asset.etag
@@ -1,10 +1,22 @@
-from typing import Dict, Any
+import asyncio
+import hmac
+from typing import Dict, Any, Optional, Tuple
 
 from fastapi import HTTPException, status
 
-from app.models.utility_model import SendContactEmailResponse, VideoResponse
+from app.models.utility_model import LatestFeedResponse, SendContactEmailResponse, VideoResponse
+from app.utilities.http_caching import make_etag
 from app.utilities.logger import get_logger
-from app.utilities.youtube_utils import get_latest_short, get_latest_video
+from app.utilities.youtube_utils import (
+    CHANNEL_NAME,
+    get_latest_short,
+    get_latest_video,
+    get_youtube_channel_cache,
+    handle_upload_notification,
+    resolve_channel
+)
+from app.utilities.websub import derive_verify_token, get_topic_url, get_websub_secret, parse_notification, verify_signature
+from app.utilities.metrics import increment
 from app.utilities.email import send_email_util
 
 
@@ -102,6 +114,185 @@ def scrape_latest_tiktok_video() -> Dict[str, Any]:
         raise
 
 
+FEED_SOURCES = ("youtube", "short", "tiktok")
+
+
+class _FeedBodyCache:
+    """Last rendered feed body, reused while the videos it lists are unchanged"""
+    key: Optional[Tuple] = None
+    body: bytes = b""
+    etag: str = ""
+
+
+async def get_latest_feed() -> LatestFeedResponse:
+    """
+    Fetch the latest YouTube video, YouTube short and TikTok video concurrently.
+    
+    A source that fails is left empty and listed in errors, so the other
+    videos are still returned.
+    
+    Returns:
+        LatestFeedResponse: Object containing the available videos
+    """
+    logger = get_logger(__name__)
+    logger.info("Fetching latest videos feed")
+    
+    async def scrape_tiktok() -> VideoResponse:
+        return scrape_latest_tiktok_video()
+    
+    results = await asyncio.gather(
+        scrape_latest_youtube_video(),
+        scrape_latest_youtube_short(),
+        scrape_tiktok(),
+        return_exceptions=True
+    )
+    
+    feed: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for source, result in zip(FEED_SOURCES, results):
+        if isinstance(result, BaseException):
+            logger.warning(f"Latest feed source failed - Source: {source}, Error: {str(result)}")
+            errors[source] = getattr(result, "detail", None) or "Video not available"
+        else:
+            feed[source] = result
+    return LatestFeedResponse(**feed, errors=errors)
+
+
+def render_latest_feed(feed: LatestFeedResponse) -> Tuple[bytes, str]:
+    """
+    Serialize a feed to its JSON body and ETag, reusing the previous body if unchanged.
+    
+    Args:
+        feed: Feed to render
+        
+    Returns:
+        Tuple of (JSON body, ETag)
+    """
+    key = tuple(
+        getattr(feed, source).video_id if getattr(feed, source) else "" for source in FEED_SOURCES
+    ) + tuple(sorted(feed.errors.items()))
+    if _FeedBodyCache.key != key:
+        body = feed.model_dump_json().encode('utf-8')
+        etag = make_etag(*(str(part) for part in key))
+        # Swap in body and ETag together
+        _FeedBodyCache.key, _FeedBodyCache.body, _FeedBodyCache.etag = key, body, etag
+    return _FeedBodyCache.body, _FeedBodyCache.etag
+
+
+async def verify_youtube_websub(
+    mode: str,
+    topic: str,
+    challenge: Optional[str],
+    verify_token: Optional[str],
+    lease_seconds: Optional[int] = None
+) -> str:
+    """
+    Answer a WebSub hub's verification of our upload feed subscription.
+    
+    Args:
+        mode: hub.mode (subscribe, unsubscribe or denied)
+        topic: hub.topic being verified
+        challenge: hub.challenge to echo back
+        verify_token: hub.verify_token sent with our subscription request
+        lease_seconds: hub.lease_seconds granted by the hub
+        
+    Returns:
+        str: The challenge to echo back (empty for a denial)
+        
+    Raises:
+        HTTPException: 404 if we did not ask for this subscription
+    """
+    logger = get_logger(__name__)
+    
+    if mode == "denied":
+        logger.warning(f"WebSub subscription denied by hub - Topic: {topic}")
+        increment("websub.denied")
+        return ""
+    
+    if mode not in ("subscribe", "unsubscribe") or not challenge:
+        logger.warning(f"Rejected WebSub verification - Mode: {mode}, Topic: {topic}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown subscription"
+        )
+    
+    try:
+        secret = await get_websub_secret()
+    except Exception as e:
+        logger.error(f"Failed to get WebSub secret: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server configuration error: Missing WebSub secret"
+        )
+    
+    # Unauthenticated endpoint: only compare against the cached channel, never
+    # resolve it here (that would spend YouTube quota on every request)
+    channel = get_youtube_channel_cache().get(CHANNEL_NAME, allow_stale=True)
+    if (
+        not hmac.compare_digest(
+            (verify_token or "").encode('utf-8'),
+            derive_verify_token(secret, topic).encode('ascii')
+        )
+        or not channel
+        or topic != get_topic_url(channel['channel_id'])
+    ):
+        logger.warning(f"Rejected WebSub verification - Mode: {mode}, Topic: {topic}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown subscription"
+        )
+    
+    logger.info(f"Verified WebSub {mode} - Topic: {topic}, Lease: {lease_seconds}s")
+    increment(f"websub.verified.{mode}")
+    return challenge
+
+
+async def handle_youtube_websub_notification(body: bytes, signature: Optional[str]) -> None:
+    """
+    Handle a WebSub notification about the channel's uploads.
+    
+    Notifications with a missing or wrong signature are ignored (the hub
+    still gets a 2xx, as WebSub requires).
+    
+    Args:
+        body: Raw Atom notification body
+        signature: X-Hub-Signature header value
+        
+    Raises:
+        HTTPException: If the WebSub secret is not configured
+    """
+    logger = get_logger(__name__)
+    
+    try:
+        secret = await get_websub_secret()
+    except Exception as e:
+        logger.error(f"Failed to get WebSub secret: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server configuration error: Missing WebSub secret"
+        )
+    
+    if not verify_signature(secret, body, signature):
+        logger.warning("Ignoring WebSub notification with invalid signature")
+        increment("websub.invalid_signature")
+        return
+    
+    try:
+        videos = parse_notification(body)
+    except ValueError as e:
+        logger.warning(f"Ignoring malformed WebSub notification: {str(e)}")
+        return
+    
+    channel = await resolve_channel()
+    video_ids = [
+        video['video_id'] for video in videos
+        if video['deleted'] or not channel or video['channel_id'] == channel['channel_id']
+    ]
+    invalidated = handle_upload_notification(video_ids)
+    increment("websub.notification")
+    logger.info(f"Handled WebSub notification - Videos: {video_ids}, Invalidated: {invalidated}")
+
+
 async def send_contact_email(name: str, email: str, message: str) -> Dict[str, Any]:
     """
     Send email to the specified email address.
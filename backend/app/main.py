@@ -2,6 +2,7 @@
 Main FastAPI application setup and configuration.
 """
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 import logging
 
@@ -17,6 +18,63 @@ from app.routers import core_router, health_router, utility_router, payments_rou
 from app.models.core_model import ErrorResponse
 from app.utilities.helpers import is_dev, is_prod, is_valid_environment
 from app.utilities.logger import init_logger
+from app.utilities.doppler_utils import DopplerSecrets
+from app.utilities.youtube_utils import get_latest_video, get_latest_short, get_youtube_refresher
+from app.utilities.warmup import run_warmup
+from app.utilities.http_clients import get_http_client_manager
+from app.utilities.websub import get_websub_subscriber
+from app.utilities.email_outbox import get_email_outbox
+from app.utilities.email import deliver_queued_email
+from app.utilities.watermark import get_watermark_renderer
+from app.utilities.settings import get_settings, install_reload_signal_handler
+from app.utilities.program_assets import preload_program_assets
+from app.utilities.keyring import load_keyring
+from app.controllers.payments_controller import get_stripe_client
+from app.utilities.stripe_client import get_stripe_api
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: warm up dependencies before the worker takes traffic.
+    """
+    install_reload_signal_handler()
+    http_clients = get_http_client_manager()
+    await run_warmup({
+        "http_pools": http_clients.warm_up,
+        "doppler": DopplerSecrets.get_instance().refresh,
+        "hmac_keyring": load_keyring,
+        "stripe": get_stripe_client,
+        "youtube_video": get_latest_video,
+        "youtube_short": get_latest_short,
+        "program_files": preload_program_assets,
+    })
+    
+    # Keep the YouTube cache fresh off the request path
+    youtube_refresher = get_youtube_refresher()
+    youtube_refresher.start()
+    
+    # Get pushed new uploads instead of waiting for the next refresh (one worker subscribes)
+    websub_subscriber = get_websub_subscriber()
+    if get_settings().websub.enabled:
+        websub_subscriber.start()
+    
+    # Deliver queued email, including messages left over from before a restart
+    email_outbox = get_email_outbox()
+    email_outbox.start(deliver_queued_email)
+    
+    # Start the watermark processes now rather than on the first order
+    watermark_renderer = get_watermark_renderer()
+    watermark_renderer.start()
+    
+    yield
+    
+    await email_outbox.stop()
+    await watermark_renderer.close()
+    await websub_subscriber.stop()
+    await youtube_refresher.stop()
+    await get_stripe_api().close()
+    await http_clients.close()
 
 
 def create_app() -> FastAPI:
@@ -37,6 +95,7 @@ def create_app() -> FastAPI:
         version="1.0.0",
         docs_url="/api/docs" if is_dev() else None,
         redoc_url="/api/redoc" if is_dev() else None,
+        lifespan=lifespan,
     )
     
     
@@ -1,3 +1,5 @@
+from typing import Dict, Any
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,24 @@ class HealthCheckResponse(BaseModel):
     """Response model for health check endpoint"""
     status: str
     message: str
+
+
+class ReadinessResponse(BaseModel):
+    """Response model for readiness endpoint"""
+    ready: bool
+    steps: Dict[str, Dict[str, Any]]
+
+
+class TimingSummary(BaseModel):
+    """Summary of a recorded timing metric (seconds)"""
+    count: int
+    total: float
+    max: float
+    last: float
+    avg: float
+
+
+class MetricsResponse(BaseModel):
+    """Response model for metrics endpoint"""
+    counters: Dict[str, int]
+    timings: Dict[str, TimingSummary]
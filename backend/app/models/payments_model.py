@@ -1,40 +1,29 @@
 from pydantic import BaseModel, HttpUrl, field_validator
 from typing import List, Dict, Any, Literal
 from datetime import datetime, timezone
-from app.utilities.helpers import get_cfg
+from app.utilities.catalog import get_catalog
 
 
 # Helpers
 
-def _get_valid_price_ids() -> List[str]:
-    """Get valid price IDs from config.
-    
-    Returns:
-        List of valid price IDs from the configuration
-    """
-    cfg = get_cfg()
-    price_ids_str = cfg.get('STRIPE', 'valid_price_ids', fallback='')
-    return [pid.strip() for pid in price_ids_str.split(',') if pid.strip()]
-
-
 def _validate_price_ids(price_ids: List[str]) -> List[str]:
-    """Validate a price ID against the configured valid price IDs.
+    """Validate price IDs against the product catalog.
     
     Args:
-        price_id: The price ID to validate
+        price_ids: The price IDs to validate
         
     Returns:
-        The validated price ID if valid
+        The validated price IDs if valid
         
     Raises:
-        ValueError: If the price ID is not in the valid list or if no valid IDs are configured
+        ValueError: If a price ID is not in the catalog or if no valid IDs are configured
     """
-    valid_ids = _get_valid_price_ids()
-    if not valid_ids:
+    catalog = get_catalog()
+    if not catalog.valid_price_ids:
         raise ValueError('No valid price IDs configured')
     for price_id in price_ids:
-        if price_id not in valid_ids:
-            raise ValueError(f'Invalid price ID: {price_id}. Must be one of {valid_ids}')
+        if price_id not in catalog.valid_price_ids:
+            raise ValueError(f'Invalid price ID: {price_id}. Must be one of {list(catalog.price_ids)}')
     return price_ids 
 
 
@@ -135,16 +124,7 @@ class PdfAttachment(BaseModel):
     content_type: Literal['application/pdf']
 
 
-# NOTE: Update regularly as is required for payment intent fulfillment
-PROGRAM_PI_MAPPING = {
-    "price_1ScWdxK5tsm2JTU1Zogy9QKZ": "Program_Blue.pdf",  # Development
-    "price_1Sf0Jj2cxMNEOVDK1vgR9A6A": "Program_Blue.pdf",  # Production
-    "price_1ScWd9K5tsm2JTU1tjTXlwc8": "Program_Genesis.pdf",  # Development
-    "price_1Sf0Js2cxMNEOVDKqVYTmhvZ": "Program_Genesis.pdf"  # Production
-}
-
-
-FULFILLMENT_EMAIL_BODY = """
+_FULFILLMENT_EMAIL_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -212,9 +192,7 @@ FULFILLMENT_EMAIL_BODY = """
         
         <div class="content">
             <h2>Thank you for your purchase!</h2>
-            <p>Your order has been processed and we are excited to provide you with the following program(s) attached to help you on your fitness journey.</p>
-            
-            <p>To get started, simply download the attached program files. Each program includes detailed instructions and workout plans to help you achieve your fitness goals.</p>
+            <!-- DELIVERY -->
             
             <p>If you have any questions about your programs or need assistance, please visit our <a href="https://www.brawnyoriginals.com/#/contact">contact page</a> to get in touch with our support team.</p>
             
@@ -232,3 +210,23 @@ FULFILLMENT_EMAIL_BODY = """
     </body>
     </html>
 """
+
+_DELIVERY_MARKER = "<!-- DELIVERY -->"
+
+# Programs sent as attachments
+FULFILLMENT_EMAIL_BODY = _FULFILLMENT_EMAIL_TEMPLATE.replace(_DELIVERY_MARKER, """<p>Your order has been processed and we are excited to provide you with the following program(s) attached to help you on your fitness journey.</p>
+            
+            <p>To get started, simply download the attached program files. Each program includes detailed instructions and workout plans to help you achieve your fitness goals.</p>""")
+
+# Programs sent as download links; PROGRAM_LINKS_MARKER is replaced with
+# FULFILLMENT_LINK_ITEM entries and LINKS_EXPIRE_MARKER with the expiry date
+PROGRAM_LINKS_MARKER = "<!-- PROGRAM_LINKS -->"
+LINKS_EXPIRE_MARKER = "<!-- LINKS_EXPIRE -->"
+FULFILLMENT_LINKS_EMAIL_BODY = _FULFILLMENT_EMAIL_TEMPLATE.replace(_DELIVERY_MARKER, """<p>Your order has been processed and we are excited to provide you with the following program(s) to help you on your fitness journey.</p>
+            
+            <ul class="program-list">
+                <!-- PROGRAM_LINKS -->
+            </ul>
+            
+            <p>To get started, simply download your program files using the links above. Each program includes detailed instructions and workout plans to help you achieve your fitness goals. The download links are valid until <!-- LINKS_EXPIRE -->, so please save the files to your device.</p>""")
+FULFILLMENT_LINK_ITEM = """<li class="program-item"><strong>{name}</strong><br><a class="button" href="{url}">Download</a></li>"""
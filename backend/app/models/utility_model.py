@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from pydantic import BaseModel, EmailStr
 
 
@@ -18,6 +20,14 @@ class VideoResponse(BaseModel):
     video_id: str
 
 
+class LatestFeedResponse(BaseModel):
+    """Response model for the aggregated latest videos endpoint"""
+    youtube: Optional[VideoResponse] = None
+    short: Optional[VideoResponse] = None
+    tiktok: Optional[VideoResponse] = None
+    errors: Dict[str, str] = {}  # Source -> reason, for sources that could not be loaded
+
+
 class SendContactEmailResponse(BaseModel):
     """Response model for sending email endpoints"""
     status: str
@@ -1,7 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
 
 import app.controllers.health_controller as hc
-from app.models.health_model import HealthCheckResponse
+from app.models.health_model import HealthCheckResponse, MetricsResponse, ReadinessResponse
 from app.utilities.logger import get_logger
 
 router = APIRouter()
@@ -28,3 +28,47 @@ async def health_check():
     except Exception as e:
         logger.error("Health check endpoint failed")
         raise
+
+
+@router.get(
+    "/ready",
+    response_model=ReadinessResponse,
+    status_code=200,
+    responses={503: {"model": ReadinessResponse}},
+    tags=["Health"]
+)
+async def readiness_check(response: Response):
+    """
+    Readiness endpoint
+    Returns:
+        ReadinessResponse: 200 once warmup has finished, 503 until then
+    """
+    logger = get_logger(__name__)
+    
+    result = hc.readiness_check()
+    if not result.ready:
+        logger.info("Readiness check requested before warmup finished")
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
+
+
+@router.get(
+    "/metrics",
+    response_model=MetricsResponse,
+    status_code=200,
+    tags=["Health"]
+)
+async def metrics():
+    """
+    Metrics endpoint
+    Returns:
+        MetricsResponse: Counters and timings for the worker serving the request
+    """
+    logger = get_logger(__name__)
+    logger.debug("Metrics endpoint called")
+    
+    try:
+        return await hc.metrics()
+    except Exception as e:
+        logger.error("Metrics endpoint failed")
+        raise
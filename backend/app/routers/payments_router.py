@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Request, status, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, Response, status, HTTPException
+from fastapi.responses import FileResponse
 import stripe
 
 from app.utilities.rate_limiter import limiter
@@ -13,6 +14,7 @@ from app.models.payments_model import (
 from app.utilities.logger import get_logger
 from app.utilities.recaptcha import verify_recaptcha_token
 from app.utilities.doppler_utils import get_doppler_secret
+from app.utilities.http_caching import etag_matches
 
 
 router = APIRouter()
@@ -159,17 +161,18 @@ async def create_checkout_session(
     status_code=status.HTTP_200_OK,
     include_in_schema=False,  # Exclude from OpenAPI schema as it's a webhook
     summary="Stripe webhook handler",
-    description="Handles incoming webhook events from Stripe asynchronously."
+    description="Handles incoming webhook events from Stripe."
 )
-async def webhook_handler(background_tasks: BackgroundTasks, request: Request) -> WebhookResponse:
+async def webhook_handler(request: Request) -> WebhookResponse:
     """
-    Handle incoming webhook events from Stripe asynchronously.
+    Handle incoming webhook events from Stripe.
     
-    This endpoint quickly acknowledges receipt of webhook events from Stripe
-    and processes them in the background to ensure timely responses.
+    The event is processed before the response is sent: fulfillment only
+    queues the email in the durable outbox, so this stays fast. If the email
+    cannot be queued the handler answers with a 500, and Stripe redelivers
+    the event (as it does if the worker dies before acknowledging it).
     
     Args:
-        background_tasks: FastAPI's BackgroundTasks for async processing
         request: The incoming HTTP request containing the webhook event
         
     Returns:
@@ -188,7 +191,7 @@ async def webhook_handler(background_tasks: BackgroundTasks, request: Request) -
         
         try:
             event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
-            # Store the event for future processing in the background task
+            # Store the event for the controller
             request.state.event = event
         except ValueError as e:
             logger.warning("Invalid Stripe webhook payload")
@@ -197,10 +200,9 @@ async def webhook_handler(background_tasks: BackgroundTasks, request: Request) -
             logger.warning("Invalid Stripe signature")
             raise HTTPException(status_code=400, detail="Invalid signature") from e
         
-        # Queue the webhook processing in the background
-        background_tasks.add_task(payments_controller.handle_webhook, request)
+        # Process the event; emails are queued in the outbox and sent by its senders
+        await payments_controller.handle_webhook(request)
         
-        # Return immediate response
         return WebhookResponse(
             received=True,
             event_type=event.type,
@@ -209,7 +211,7 @@ async def webhook_handler(background_tasks: BackgroundTasks, request: Request) -
     except HTTPException:
         raise
     except Exception as e:
-        logger.error("Unexpected error in webhook handler")
+        logger.error(f"Unexpected error in webhook handler - Error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -222,3 +224,46 @@ async def webhook_handler(background_tasks: BackgroundTasks, request: Request) -
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process webhook"
         )
+
+
+@router.api_route(
+    "/payments/downloads/{token}/{file_name}",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    include_in_schema=False,  # Only reachable through emailed links
+    summary="Download a purchased program"
+)
+@limiter.limit("60/minute")
+async def download_program(request: Request, token: str, file_name: str):
+    """
+    Serve a purchased program PDF through a signed, expiring download link.
+    
+    The file is sent by FileResponse: with Range/If-Range support so interrupted
+    downloads resume, and as a zero-copy sendfile when the server supports the
+    ASGI pathsend extension.
+    
+    Args:
+        request: The incoming request (used for IP-based rate limiting)
+        token: Signed token from the link
+        file_name: Program PDF file name
+        
+    Returns:
+        FileResponse: The PDF, or 304 if the client's copy is current
+        
+    Raises:
+        HTTPException: If the link is invalid or expired, or the file is unavailable
+    """
+    path, etag = await payments_controller.get_program_download(token, file_name)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=3600",
+        "X-Robots-Tag": "noindex",
+    }
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename=file_name,
+        headers=headers
+    )
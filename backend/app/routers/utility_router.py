@@ -1,9 +1,15 @@
 import traceback
-from fastapi import APIRouter, HTTPException, status, Request
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status, Request, Response, Query
+from fastapi.responses import PlainTextResponse
 
 import app.controllers.utility_controller as uc
-from app.models.utility_model import VideoResponse, SendContactEmailResponse, SendContactEmailRequest
+from app.models.utility_model import LatestFeedResponse, VideoResponse, SendContactEmailResponse, SendContactEmailRequest
 from app.utilities.logger import get_logger
+from app.utilities.http_caching import cache_headers, etag_matches, make_etag
+from app.utilities.settings import get_settings
+from app.utilities.youtube_utils import get_cache_lifetime
 from app.utilities.recaptcha import verify_recaptcha_token
 from app.utilities.rate_limiter import limiter
 
@@ -11,20 +17,64 @@ from app.utilities.rate_limiter import limiter
 router = APIRouter()
 
 
+def _cacheable(
+    request: Request,
+    response: Response,
+    result: VideoResponse,
+    max_age: int,
+    stale_while_revalidate: int
+):
+    """Add ETag/Cache-Control to a video response, or answer 304 if the client's copy is current"""
+    etag = make_etag(result.video_id)
+    headers = cache_headers(etag, max_age, stale_while_revalidate)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return result
+
+
+@router.get(
+    "/latest",
+    response_model=LatestFeedResponse,
+    status_code=200,
+    responses={304: {"description": "Not modified"}},
+    tags=["Utility"]
+)
+async def retrieve_latest_feed(request: Request):
+    """Retrieve the latest YouTube video, YouTube short and TikTok video in one response"""
+    logger = get_logger(__name__)
+    logger.info("Fetching latest videos feed")
+    feed = await uc.get_latest_feed()
+    body, etag = uc.render_latest_feed(feed)
+    if feed.errors:
+        # Partial results: let clients retry right away
+        max_age, stale_while_revalidate = 0, 0
+    else:
+        lifetimes = [get_cache_lifetime('video'), get_cache_lifetime('short')]
+        max_age = min(lifetime[0] for lifetime in lifetimes)
+        stale_while_revalidate = min(lifetime[1] for lifetime in lifetimes)
+    headers = cache_headers(etag, max_age, stale_while_revalidate)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    logger.debug(f"Returning latest videos feed - Errors: {list(feed.errors)}")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get(
     "/latest/youtube",
     response_model=VideoResponse,
     status_code=200,
+    responses={304: {"description": "Not modified"}},
     tags=["Utility"]
 )
-async def retrieve_latest_youtube_video():
+async def retrieve_latest_youtube_video(request: Request, response: Response):
     """Retrieve the latest YouTube video"""
     logger = get_logger(__name__)
     logger.info("Fetching latest YouTube video")
     try:
         result = await uc.scrape_latest_youtube_video()
         logger.debug(f"Successfully fetched YouTube video - Video ID: {result.video_id}")
-        return result
+        return _cacheable(request, response, result, *get_cache_lifetime('video'))
     except Exception as e:
         logger.error("Failed to fetch YouTube video")
         raise
@@ -34,16 +84,17 @@ async def retrieve_latest_youtube_video():
     "/latest/short",
     response_model=VideoResponse,
     status_code=200,
+    responses={304: {"description": "Not modified"}},
     tags=["Utility"]
 )
-async def retrieve_latest_youtube_short():
+async def retrieve_latest_youtube_short(request: Request, response: Response):
     """Retrieve the latest YouTube short"""
     logger = get_logger(__name__)
     logger.info("Fetching latest YouTube short")
     try:
         result = await uc.scrape_latest_youtube_short()
         logger.debug(f"Successfully fetched YouTube short - Video ID: {result.video_id}")
-        return result
+        return _cacheable(request, response, result, *get_cache_lifetime('short'))
     except Exception as e:
         logger.error("Failed to fetch YouTube short")
         raise
@@ -53,21 +104,58 @@ async def retrieve_latest_youtube_short():
     "/latest/tiktok",
     response_model=VideoResponse,
     status_code=200,
+    responses={304: {"description": "Not modified"}},
     tags=["Utility"]
 )
-async def retrieve_latest_tiktok():
+async def retrieve_latest_tiktok(request: Request, response: Response):
     """Retrieve the latest TikTok video"""
     logger = get_logger(__name__)
     logger.info("Fetching latest TikTok video")
     try:
         result = uc.scrape_latest_tiktok_video()
         logger.debug(f"Successfully fetched TikTok video - Video ID: {result.video_id}")
-        return result
+        # Hardcoded for now, so it only changes on deploy
+        cache_ttl = get_settings().youtube.cache_ttl
+        return _cacheable(request, response, result, cache_ttl, cache_ttl)
     except Exception as e:
         logger.error("Failed to fetch TikTok video")
         raise
 
 
+@router.get(
+    "/websub/youtube",
+    response_class=PlainTextResponse,
+    status_code=200,
+    tags=["Utility"]
+)
+async def verify_youtube_websub(
+    mode: str = Query(..., alias="hub.mode"),
+    topic: str = Query(..., alias="hub.topic"),
+    challenge: Optional[str] = Query(None, alias="hub.challenge"),
+    verify_token: Optional[str] = Query(None, alias="hub.verify_token"),
+    lease_seconds: Optional[int] = Query(None, alias="hub.lease_seconds")
+):
+    """WebSub hub verification callback for the YouTube upload feed"""
+    logger = get_logger(__name__)
+    logger.info(f"WebSub verification request - Mode: {mode}")
+    challenge_response = await uc.verify_youtube_websub(mode, topic, challenge, verify_token, lease_seconds)
+    return PlainTextResponse(challenge_response)
+
+
+@router.post(
+    "/websub/youtube",
+    status_code=204,
+    tags=["Utility"]
+)
+async def receive_youtube_websub(request: Request):
+    """WebSub notification callback: refreshes the YouTube cache on new uploads"""
+    logger = get_logger(__name__)
+    logger.info("Received WebSub notification")
+    body = await request.body()
+    await uc.handle_youtube_websub_notification(body, request.headers.get("X-Hub-Signature"))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 @router.post(
     "/contact/email",
     response_model=SendContactEmailResponse,
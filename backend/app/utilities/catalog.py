@@ -0,0 +1,148 @@
+"""
+Product catalog: maps Stripe price IDs to the programs they fulfill.
+
+The catalog is built once from the settings and PROGRAM_PI_MAPPING and is
+immutable; when the settings are reloaded a new catalog is built and swapped
+in as a whole, so readers never see a half-updated catalog.
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict
+
+from app.utilities.logger import get_logger
+from app.utilities.settings import Settings, get_settings
+
+
+PROGRAMS_DIR = Path(__file__).parent.parent / "static" / "programs"
+
+# NOTE: Update regularly as is required for payment intent fulfillment
+PROGRAM_PI_MAPPING = {
+    "price_1ScWdxK5tsm2JTU1Zogy9QKZ": "Program_Blue.pdf",  # Development
+    "price_1Sf0Jj2cxMNEOVDK1vgR9A6A": "Program_Blue.pdf",  # Production
+    "price_1ScWd9K5tsm2JTU1tjTXlwc8": "Program_Genesis.pdf",  # Development
+    "price_1Sf0Js2cxMNEOVDKqVYTmhvZ": "Program_Genesis.pdf"  # Production
+}
+
+
+PRICE_TAG_SIZE = 4  # Bytes of a price ID's stable tag (see Catalog.tag_of)
+
+
+def derive_price_tag(price_id: str) -> bytes:
+    """Derive the stable short tag of a price ID"""
+    return hashlib.sha256(b"brawny-originals price:" + price_id.encode('utf-8')).digest()[:PRICE_TAG_SIZE]
+
+
+class Program(BaseModel):
+    """A purchasable program and the PDF delivered for it"""
+    model_config = ConfigDict(frozen=True)
+
+    name: str  # e.g. Program_Blue
+    file_name: str  # e.g. Program_Blue.pdf
+    pdf_path: Path
+
+
+class Catalog:
+    """
+    Immutable, indexed view of the sellable programs.
+    """
+
+    def __init__(self, price_ids: Tuple[str, ...], programs_by_price_id: Dict[str, Program]):
+        self.price_ids: Tuple[str, ...] = price_ids
+        self.valid_price_ids: FrozenSet[str] = frozenset(price_ids)
+        # Tags depend only on the price ID, so they survive reloads that reorder the config
+        self._tag_by_price_id: Dict[str, bytes] = {price_id: derive_price_tag(price_id) for price_id in price_ids}
+        self._price_id_by_tag: Dict[bytes, str] = {tag: price_id for price_id, tag in self._tag_by_price_id.items()}
+        if len(self._price_id_by_tag) != len(price_ids):
+            raise ValueError("Price ID tags collide; increase PRICE_TAG_SIZE")
+        self._by_price_id = programs_by_price_id
+        self._by_file_name: Dict[str, Program] = {
+            program.file_name: program for program in programs_by_price_id.values()
+        }
+        price_ids_by_program: Dict[str, Tuple[str, ...]] = {}
+        for price_id in price_ids:
+            name = programs_by_price_id[price_id].name
+            price_ids_by_program[name] = price_ids_by_program.get(name, ()) + (price_id,)
+        self._price_ids_by_program = price_ids_by_program
+
+    def is_valid_price_id(self, price_id: str) -> bool:
+        """Check if a price ID is sellable"""
+        return price_id in self.valid_price_ids
+
+    def tag_of(self, price_id: str) -> Optional[bytes]:
+        """Get the stable short tag of a price ID in the catalog (used for compact encodings)"""
+        return self._tag_by_price_id.get(price_id)
+
+    def price_id_for_tag(self, tag: bytes) -> Optional[str]:
+        """Get the price ID in the catalog with the given tag"""
+        return self._price_id_by_tag.get(tag)
+
+    def get_program(self, price_id: str) -> Optional[Program]:
+        """Get the program for a price ID"""
+        return self._by_price_id.get(price_id)
+
+    def get_program_by_file(self, file_name: str) -> Optional[Program]:
+        """Get the program delivered as the given PDF file name"""
+        return self._by_file_name.get(file_name)
+
+    def get_price_ids(self, program_name: str) -> Tuple[str, ...]:
+        """Get all price IDs that sell the given program"""
+        return self._price_ids_by_program.get(program_name, ())
+
+    @property
+    def programs(self) -> Tuple[Program, ...]:
+        """All distinct programs in the catalog"""
+        return tuple(self._by_file_name.values())
+
+
+def build_catalog(settings: Settings) -> Catalog:
+    """
+    Build a catalog from the configured valid price IDs.
+
+    Price IDs without a program mapping are left out, since they could not be
+    fulfilled.
+
+    Args:
+        settings: Application settings
+
+    Returns:
+        Catalog: The new catalog
+    """
+    logger = get_logger(__name__)
+    price_ids = []
+    programs: Dict[str, Program] = {}
+    for price_id in settings.stripe.valid_price_ids:
+        file_name = PROGRAM_PI_MAPPING.get(price_id)
+        if file_name is None:
+            logger.error(f"Configured price ID has no program mapping, skipping it: {price_id}")
+            continue
+        price_ids.append(price_id)
+        programs[price_id] = Program(
+            name=Path(file_name).stem,
+            file_name=file_name,
+            pdf_path=PROGRAMS_DIR / file_name
+        )
+    logger.debug(f"Built catalog - Price IDs: {price_ids}")
+    return Catalog(tuple(price_ids), programs)
+
+
+class _CatalogCache:
+    """Process-wide catalog, rebuilt whenever the settings object changes"""
+    catalog: Optional[Catalog] = None
+    settings: Optional[Settings] = None
+
+
+def get_catalog() -> Catalog:
+    """
+    Get the product catalog.
+
+    Returns:
+        Catalog: The current catalog
+    """
+    settings = get_settings()
+    if _CatalogCache.settings is not settings:
+        # Build fully, then swap both references
+        _CatalogCache.catalog = build_catalog(settings)
+        _CatalogCache.settings = settings
+    return _CatalogCache.catalog
@@ -1,24 +1,32 @@
+import asyncio
 import os
+import random
 import time
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 import httpx
 
 import requests
 from fastapi import HTTPException, status
 
 from app.utilities.logger import get_logger
-from app.utilities.helpers import get_cfg
+from app.utilities.settings import get_settings
+from app.utilities.metrics import increment, observe
+from app.utilities.http_clients import get_http_client
+from app.utilities.secrets_store import SharedSecretsStore
 
 
 class DopplerSecrets:
     """
     Singleton class to manage Doppler secrets with in-memory caching.
-    Automatically refreshes secrets when the cache expires.
+    Automatically refreshes secrets in the background when the cache expires,
+    serving the cached values until the refresh completes.
     """
     _instance: Optional['DopplerSecrets'] = None
     _secrets: Dict[str, str] = {}
     _last_fetch_time: float = 0
     _cache_ttl: int = 86400  # 24 hour TTL
+    _backoff_base: float = 5.0  # First retry delay after a failed refresh
+    _backoff_max: float = 300.0  # Cap on the retry delay
 
     def __init__(self):
         if self._instance is not None:
@@ -35,6 +43,10 @@ class DopplerSecrets:
 
     def _initialize(self):
         self._logger = get_logger(__name__)
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_listeners: List[Callable[[Dict[str, str]], None]] = []
+        self._failure_count = 0
+        self._next_retry_time: float = 0
         self.doppler_api_key = os.getenv("DOPPLER_API_KEY")
         
         if not self.doppler_api_key:
@@ -43,21 +55,28 @@ class DopplerSecrets:
             raise ValueError(error_msg)
         
         # Get config from config file
-        cfg = get_cfg()
-        
         try:
-            self.project = cfg.get("DOPPLER", "project")
-            self.config = cfg.get("DOPPLER", "config")
+            settings = get_settings()
+            self.project = settings.doppler.project
+            self.config = settings.doppler.config
         except Exception as e:
             self._logger.error(f"Failed to load Doppler config: {str(e)}")
             raise ValueError("Invalid Doppler configuration in config file") from e
         
+        # Snapshot shared with the other workers on this host
+        self._store = SharedSecretsStore(self.doppler_api_key)
+        
         self._logger.debug(f"Doppler client initialized - Project: {self.project}, Config: {self.config}")
 
     async def get_secret(self, secret_name: str) -> str:
         """
         Get a secret from Doppler with caching.
         
+        Once secrets have been loaded, this never waits on Doppler: expired
+        secrets are served stale while a single background refresh runs.
+        Only a cold start (no secrets loaded yet) waits, and all concurrent
+        cold callers share the same in-flight fetch.
+        
         Args:
             secret_name: Name of the secret to retrieve
             
@@ -69,16 +88,16 @@ class DopplerSecrets:
         """
         current_time = time.time()
         
-        # Refresh cache if TTL has expired or no secrets are loaded
         time_since_last_fetch = current_time - self._last_fetch_time
-        if time_since_last_fetch > self._cache_ttl:
-            self._logger.info(f"Cache TTL expired ({time_since_last_fetch:.1f}s > {self._cache_ttl}s). Refreshing secrets from Doppler...")
-            await self._fetch_secrets()
-        elif not self._secrets:
+        if not self._secrets:
             self._logger.info("No secrets loaded. Fetching from Doppler...")
-            await self._fetch_secrets()
+            increment("doppler.cache_miss")
+            await self.refresh()
+        elif time_since_last_fetch > self._cache_ttl:
+            increment("doppler.stale_serve")
+            self._schedule_refresh(time_since_last_fetch)
         else:
-            self._logger.info("Secrets already loaded. Using cached secrets.") 
+            increment("doppler.cache_hit")
         
         # Check if secret exists
         if secret_name not in self._secrets:
@@ -90,8 +109,124 @@ class DopplerSecrets:
             
         return self._secrets[secret_name]
 
+    async def get_all_secrets(self) -> Dict[str, str]:
+        """
+        Get all secrets, loading them first if needed.
+        
+        Returns:
+            Mapping of secret name to value
+        """
+        if not self._secrets:
+            increment("doppler.cache_miss")
+            await self.refresh()
+        return dict(self._secrets)
+
+    def add_refresh_listener(self, listener: Callable[[Dict[str, str]], None]) -> None:
+        """Register a callback invoked with the new secrets after every refresh"""
+        if listener not in self._refresh_listeners:
+            self._refresh_listeners.append(listener)
+
+    def _set_secrets(self, secrets: Dict[str, str], fetched_at: float) -> None:
+        """Replace the cached secrets and notify listeners"""
+        self._secrets = secrets
+        self._last_fetch_time = fetched_at
+        for listener in self._refresh_listeners:
+            listener(dict(secrets))
+
+    async def refresh(self) -> None:
+        """
+        Refresh secrets from Doppler, joining any refresh already in flight.
+        
+        Raises:
+            HTTPException: If the refresh fails and no secrets are cached
+        """
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._run_refresh())
+        # Shield so a cancelled caller does not cancel the shared refresh
+        await asyncio.shield(self._refresh_task)
+
+    def _schedule_refresh(self, time_since_last_fetch: float) -> None:
+        """Start a background refresh unless one is running or we are backing off"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if time.time() < self._next_retry_time:
+            return
+        self._logger.info(
+            f"Cache TTL expired ({time_since_last_fetch:.1f}s > {self._cache_ttl}s). "
+            "Serving cached secrets and refreshing from Doppler in the background..."
+        )
+        self._refresh_task = asyncio.create_task(self._run_refresh())
+
+    async def _run_refresh(self) -> None:
+        """Run a single refresh, recording latency and applying backoff on failure"""
+        start_time = time.perf_counter()
+        try:
+            await self._load_secrets()
+        except Exception:
+            self._failure_count += 1
+            backoff = min(self._backoff_max, self._backoff_base * (2 ** (self._failure_count - 1)))
+            # Jitter so workers that failed together do not retry together
+            backoff = random.uniform(backoff / 2, backoff)
+            self._next_retry_time = time.time() + backoff
+            increment("doppler.refresh_failure")
+            self._logger.warning(
+                f"Doppler refresh failed ({self._failure_count} consecutive). "
+                f"Next attempt in {backoff:.1f}s"
+            )
+            # Keep serving the existing cache; only cold callers see the error
+            if not self._secrets:
+                raise
+            return
+        finally:
+            observe("doppler.refresh_latency", time.perf_counter() - start_time)
+        
+        self._failure_count = 0
+        self._next_retry_time = 0
+        increment("doppler.refresh_success")
+
+    async def _load_secrets(self) -> None:
+        """
+        Load secrets from the shared snapshot, calling Doppler only if it is stale.
+        
+        Workers serialize on the snapshot lock, so a single worker fetches from
+        Doppler and the rest pick up what it wrote.
+        """
+        if self._adopt_snapshot():
+            return
+        async with self._store.refresh_lock():
+            # Another worker may have refreshed while we waited for the lock
+            if self._adopt_snapshot():
+                return
+            await self._fetch_secrets()
+            try:
+                self._store.write(self._secrets, self._last_fetch_time)
+            except OSError as e:
+                self._logger.warning(f"Failed to write secrets snapshot: {str(e)}")
+
+    def _adopt_snapshot(self) -> bool:
+        """Use the shared snapshot if it is newer than ours and not expired"""
+        try:
+            snapshot = self._store.read()
+        except OSError as e:
+            self._logger.warning(f"Failed to read secrets snapshot: {str(e)}")
+            return False
+        if snapshot is None:
+            return False
+        secrets, fetched_at = snapshot
+        if fetched_at <= self._last_fetch_time or time.time() - fetched_at > self._cache_ttl:
+            return False
+        self._set_secrets(secrets, fetched_at)
+        increment("doppler.snapshot_load")
+        self._logger.debug(f"Loaded secrets from shared snapshot generation {self._store.generation}")
+        return True
+
     async def _fetch_secrets(self) -> None:
-        """Fetch all secrets from Doppler API and update the cache"""
+        """
+        Fetch all secrets from Doppler API and update the cache.
+        
+        Raises:
+            HTTPException: If the secrets could not be fetched
+        """
         url = "https://api.doppler.com/v3/configs/config/secrets/download"
         params = {
             "project": self.project,
@@ -103,30 +238,26 @@ class DopplerSecrets:
         
         try:
             self._logger.debug("Fetching secrets from Doppler")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params, headers=headers, timeout=15.0)
-                response.raise_for_status()
-                
-                # Update cache
-                self._secrets = response.json()
-                self._last_fetch_time = time.time()
-                self._logger.debug("Successfully updated secrets cache")
-                
+            client = get_http_client("doppler")
+            response = await client.get(url, params=params, headers=headers)
+            response.raise_for_status()
+            
+            # Update cache
+            self._set_secrets(response.json(), time.time())
+            self._logger.debug("Successfully updated secrets cache")
+            
         except httpx.HTTPStatusError as e:
             self._logger.error(f"Failed to fetch secrets from Doppler: {str(e)}")
-            # Don't clear existing cache if we fail to refresh
-            if not self._secrets:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail=f"Failed to fetch secrets from Doppler: {str(e)}"
-                )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Failed to fetch secrets from Doppler: {str(e)}"
+            ) from e
         except Exception as e:
             self._logger.error(f"Unexpected error fetching secrets: {str(e)}")
-            if not self._secrets:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Unexpected error fetching secrets: {str(e)}"
-                )
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Unexpected error fetching secrets: {str(e)}"
+            ) from e
 
 
 async def get_doppler_secret(secret_name: str) -> str:
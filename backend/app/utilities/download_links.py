@@ -0,0 +1,150 @@
+"""
+Signed, expiring download links for purchased program PDFs.
+
+A link is /api/payments/downloads/<token>/<file name>. The token holds the
+expiry time and an HMAC signature over it and the file name, made with the
+download keyring's current key, so links cannot be forged, moved to another
+file or extended. Links are not single-use: browsers and download managers
+fetch the same link repeatedly to resume with Range requests.
+
+Token layout (integers big-endian), URL-safe base64 without padding:
+    version u8 | key ID u8 | expires_at u32 | [render ID] | signature (SIGNATURE_SIZE bytes)
+Version 2 tokens carry the RENDER_ID_SIZE byte render ID of the buyer's
+watermarked copy (see watermark); version 1 tokens link the unstamped file.
+
+Links are signed with DOWNLOAD_LINK_SECRET_KEY, not the checkout token key,
+and a rotated-out download key keeps verifying for the link lifetime (see
+DownloadKeyring), so outstanding links survive a rotation of either secret.
+Across restarts, keep the old key published as
+DOWNLOAD_LINK_SECRET_KEY_PREVIOUS until the last link signed with it expires.
+"""
+import base64
+import hmac
+import struct
+import time
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from app.utilities.keyring import HmacKeyring, get_download_keyring, get_loaded_keyring
+from app.utilities.settings import get_settings
+
+
+DOWNLOAD_TOKEN_VERSION = 1
+WATERMARKED_TOKEN_VERSION = 2
+SIGNATURE_SIZE = 16
+RENDER_ID_SIZE = 8
+DOWNLOAD_PATH_PREFIX = "/api/payments/downloads"
+_HEADER = struct.Struct(">BBI")
+# Keeps download signatures distinct from other tokens, even if a secret is reused
+_SIGNING_CONTEXT = b"download:"
+
+
+def _signed_body(header: bytes, file_name: str) -> bytes:
+    return _SIGNING_CONTEXT + header + file_name.encode('utf-8')
+
+
+def sign_download_token(
+    keyring: HmacKeyring,
+    file_name: str,
+    expires_at: int,
+    render_id: Optional[bytes] = None
+) -> str:
+    """
+    Sign a download token for a file.
+
+    Args:
+        keyring: Keyring whose current key signs the token
+        file_name: Program PDF file name
+        expires_at: Unix time the link stops working
+        render_id: Optional render ID of a watermarked copy to serve
+
+    Returns:
+        str: URL-safe base64 token
+    """
+    key = keyring.current
+    if render_id is None:
+        header = _HEADER.pack(DOWNLOAD_TOKEN_VERSION, key.kid, int(expires_at))
+    else:
+        if len(render_id) != RENDER_ID_SIZE:
+            raise ValueError(f"Render ID must be {RENDER_ID_SIZE} bytes")
+        header = _HEADER.pack(WATERMARKED_TOKEN_VERSION, key.kid, int(expires_at)) + render_id
+    signature = key.digest(_signed_body(header, file_name))[:SIGNATURE_SIZE]
+    return base64.urlsafe_b64encode(header + signature).rstrip(b"=").decode('ascii')
+
+
+def verify_download_token(
+    keyring: HmacKeyring,
+    token: str,
+    file_name: str,
+    current_time: Optional[float] = None
+) -> Tuple[int, Optional[bytes]]:
+    """
+    Verify a download token for a file.
+
+    Args:
+        keyring: Keyring holding the verification keys
+        token: Token from the link
+        file_name: File name from the link
+        current_time: Optional timestamp to use for the expiry check (for testing)
+
+    Returns:
+        Tuple[int, Optional[bytes]]: Unix time the link expires, and the render
+        ID of the watermarked copy (None for unstamped links)
+
+    Raises:
+        ValueError: If the token is malformed, forged, for another file or expired
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, base64.binascii.Error) as e:
+        raise ValueError(f"Invalid token encoding: {str(e)}")
+    header_size = {
+        DOWNLOAD_TOKEN_VERSION: _HEADER.size,
+        WATERMARKED_TOKEN_VERSION: _HEADER.size + RENDER_ID_SIZE,
+    }.get(raw[0] if raw else None)
+    if header_size is None or len(raw) != header_size + SIGNATURE_SIZE:
+        raise ValueError("Invalid token format")
+
+    header, provided_signature = raw[:header_size], raw[header_size:]
+    body = _signed_body(header, file_name)
+    if not any(
+        hmac.compare_digest(key.digest(body)[:SIGNATURE_SIZE], provided_signature)
+        for key in keyring.verification_keys(header[1])
+    ):
+        raise ValueError("Invalid token signature")
+
+    _, _, expires_at = _HEADER.unpack_from(header)
+    if expires_at < (time.time() if current_time is None else current_time):
+        raise ValueError("Download link has expired")
+    return expires_at, header[_HEADER.size:] or None
+
+
+async def create_download_url(file_name: str, expires_at: int, render_id: Optional[bytes] = None) -> str:
+    """
+    Build the public download link for a program file.
+
+    Args:
+        file_name: Program PDF file name
+        expires_at: Unix time the link stops working
+        render_id: Optional render ID of the buyer's watermarked copy
+
+    Returns:
+        str: Absolute URL
+
+    Raises:
+        RuntimeError: If the download keyring cannot be loaded
+    """
+    token = sign_download_token(await get_loaded_keyring(get_download_keyring()), file_name, expires_at, render_id)
+    base_url = get_settings().fulfillment.base_url.rstrip("/")
+    return f"{base_url}{DOWNLOAD_PATH_PREFIX}/{token}/{quote(file_name)}"
+
+
+async def verify_download_link(token: str, file_name: str) -> Tuple[int, Optional[bytes]]:
+    """
+    Verify the token of a download link (see verify_download_token).
+
+    Raises:
+        ValueError: If the link is invalid or expired
+        RuntimeError: If the download keyring cannot be loaded
+    """
+    return verify_download_token(await get_loaded_keyring(get_download_keyring()), token, file_name)
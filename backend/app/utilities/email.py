@@ -1,21 +1,130 @@
-from typing import Dict, List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal
+import contextlib
+import io
 import logging
 
-from fastapi import UploadFile
-import requests
+import httpx
 
-from app.utilities.helpers import is_dev, get_cfg
+from app.utilities.helpers import is_dev
+from app.utilities.settings import get_settings
 from app.utilities.doppler_utils import get_doppler_secret
+from app.utilities.http_clients import get_http_client
+from app.utilities.email_outbox import get_email_outbox, PermanentDeliveryError
+from app.utilities.program_assets import get_program_assets
+from app.utilities.watermark import get_watermark_renderer
 from app.models.payments_model import PdfAttachment
 
 
+# Per-request read/write timeouts (seconds); uploads with attachments get longer
+SEND_TIMEOUT = 10
+UPLOAD_TIMEOUT = 30
+
+
 async def send_email_util(
     name: str,
     email: str,
     message: str,
     mode: Literal['contact','fulfillment'],
     files: Optional[List[PdfAttachment]] = None,
-    is_html: bool = False
+    is_html: bool = False,
+    program_files: Optional[List[str]] = None,
+    watermark: Optional[str] = None,
+    linked_files: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """
+    Queue an email for delivery through the outbox.
+    
+    The message is stored durably and sent by the outbox senders (see
+    deliver_email), so this returns as soon as it is queued.
+    
+    Args:
+        name: Name of the sender
+        email: Email address of the sender
+        message: Email message content (can be plain text or HTML)
+        mode: Either 'contact' or 'fulfillment' to determine the recipient and subject
+        files: Optional list of files to attach to the email
+        is_html: If True, the message will be sent as HTML content. Defaults to False.
+        program_files: Optional program PDF file names to attach; only the names are
+            queued, the content is streamed from the program asset cache on delivery
+        watermark: Optional text to stamp on the program files (see watermark)
+        linked_files: Optional program PDF file names the message links to; their
+            stamped copies are rendered on delivery, before the email is sent
+        
+    Returns:
+        Dict containing status and message
+        
+    Raises:
+        RuntimeError: If the email could not be queued
+    """
+    logger = logging.getLogger(__name__)
+    
+    try:
+        message_id = await get_email_outbox().enqueue(
+            {
+                "name": name,
+                "email": email,
+                "message": message,
+                "mode": mode,
+                "is_html": is_html,
+                "program_files": program_files or [],
+                "watermark": watermark,
+                "linked_files": linked_files or []
+            },
+            [file.model_dump() for file in files or []]
+        )
+    except Exception as e:
+        logger.error(f"Failed to queue email - From: {email}, Mode: {mode}, Error: {str(e)}")
+        raise RuntimeError("An error occurred while queueing the email") from e
+    
+    logger.info(f"Email queued for delivery - ID: {message_id}, From: {email}, Mode: {mode}")
+    
+    return {
+        "status": "success",
+        "message": "Email queued for delivery"
+    }
+
+
+async def deliver_queued_email(message: Dict[str, Any], attachments: List[Dict[str, Any]]) -> None:
+    """
+    Outbox deliver callable: send one queued email with deliver_email.
+    
+    Args:
+        message: Stored keyword arguments of send_email_util
+        attachments: Stored attachments
+        
+    Raises:
+        PermanentDeliveryError: If Mailgun rejected the email as invalid or an
+            attached program no longer exists
+        Exception: For failures that should be retried
+    """
+    files = [PdfAttachment(**attachment) for attachment in attachments]
+    try:
+        await deliver_email(files=files or None, **message)
+    except RuntimeError as e:
+        if isinstance(e.__cause__, KeyError):
+            # The attached program is no longer in the catalog
+            raise PermanentDeliveryError(str(e.__cause__)) from e
+        raise
+    except ConnectionError as e:
+        cause = e.__cause__
+        if isinstance(cause, httpx.HTTPStatusError):
+            status_code = cause.response.status_code
+            # 4xx other than rate limiting will fail the same way every time
+            if 400 <= status_code < 500 and status_code != 429:
+                raise PermanentDeliveryError(f"Rejected by email service: {status_code}") from e
+        raise
+
+
+async def deliver_email(
+    name: str,
+    email: str,
+    message: str,
+    mode: Literal['contact','fulfillment'],
+    files: Optional[List[PdfAttachment]] = None,
+    is_html: bool = False,
+    program_files: Optional[List[str]] = None,
+    watermark: Optional[str] = None,
+    linked_files: Optional[List[str]] = None
 ) -> Dict[str, str]:
     """
     Core email sending functionality with support for file attachments and HTML content.
@@ -27,23 +136,29 @@ async def send_email_util(
         mode: Either 'contact' or 'fulfillment' to determine the recipient and subject
         files: Optional list of files to attach to the email
         is_html: If True, the message will be sent as HTML content. Defaults to False.
+        program_files: Optional program PDF file names to attach from the program asset cache
+        watermark: Optional text to stamp on the program files; they are sent
+            unstamped if watermarking is disabled or fails
+        linked_files: Optional program PDF file names whose stamped copies the
+            message's download links point at; rendered here, not attached
         
     Returns:
         Dict containing status and message
         
     Raises:
-        EmailConfigurationError: If there's an error with the email configuration
-        requests.exceptions.RequestException: If there's an error sending the email
+        RuntimeError: If there's an error with the email configuration
+        TimeoutError: If Mailgun does not respond in time
+        ConnectionError: If Mailgun cannot be reached or rejects the email
         Exception: For any other unexpected errors
     """
     logger = logging.getLogger(__name__)
 
     # Get Config 
-    cfg = get_cfg()
+    mailgun_settings = get_settings().mailgun
 
     # Setup email variables
-    url = cfg.get("MAILGUN", "url")
-    email_to = cfg.get("MAILGUN", "contact_email") if mode == "contact" else email
+    url = mailgun_settings.url
+    email_to = mailgun_settings.contact_email if mode == "contact" else email
 
     # Determine variables based on mode
     if mode == "contact":
@@ -53,7 +168,7 @@ async def send_email_util(
         email_prefix = "Brawny Originals"
         email_subject = "Brawny Originals - Fulfillment Request - Order Details - DO NOT REPLY"
 
-    email_from = f"{email_prefix} <{cfg.get('MAILGUN', 'from_uri')}>"
+    email_from = f"{email_prefix} <{mailgun_settings.from_uri}>"
 
     try:
         mailgun_api_key = await get_doppler_secret("MAILGUN_API_KEY")
@@ -65,6 +180,7 @@ async def send_email_util(
         logger.error(f"Failed to get Mailgun API key from Doppler: {str(e)}")
         raise RuntimeError("Failed to initialize email service") from e
         
+    stack = contextlib.ExitStack()
     try:
         # Prepare email data
         data = {
@@ -81,28 +197,46 @@ async def send_email_util(
         
         logger.debug(f"Sending email to: {email_to}, Subject: {email_subject}")
         
-        # Prepare files if any
+        # Prepare files if any; file objects are streamed into the multipart body in chunks
         files_data = []
         if files:
             for file in files:
-                files_data.append(("attachment", (file.filename, file.content, file.content_type)))
+                files_data.append(("attachment", (file.filename, io.BytesIO(file.content), file.content_type)))
+        for file_name in program_files or []:
+            asset = await get_program_assets().get_async(file_name)
+            rendered = await get_watermark_renderer().render_for_delivery(asset, watermark) if watermark else None
+            if rendered is not None:
+                # The stamped copy from the render cache, which outbox retries reuse
+                file = stack.enter_context(open(rendered[1], 'rb'))
+            else:
+                # Streamed from the shared mapping without copying the file
+                file = stack.enter_context(asset.open())
+            files_data.append(("attachment", (file_name, file, "application/pdf")))
+        if watermark:
+            # Render the copies the links point at before they go out; a link whose
+            # copy is missing still serves the unstamped file, so this never fails the send
+            for file_name in linked_files or []:
+                try:
+                    asset = await get_program_assets().get_async(file_name)
+                except (KeyError, OSError) as e:
+                    logger.warning(f"Linked program not available to watermark - File: {file_name}, Error: {str(e)}")
+                    continue
+                await get_watermark_renderer().render_for_delivery(asset, watermark)
         
-        # Send the email with or without attachments
-        if files_data:
-            response = requests.post(
-                url,
-                auth=auth,
-                data=data,
-                files=files_data,
-                timeout=30  # Increased timeout for file uploads
-            )
-        else:
-            response = requests.post(
-                url,
-                auth=auth,
-                data=data,
-                timeout=10
-            )
+        # Send the email with or without attachments over the pooled Mailgun client
+        client = get_http_client("mailgun")
+        http_settings = get_settings().http
+        timeout = httpx.Timeout(
+            UPLOAD_TIMEOUT if files_data else SEND_TIMEOUT,
+            connect=http_settings.connect_timeout
+        )
+        response = await client.post(
+            url,
+            auth=auth,
+            data=data,
+            files=files_data or None,
+            timeout=timeout
+        )
             
         response.raise_for_status()
         
@@ -113,15 +247,15 @@ async def send_email_util(
             "message": "Email sent successfully"
         }
         
-    except requests.exceptions.Timeout as e:
-        error_msg = f"Email sending timed out after {e.request.timeout} seconds"
+    except httpx.TimeoutException as e:
+        error_msg = f"Email sending timed out after {UPLOAD_TIMEOUT if files or program_files else SEND_TIMEOUT} seconds"
         logger.error(f"{error_msg} - From: {email}, To: {email_to}")
         raise TimeoutError("Email sending timed out. Please try again later.") from e
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         error_msg = f"Email service returned error: {e.response.status_code} - {e.response.text}"
         logger.error(f"{error_msg} - From: {email}, To: {email_to}, Status Code: {e.response.status_code}")
         raise ConnectionError("Failed to send email due to a service error") from e
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg = f"Failed to send email: {str(e)}"
         logger.error(f"{error_msg} - From: {email}, To: {email_to}")
         raise ConnectionError("Failed to connect to email service") from e
@@ -129,3 +263,5 @@ async def send_email_util(
         error_msg = f"Unexpected error while sending email: {str(e)}"
         logger.error(f"{error_msg} - From: {email}, To: {email_to}")
         raise RuntimeError("An error occurred while sending the email") from e
+    finally:
+        stack.close()
@@ -0,0 +1,324 @@
+"""
+Durable outbox for outgoing email.
+
+send_email_util only writes the message (and its attachments) to a SQLite
+database in the state directory and returns; a bounded pool of async
+senders per worker drains it. Every worker's senders share the database,
+and a message is claimed atomically, so it is delivered by one sender at a
+time. A claim expires after claim_timeout, which hands the message of a
+crashed or restarted worker to another sender.
+
+Failed deliveries are retried with jittered exponential backoff. A message
+that fails max_attempts times, or is rejected permanently (e.g. a 4xx from
+Mailgun), is kept with status 'dead' for inspection instead of being retried
+forever.
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment, observe, set_gauge
+from app.utilities.settings import get_settings, get_state_dir
+
+
+OUTBOX_FILE_NAME = "email_outbox.sqlite3"
+BUSY_TIMEOUT = 10.0  # Seconds to wait for another worker's write lock
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS outbox_attachments (
+    message_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (message_id, position)
+);
+"""
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a deliver callable when retrying the message cannot succeed"""
+
+
+@dataclass
+class OutboxMessage:
+    """A claimed message"""
+    id: int
+    message: Dict[str, Any]
+    attachments: List[Dict[str, Any]]
+    attempts: int
+    created_at: float
+
+
+DeliverCallable = Callable[[Dict[str, Any], List[Dict[str, Any]]], Awaitable[None]]
+
+
+class EmailOutbox:
+    """
+    Singleton owning the outbox database and this worker's sender tasks.
+    """
+    _instance: Optional['EmailOutbox'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._owner = uuid.uuid4().hex  # Identifies this worker's claims
+        self._initialized = False
+        self._senders: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._throttle_lock: Optional[asyncio.Lock] = None
+        self._last_send = 0.0
+
+    @classmethod
+    def get_instance(cls) -> 'EmailOutbox':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(get_state_dir() / OUTBOX_FILE_NAME, timeout=BUSY_TIMEOUT)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    # Database operations; all blocking, run via asyncio.to_thread
+
+    def _insert(self, message: Dict[str, Any], attachments: List[Dict[str, Any]]) -> int:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            message_id = conn.execute(
+                "INSERT INTO outbox (message, next_attempt_at, created_at) VALUES (?, ?, ?)",
+                (json.dumps(message), now, now)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO outbox_attachments (message_id, position, filename, content_type, content) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (message_id, position, attachment["filename"], attachment["content_type"], attachment["content"])
+                    for position, attachment in enumerate(attachments)
+                ]
+            )
+        return message_id
+
+    def _claim(self, claim_timeout: float) -> Optional[OutboxMessage]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                """
+                UPDATE outbox
+                SET status = 'sending', claimed_by = ?, claimed_until = ?, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM outbox
+                    WHERE (status = 'pending' AND next_attempt_at <= ?)
+                       OR (status = 'sending' AND claimed_until <= ?)
+                    ORDER BY next_attempt_at
+                    LIMIT 1
+                )
+                RETURNING id, message, attempts, created_at
+                """,
+                (self._owner, now + claim_timeout, now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            attachments = conn.execute(
+                "SELECT filename, content_type, content FROM outbox_attachments "
+                "WHERE message_id = ? ORDER BY position",
+                (row[0],)
+            ).fetchall()
+        return OutboxMessage(
+            id=row[0],
+            message=json.loads(row[1]),
+            attachments=[
+                {"filename": filename, "content_type": content_type, "content": content}
+                for filename, content_type, content in attachments
+            ],
+            attempts=row[2],
+            created_at=row[3]
+        )
+
+    def _delete(self, message_id: int) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM outbox_attachments WHERE message_id = ?", (message_id,))
+            conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    def _reschedule(self, message_id: int, next_attempt_at: float, error: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ?, claimed_by = NULL, "
+                "claimed_until = NULL, last_error = ? WHERE id = ? AND claimed_by = ?",
+                (next_attempt_at, error, message_id, self._owner)
+            )
+
+    def _dead_letter(self, message_id: int, error: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'dead', claimed_by = NULL, claimed_until = NULL, "
+                "last_error = ? WHERE id = ? AND claimed_by = ?",
+                (error, message_id, self._owner)
+            )
+
+    def _release_claims(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ?, claimed_by = NULL, "
+                "claimed_until = NULL WHERE status = 'sending' AND claimed_by = ?",
+                (time.time(), self._owner)
+            ).rowcount
+
+    def _counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+    # Public API
+
+    async def enqueue(self, message: Dict[str, Any], attachments: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Durably store a message for delivery.
+
+        Args:
+            message: JSON-serializable keyword arguments for the deliver callable
+            attachments: Optional list of dicts with filename, content_type and content (bytes)
+
+        Returns:
+            int: Outbox ID of the message
+
+        Raises:
+            sqlite3.Error: If the message could not be stored
+        """
+        message_id = await asyncio.to_thread(self._insert, message, attachments or [])
+        increment("email.outbox.enqueued")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return message_id
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of messages per status across all workers and publish them as gauges.
+
+        Returns:
+            Dict with pending, sending and dead counts
+        """
+        counts = self._counts()
+        stats = {status: counts.get(status, 0) for status in ("pending", "sending", "dead")}
+        for status, count in stats.items():
+            set_gauge(f"email.outbox.{status}", count)
+        return stats
+
+    def start(self, deliver: DeliverCallable) -> None:
+        """
+        Start this worker's sender tasks.
+
+        Args:
+            deliver: Coroutine function sending one message; raises
+                PermanentDeliveryError for messages that must not be retried
+        """
+        if self._senders:
+            return
+        email_settings = get_settings().email
+        self._wakeup = asyncio.Event()
+        self._throttle_lock = asyncio.Lock()
+        self._logger.info(f"Starting email outbox - Senders: {email_settings.senders}")
+        self._senders = [
+            asyncio.create_task(self._run(deliver)) for _ in range(max(1, email_settings.senders))
+        ]
+
+    async def stop(self) -> None:
+        """Stop the sender tasks and hand messages they were sending back to the queue"""
+        senders, self._senders = self._senders, []
+        for task in senders:
+            task.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        if senders:
+            released = await asyncio.to_thread(self._release_claims)
+            if released:
+                self._logger.info(f"Released in-flight emails back to the outbox - Count: {released}")
+
+    async def _throttle(self) -> None:
+        """Space out sends from this worker to stay under the provider's rate limit"""
+        async with self._throttle_lock:
+            delay = self._last_send + get_settings().email.min_send_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_send = time.monotonic()
+
+    def _retry_delay(self, attempts: int) -> float:
+        email_settings = get_settings().email
+        delay = min(email_settings.retry_max_delay, email_settings.retry_base_delay * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    async def _run(self, deliver: DeliverCallable) -> None:
+        while True:
+            email_settings = get_settings().email
+            # Clear before claiming so an enqueue racing with an empty claim still wakes us
+            self._wakeup.clear()
+            try:
+                claimed = await asyncio.to_thread(self._claim, email_settings.claim_timeout)
+            except sqlite3.Error as e:
+                self._logger.error(f"Failed to claim email from outbox: {str(e)}")
+                claimed = None
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), email_settings.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._send(claimed, deliver)
+            except sqlite3.Error as e:
+                # The claim expires and the message is picked up again
+                self._logger.error(f"Failed to update email outbox - ID: {claimed.id}, Error: {str(e)}")
+
+    async def _send(self, claimed: OutboxMessage, deliver: DeliverCallable) -> None:
+        email_settings = get_settings().email
+        await self._throttle()
+        try:
+            await deliver(claimed.message, claimed.attachments)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            if isinstance(e, PermanentDeliveryError) or claimed.attempts >= email_settings.max_attempts:
+                await asyncio.to_thread(self._dead_letter, claimed.id, error)
+                increment("email.outbox.dead_letter")
+                self._logger.error(
+                    f"Email moved to dead letter - ID: {claimed.id}, Attempts: {claimed.attempts}, Error: {error}"
+                )
+            else:
+                delay = self._retry_delay(claimed.attempts)
+                await asyncio.to_thread(self._reschedule, claimed.id, time.time() + delay, error)
+                increment("email.outbox.retry")
+                self._logger.warning(
+                    f"Email delivery failed, retrying in {delay:.0f}s - ID: {claimed.id}, "
+                    f"Attempt: {claimed.attempts}, Error: {error}"
+                )
+        else:
+            await asyncio.to_thread(self._delete, claimed.id)
+            increment("email.outbox.sent")
+            observe("email.outbox.delivery_latency", time.time() - claimed.created_at)
+            self._logger.info(f"Delivered email from outbox - ID: {claimed.id}, Attempt: {claimed.attempts}")
+
+
+def get_email_outbox() -> EmailOutbox:
+    """Get the singleton instance of EmailOutbox."""
+    return EmailOutbox.get_instance()
@@ -1,5 +1,5 @@
 import os
-from configparser import ConfigParser
+import tempfile
 from pathlib import Path
 
 
@@ -23,12 +23,28 @@ def get_cfg_name() -> str:
     return "dev" if is_dev() else "prod" 
 
 
-def get_cfg() -> ConfigParser:
-    """Get the configuration parser"""
-    cfg = ConfigParser()
-    # Get the directory where this file is located
-    current_dir = Path(__file__).parent
-    # Navigate to the conf directory and read the config file
-    config_path = current_dir.parent / "conf" / f"{get_cfg_name()}.ini"
-    cfg.read(config_path)
-    return cfg
+def atomic_write_bytes(path: Path, data: bytes, mode: int = 0o600) -> None:
+    """
+    Atomically replace the file at path with data.
+    
+    Readers see either the old or the new content, never a partial write.
+    
+    Args:
+        path: Destination file path
+        data: Bytes to write
+        mode: Permission bits for the new file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
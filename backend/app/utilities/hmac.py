@@ -1,58 +1,173 @@
 import hmac
-import hashlib
 import base64
 import json
-from typing import Dict, Any, Optional, Union
+import os
+import struct
+import time
+from typing import Dict, Any, Optional
 
-from app.utilities.doppler_utils import get_doppler_secret
 from app.utilities.logger import get_logger
+from app.utilities.catalog import PRICE_TAG_SIZE, get_catalog
+from app.utilities.keyring import HmacKeyring, get_loaded_keyring
+
+
+# Compact token layout (all integers big-endian):
+#   version u8 | key ID u8 | created_at u32 | expires_at u32 | nonce 8 bytes | count u8
+#   | price tags (PRICE_TAG_SIZE bytes) * count | signature
+# The signature is HMAC-SHA256 over everything before it, truncated to
+# SIGNATURE_SIZE bytes, and the whole token is URL-safe base64 without padding.
+# The nonce makes every token unique so it can be consumed exactly once.
+# Prices are stored as tags derived from the price ID, not catalog positions,
+# so a config reload that reorders the price IDs cannot change a token's meaning.
+TOKEN_VERSION = 3
+SIGNATURE_SIZE = 16
+NONCE_SIZE = 8
+_HEADER = struct.Struct(f">BBII{NONCE_SIZE}sB")
+
+# Legacy tokens are standard base64 of a JSON object, so they start with '{"'
+_LEGACY_TOKEN_PREFIX = "eyJ"
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode('ascii')
+
+
+def _b64decode(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+
+
+def sign_compact_token(keyring: HmacKeyring, data: Dict[str, Any]) -> str:
+    """
+    Pack and sign checkout token data in the compact format.
+
+    Args:
+        keyring: Keyring whose current key signs the token
+        data: Token data with price_ids, created_at and expires_at
+
+    Returns:
+        str: URL-safe base64 token
+
+    Raises:
+        ValueError: If a price ID is not in the catalog
+    """
+    catalog = get_catalog()
+    tags = []
+    for price_id in data['price_ids']:
+        tag = catalog.tag_of(price_id)
+        if tag is None:
+            raise ValueError(f"Price ID not in catalog: {price_id}")
+        tags.append(tag)
+
+    key = keyring.current
+    body = _HEADER.pack(
+        TOKEN_VERSION,
+        key.kid,
+        int(data['created_at']),
+        int(data['expires_at']),
+        os.urandom(NONCE_SIZE),
+        len(tags)
+    ) + b"".join(tags)
+    signature = key.digest(body)[:SIGNATURE_SIZE]
+    return _b64encode(body + signature)
+
+
+def verify_compact_token(keyring: HmacKeyring, token: str) -> Dict[str, Any]:
+    """
+    Verify a compact token's signature, then unpack it.
+
+    Only the version and key ID bytes are read before the signature is checked.
+
+    Args:
+        keyring: Keyring holding the verification keys
+        token: URL-safe base64 token
+
+    Returns:
+        Dict containing price_ids, created_at, expires_at and nonce
+
+    Raises:
+        ValueError: If the token is malformed or the signature does not match
+    """
+    try:
+        raw = _b64decode(token)
+    except (ValueError, base64.binascii.Error) as e:
+        raise ValueError(f"Invalid token encoding: {str(e)}")
+    if len(raw) < _HEADER.size + SIGNATURE_SIZE or raw[0] != TOKEN_VERSION:
+        raise ValueError("Invalid token format")
+
+    body, provided_signature = raw[:-SIGNATURE_SIZE], raw[-SIGNATURE_SIZE:]
+
+    # Authenticate before looking at any of the fields
+    if not any(
+        hmac.compare_digest(key.digest(body)[:SIGNATURE_SIZE], provided_signature)
+        for key in keyring.verification_keys(body[1])
+    ):
+        raise ValueError("Invalid token signature")
+
+    _, _, created_at, expires_at, nonce, count = _HEADER.unpack_from(body)
+    tags = body[_HEADER.size:]
+    if len(tags) != count * PRICE_TAG_SIZE:
+        raise ValueError("Invalid token format")
+
+    catalog = get_catalog()
+    price_ids = []
+    for offset in range(0, len(tags), PRICE_TAG_SIZE):
+        price_id = catalog.price_id_for_tag(tags[offset:offset + PRICE_TAG_SIZE])
+        if price_id is None:
+            raise ValueError("Token references an unknown price")
+        price_ids.append(price_id)
+
+    return {
+        'price_ids': price_ids,
+        'created_at': created_at,
+        'expires_at': expires_at,
+        'nonce': nonce
+    }
+
+
+def _verify_legacy_token(keyring: HmacKeyring, token: str) -> Dict[str, Any]:
+    """Verify a token in the original base64(JSON) format"""
+    try:
+        token_data = json.loads(base64.b64decode(token).decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError(f"Invalid token encoding: {str(e)}")
+
+    # Verify required fields
+    if not isinstance(token_data, dict) or 'data' not in token_data or 'signature' not in token_data:
+        raise ValueError("Invalid token format")
+
+    # Recreate the signature with each usable key
+    json_data = json.dumps(token_data['data'], sort_keys=True).encode('utf-8')
+    provided_signature = base64.b64decode(token_data['signature'].encode('utf-8'))
+    if not any(
+        hmac.compare_digest(key.digest(json_data), provided_signature)
+        for key in keyring.verification_keys()
+    ):
+        raise ValueError("Invalid token signature")
+
+    # Legacy tokens have no nonce; their signature is unique enough
+    return dict(token_data['data'], nonce=provided_signature[:NONCE_SIZE])
 
 
 async def generate_hmac_token(
     data: Dict[str, Any]
 ) -> str:
     """
-    Generate an HMAC token for the given data.
-    
+    Generate a compact HMAC token for the given checkout token data.
+
     Args:
-        data: Data to include in the token
-        
+        data: Data to include in the token (price_ids, created_at, expires_at)
+
     Returns:
-        str: Base64 encoded HMAC token
-        
+        str: URL-safe base64 HMAC token
+
     Raises:
         RuntimeError: If HMAC secret cannot be retrieved from Doppler
     """
     logger = get_logger(__name__)
-    
-    # Get HMAC secret from Doppler
-    try:
-        secret_str = await get_doppler_secret("HMAC_SECRET_KEY")
-        secret = secret_str.encode('utf-8')
-    except Exception as e:
-        logger.error("Failed to retrieve HMAC_SECRET_KEY from Doppler")
-        raise RuntimeError("Failed to retrieve HMAC secret from Doppler") from e
-    
-    # Convert data to JSON and encode to bytes
-    json_data = json.dumps(data, sort_keys=True).encode('utf-8')
-    
+    keyring = await get_loaded_keyring()
+
     try:
-        # Create HMAC signature
-        signature = hmac.new(
-            secret,
-            json_data,
-            hashlib.sha256
-        ).digest()
-        
-        # Combine data and signature
-        token_data = {
-            'data': data,
-            'signature': base64.b64encode(signature).decode('utf-8')
-        }
-        
-        # Return base64 encoded token
-        return base64.b64encode(json.dumps(token_data).encode('utf-8')).decode('utf-8')
-        
+        return sign_compact_token(keyring, data)
     except Exception as e:
         logger.error(f"Error generating HMAC token: {str(e)}")
         raise
@@ -64,61 +179,39 @@ async def verify_hmac_token(
 ) -> Dict[str, Any]:
     """
     Verify an HMAC token and return the decoded data if valid.
-    
+
+    Both the compact format and the legacy JSON format are accepted, signed
+    with the current key or a previous key still inside its grace period.
+
     Args:
-        token: Base64 encoded HMAC token
+        token: HMAC token
         current_time: Optional timestamp to use for expiration check (for testing)
-        
+
     Returns:
-        Dict containing the decoded token data
-        
+        Dict containing the decoded token data, including its nonce
+
     Raises:
         ValueError: If the token is invalid, expired, or verification fails
         RuntimeError: If HMAC secret cannot be retrieved from Doppler
     """
     logger = get_logger(__name__)
-    
-    # Get HMAC secret from Doppler
-    try:
-        secret_str = await get_doppler_secret("HMAC_SECRET_KEY")
-        secret = secret_str.encode('utf-8')
-    except Exception as e:
-        logger.error("Failed to retrieve HMAC_SECRET_KEY from Doppler")
-        raise RuntimeError("Failed to retrieve HMAC secret from Doppler") from e
-    
+    keyring = await get_loaded_keyring()
+
     if current_time is None:
-        import time
         current_time = time.time()
-    
+
     try:
-        # Decode the token
-        token_data = json.loads(base64.b64decode(token).decode('utf-8'))
-        
-        # Verify required fields
-        if not isinstance(token_data, dict) or 'data' not in token_data or 'signature' not in token_data:
-            raise ValueError("Invalid token format")
-        
-        # Recreate the signature
-        json_data = json.dumps(token_data['data'], sort_keys=True).encode('utf-8')
-        expected_signature = hmac.new(
-            secret,
-            json_data,
-            hashlib.sha256
-        ).digest()
-        
-        # Compare signatures
-        provided_signature = base64.b64decode(token_data['signature'].encode('utf-8'))
-        if not hmac.compare_digest(expected_signature, provided_signature):
-            raise ValueError("Invalid token signature")
-        
+        if token.startswith(_LEGACY_TOKEN_PREFIX):
+            data = _verify_legacy_token(keyring, token)
+        else:
+            data = verify_compact_token(keyring, token)
+
         # Check if token is expired
-        if 'expires_at' in token_data['data'] and token_data['data']['expires_at'] < current_time:
+        if 'expires_at' in data and data['expires_at'] < current_time:
             raise ValueError("Token has expired")
-        
-        return token_data['data']
-        
-    except (json.JSONDecodeError, UnicodeDecodeError, base64.binascii.Error) as e:
-        raise ValueError(f"Invalid token encoding: {str(e)}")
+
+        return data
+
     except Exception as e:
         logger.warning("Token verification failed: %s", str(e))
         raise
@@ -0,0 +1,65 @@
+"""
+Helpers for HTTP caching headers on API responses (ETag, Cache-Control, 304).
+"""
+import hashlib
+from typing import Dict, Optional
+
+
+def make_etag(*parts: str) -> str:
+    """
+    Build a strong ETag from the values that fully determine a response body.
+
+    Args:
+        parts: Values the body is derived from (e.g. a video ID)
+
+    Returns:
+        str: Quoted ETag
+    """
+    digest = hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, per RFC 9110).
+
+    Args:
+        if_none_match: Request If-None-Match header value
+        etag: Current ETag of the resource
+
+    Returns:
+        bool: True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque_tag:
+            return True
+    return False
+
+
+def cache_headers(etag: str, max_age: int, stale_while_revalidate: int) -> Dict[str, str]:
+    """
+    Build the caching headers for a public, revalidatable response.
+
+    Args:
+        etag: Response ETag
+        max_age: Seconds the response is fresh
+        stale_while_revalidate: Seconds it may be served stale while revalidating
+
+    Returns:
+        Dict of headers
+    """
+    return {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={max(0, int(max_age))}, "
+            f"stale-while-revalidate={max(0, int(stale_while_revalidate))}"
+        ),
+    }
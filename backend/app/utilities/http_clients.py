@@ -0,0 +1,145 @@
+"""
+Process-wide pooled HTTP clients for outbound API calls.
+
+Each upstream host gets one long-lived httpx.AsyncClient with keep-alive
+(and HTTP/2 when the optional h2 package is installed), so calls reuse warm
+connections instead of paying for DNS, TCP and TLS every time. The clients
+are opened and warmed in the app lifespan and closed on shutdown.
+
+Per pool, the http.<pool>.* metrics count requests, new TCP connections and
+TLS handshakes; http.<pool>.reuse_pct is the share of requests that were
+served on an existing connection.
+"""
+import asyncio
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment, set_gauge
+from app.utilities.settings import get_settings
+
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def get_pool_origins() -> Dict[str, str]:
+    """Get the upstream origin of each pool"""
+    settings = get_settings()
+    mailgun_url = httpx.URL(settings.mailgun.url)
+    origins = {
+        "doppler": "https://api.doppler.com",
+        "youtube": "https://www.googleapis.com",
+        "recaptcha": "https://www.google.com",
+        "mailgun": f"{mailgun_url.scheme}://{mailgun_url.host}",
+    }
+    if settings.websub.enabled:
+        hub_url = httpx.URL(settings.websub.hub_url)
+        origins["websub"] = f"{hub_url.scheme}://{hub_url.netloc.decode('ascii')}"
+    return origins
+
+
+class _PoolStats:
+    """Connection counters for one pool"""
+
+    def __init__(self, pool: str):
+        self.pool = pool
+        self.requests = 0
+        self.connects = 0
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        increment(f"http.{self.pool}.requests")
+        # httpcore reports connection setup through the trace extension
+        request.extensions["trace"] = self.trace
+
+    async def trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connects += 1
+            increment(f"http.{self.pool}.connects")
+        elif event_name == "connection.start_tls.complete":
+            increment(f"http.{self.pool}.tls_handshakes")
+        elif event_name.endswith(".response_closed.complete") and self.requests:
+            reused = max(0, self.requests - self.connects)
+            set_gauge(f"http.{self.pool}.reuse_pct", int(100 * reused / self.requests))
+
+
+class HttpClientManager:
+    """
+    Singleton owning one pooled AsyncClient per upstream host.
+    """
+    _instance: Optional['HttpClientManager'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'HttpClientManager':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _create_client(self, pool: str) -> httpx.AsyncClient:
+        http_settings = get_settings().http
+        stats = _PoolStats(pool)
+        http2 = http_settings.http2 and HTTP2_AVAILABLE
+        self._logger.debug(f"Creating HTTP client pool - Pool: {pool}, HTTP/2: {http2}")
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=http_settings.max_connections,
+                max_keepalive_connections=http_settings.max_keepalive_connections,
+                keepalive_expiry=http_settings.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                http_settings.read_timeout,
+                connect=http_settings.connect_timeout
+            ),
+            event_hooks={"request": [stats.on_request]}
+        )
+
+    def get_client(self, pool: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client for an upstream.
+
+        Args:
+            pool: Pool name (see get_pool_origins)
+
+        Returns:
+            httpx.AsyncClient: Shared client; callers must not close it
+        """
+        client = self._clients.get(pool)
+        if client is None or client.is_closed:
+            client = self._create_client(pool)
+            self._clients[pool] = client
+        return client
+
+    async def warm_up(self) -> None:
+        """Open a connection to every upstream so the first real call finds it warm"""
+        async def connect(pool: str, origin: str) -> None:
+            try:
+                await self.get_client(pool).head(origin)
+            except httpx.HTTPError as e:
+                # Warmup is best effort; the real call will connect on demand
+                self._logger.warning(f"HTTP pool warmup failed - Pool: {pool}, Error: {str(e)}")
+
+        await asyncio.gather(*(connect(pool, origin) for pool, origin in get_pool_origins().items()))
+
+    async def close(self) -> None:
+        """Close all pooled clients"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def get_http_client_manager() -> HttpClientManager:
+    """Get the singleton instance of HttpClientManager."""
+    return HttpClientManager.get_instance()
+
+
+def get_http_client(pool: str) -> httpx.AsyncClient:
+    """Get the pooled client for an upstream (see HttpClientManager.get_client)"""
+    return HttpClientManager.get_instance().get_client(pool)
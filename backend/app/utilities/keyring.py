@@ -0,0 +1,231 @@
+"""
+In-memory HMAC keyrings for checkout tokens and download links.
+
+Each key is tagged with a one-byte key ID and keeps a prebuilt keyed hmac
+object, which is copied per operation instead of re-keying from scratch.
+The keyring is loaded from Doppler once and updated whenever the Doppler
+secrets refresh, so signing and verifying never wait on the secret store.
+
+Rotation: when HMAC_SECRET_KEY changes, the old key is kept for verification
+for the configured grace period, so tokens already handed out stay valid.
+During a planned rotation the old key can also be published explicitly as
+HMAC_SECRET_KEY_PREVIOUS.
+
+Download links live for weeks rather than minutes, so they are signed with
+their own secret (DOWNLOAD_LINK_SECRET_KEY, see DownloadKeyring): rotating
+the checkout key never touches them, and a rotated-out download key keeps
+verifying for the whole link lifetime.
+"""
+import hashlib
+import hmac
+import time
+from typing import Dict, List, Optional
+
+from app.utilities.doppler_utils import DopplerSecrets
+from app.utilities.logger import get_logger
+from app.utilities.settings import get_settings
+
+
+CURRENT_KEY_NAME = "HMAC_SECRET_KEY"
+PREVIOUS_KEY_NAME = "HMAC_SECRET_KEY_PREVIOUS"
+DOWNLOAD_KEY_NAME = "DOWNLOAD_LINK_SECRET_KEY"
+DOWNLOAD_PREVIOUS_KEY_NAME = "DOWNLOAD_LINK_SECRET_KEY_PREVIOUS"
+
+
+def derive_key_id(secret: bytes) -> int:
+    """Derive a stable one-byte key ID from a secret"""
+    return hashlib.sha256(b"brawny-originals key id:" + secret).digest()[0]
+
+
+class HmacKey:
+    """
+    A single signing key with its precomputed keyed context.
+    """
+
+    def __init__(self, secret: bytes, retired_at: Optional[float] = None):
+        self.secret = secret
+        self.kid = derive_key_id(secret)
+        self.retired_at = retired_at
+        self._template = hmac.new(secret, digestmod=hashlib.sha256)
+
+    def digest(self, body: bytes) -> bytes:
+        """Compute HMAC-SHA256 of body"""
+        mac = self._template.copy()
+        mac.update(body)
+        return mac.digest()
+
+
+class HmacKeyring:
+    """
+    Singleton holding the current signing key and previous verification keys.
+    """
+    _instance: Optional['HmacKeyring'] = None
+    current_key_name: str = CURRENT_KEY_NAME
+    previous_key_name: str = PREVIOUS_KEY_NAME
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._current: Optional[HmacKey] = None
+        self._previous: List[HmacKey] = []
+
+    @classmethod
+    def get_instance(cls) -> 'HmacKeyring':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether a signing key is available"""
+        return self._current is not None
+
+    @property
+    def current(self) -> HmacKey:
+        """The key new tokens are signed with"""
+        if self._current is None:
+            raise RuntimeError("HMAC keyring has not been loaded")
+        return self._current
+
+    def load(self, secrets: Dict[str, str]) -> None:
+        """
+        Update the keyring from a secrets mapping.
+
+        Args:
+            secrets: Secrets from Doppler
+
+        Raises:
+            RuntimeError: If the current key is missing
+        """
+        current_secret = secrets.get(self.current_key_name)
+        if not current_secret:
+            raise RuntimeError(f"{self.current_key_name} is not configured")
+        current_bytes = current_secret.encode('utf-8')
+        now = time.time()
+
+        previous: List[HmacKey] = []
+        if self._current is not None and self._current.secret != current_bytes:
+            # Rotated: keep the old key around for in-flight tokens
+            self._logger.info(f"HMAC key rotated - Key: {self.current_key_name}, Old key ID: {self._current.kid}")
+            previous.append(HmacKey(self._current.secret, retired_at=now))
+        for key in self._previous:
+            if key.secret != current_bytes and all(key.secret != p.secret for p in previous):
+                previous.append(key)
+
+        previous_secret = secrets.get(self.previous_key_name)
+        if previous_secret:
+            previous_bytes = previous_secret.encode('utf-8')
+            if previous_bytes != current_bytes and all(previous_bytes != p.secret for p in previous):
+                # Explicitly configured, so it does not expire on its own
+                previous.append(HmacKey(previous_bytes))
+
+        new_current = (
+            self._current if self._current is not None and self._current.secret == current_bytes
+            else HmacKey(current_bytes)
+        )
+        # Swap in complete state
+        self._current, self._previous = new_current, previous
+        self._logger.debug(
+            f"HMAC keyring loaded - Key: {self.current_key_name}, Current key ID: {self._current.kid}, "
+            f"Previous key IDs: {[key.kid for key in self._previous]}"
+        )
+
+    def verification_keys(self, kid: Optional[int] = None) -> List[HmacKey]:
+        """
+        Get the keys a token may be verified with.
+
+        Args:
+            kid: Key ID from the token, or None to try every usable key
+
+        Returns:
+            List of candidate keys, current key first
+        """
+        grace_period = self.grace_period()
+        now = time.time()
+        keys = [self.current] + [
+            key for key in self._previous
+            if key.retired_at is None or now - key.retired_at <= grace_period
+        ]
+        if kid is None:
+            return keys
+        return [key for key in keys if key.kid == kid]
+
+    def grace_period(self) -> float:
+        """Seconds a rotated-out key keeps verifying"""
+        return get_settings().tokens.key_grace_period
+
+    def on_secrets_refreshed(self, secrets: Dict[str, str]) -> None:
+        """Keep the keyring in step with Doppler"""
+        try:
+            self.load(secrets)
+        except Exception as e:
+            self._logger.error(f"Failed to update HMAC keyring {self.current_key_name}: {str(e)}")
+
+
+class DownloadKeyring(HmacKeyring):
+    """
+    Singleton keyring for download links.
+
+    Rotated-out keys keep verifying for fulfillment.link_lifetime, so every
+    link handed out before a rotation works until it expires.
+    """
+    _instance: Optional['DownloadKeyring'] = None
+    current_key_name: str = DOWNLOAD_KEY_NAME
+    previous_key_name: str = DOWNLOAD_PREVIOUS_KEY_NAME
+
+    def grace_period(self) -> float:
+        return get_settings().fulfillment.link_lifetime
+
+
+def get_keyring() -> HmacKeyring:
+    """Get the singleton instance of HmacKeyring."""
+    return HmacKeyring.get_instance()
+
+
+def get_download_keyring() -> DownloadKeyring:
+    """Get the singleton instance of DownloadKeyring."""
+    return DownloadKeyring.get_instance()
+
+
+async def load_keyring(keyring: Optional[HmacKeyring] = None) -> HmacKeyring:
+    """
+    Load a keyring from Doppler and subscribe it to secret refreshes.
+
+    Args:
+        keyring: Keyring to load (defaults to the checkout token keyring)
+
+    Returns:
+        HmacKeyring: The loaded keyring
+
+    Raises:
+        RuntimeError: If the keys cannot be loaded
+    """
+    keyring = keyring or get_keyring()
+    doppler = DopplerSecrets.get_instance()
+    try:
+        secrets = await doppler.get_all_secrets()
+    except Exception as e:
+        get_logger(__name__).error(f"Failed to retrieve {keyring.current_key_name} from Doppler")
+        raise RuntimeError("Failed to retrieve HMAC secret from Doppler") from e
+    keyring.load(secrets)
+    doppler.add_refresh_listener(keyring.on_secrets_refreshed)
+    return keyring
+
+
+async def get_loaded_keyring(keyring: Optional[HmacKeyring] = None) -> HmacKeyring:
+    """
+    Get a keyring, loading it from Doppler only if warmup did not.
+
+    Args:
+        keyring: Keyring to get (defaults to the checkout token keyring)
+
+    Returns:
+        HmacKeyring: The loaded keyring
+
+    Raises:
+        RuntimeError: If the keys cannot be loaded
+    """
+    keyring = keyring or get_keyring()
+    if not keyring.is_loaded:
+        keyring = await load_keyring(keyring)
+    return keyring
@@ -0,0 +1,83 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters and timings are kept per worker process and exposed through the
+/api/metrics endpoint. Nothing here does any I/O, so it is safe to call from
+hot paths.
+"""
+import threading
+from typing import Dict, Any, Optional
+
+
+class MetricsRegistry:
+    """
+    Singleton registry holding counters and timing summaries.
+    """
+    _instance: Optional['MetricsRegistry'] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'MetricsRegistry':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increment a counter by the given value"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: int) -> None:
+        """Set a counter to an absolute value"""
+        with self._lock:
+            self._counters[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a timing observation (in seconds)"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+                self._timings[name] = timing
+            timing['count'] += 1
+            timing['total'] += value
+            timing['last'] = value
+            if value > timing['max']:
+                timing['max'] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of all counters and timing summaries"""
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                timings[name] = dict(timing)
+                timings[name]['avg'] = timing['total'] / timing['count'] if timing['count'] else 0.0
+            return {
+                'counters': dict(self._counters),
+                'timings': timings
+            }
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the singleton instance of MetricsRegistry."""
+    return MetricsRegistry.get_instance()
+
+
+def increment(name: str, value: int = 1) -> None:
+    """Increment a counter in the process-wide registry"""
+    MetricsRegistry.get_instance().increment(name, value)
+
+
+def set_gauge(name: str, value: int) -> None:
+    """Set a gauge in the process-wide registry"""
+    MetricsRegistry.get_instance().set_gauge(name, value)
+
+
+def observe(name: str, value: float) -> None:
+    """Record a timing in the process-wide registry"""
+    MetricsRegistry.get_instance().observe(name, value)
@@ -0,0 +1,210 @@
+"""
+Consumed-nonce stores used to make checkout tokens single-use.
+
+Two backends share the same interface:
+
+- TimingWheelNonceIndex: in-process index. Nonces are bucketed by expiry
+  second in a timing wheel, so expiring them never needs a full scan.
+- SharedNonceTable: fixed-size bucketed table in an mmap'd file in the
+  state directory, shared by all workers on the host. Slots whose expiry
+  has passed are reused in place, so the file never grows. The capacity is
+  part of the file name: a worker with a new capacity opens a new table
+  instead of resizing one that workers with the old capacity still map.
+
+Both are bounded: when full they refuse new nonces instead of evicting
+live ones, which would re-open the replay window.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from app.utilities.logger import get_logger
+from app.utilities.settings import get_settings, get_state_dir
+
+
+NONCE_SIZE = 8
+TABLE_FILE_NAME = "nonces-{capacity}.table"
+
+
+class NonceStoreFullError(RuntimeError):
+    """Raised when a nonce store has no room for another live nonce"""
+
+
+class TimingWheelNonceIndex:
+    """
+    Memory-bounded consumed-nonce index with timing-wheel expiry.
+    """
+
+    def __init__(self, capacity: int, horizon: int):
+        """
+        Args:
+            capacity: Maximum number of live nonces
+            horizon: Longest time (seconds) a nonce needs to be remembered
+        """
+        self._capacity = capacity
+        self._horizon = horizon
+        self._slots: List[Set[bytes]] = [set() for _ in range(horizon + 1)]
+        self._nonces: Dict[bytes, int] = {}
+        self._cursor: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._nonces)
+
+    def _advance(self, now: int) -> None:
+        """Expire every slot the wheel has moved past since the last call"""
+        if self._cursor is None:
+            self._cursor = now
+            return
+        # At most one full turn of the wheel ever needs clearing
+        start = max(self._cursor + 1, now - self._horizon)
+        for second in range(start, now + 1):
+            slot = self._slots[second % len(self._slots)]
+            for nonce in slot:
+                del self._nonces[nonce]
+            slot.clear()
+        self._cursor = max(self._cursor, now)
+
+    def consume(self, nonce: bytes, expires_at: int, now: Optional[int] = None) -> bool:
+        """
+        Record a nonce as used.
+
+        Args:
+            nonce: Token nonce
+            expires_at: When the token expires; the nonce is kept until then
+            now: Current time (for testing)
+
+        Returns:
+            bool: True if this is the first use, False if it was already used
+
+        Raises:
+            NonceStoreFullError: If the index is at capacity
+        """
+        now = int(time.time()) if now is None else now
+        self._advance(now)
+        if nonce in self._nonces:
+            return False
+        if len(self._nonces) >= self._capacity:
+            raise NonceStoreFullError("Nonce index is full")
+        # Tokens are valid through their expires_at second, so keep one past it
+        expiry = min(max(expires_at, now) + 1, now + self._horizon)
+        self._slots[expiry % len(self._slots)].add(nonce)
+        self._nonces[nonce] = expiry
+        return True
+
+
+class SharedNonceTable:
+    """
+    Consumed-nonce table in a memory-mapped file shared across workers.
+
+    The table is split into buckets of BUCKET_SIZE slots; each slot holds a
+    nonce and its expiry (0 = never used). Every nonce has two candidate
+    buckets and is stored in the one with more reusable slots ("power of two
+    choices"), which keeps bucket load even. Lookups and inserts therefore
+    touch a constant 2 * BUCKET_SIZE slots, and expired slots are reused in
+    place, so expiry costs nothing.
+    """
+    BUCKET_SIZE = 16
+    _SLOT = struct.Struct(f"<{NONCE_SIZE}sI")
+
+    def __init__(self, path: Path, capacity: int):
+        self._logger = get_logger(__name__)
+        self._bucket_count = max(2, capacity // self.BUCKET_SIZE)
+        self._bucket_bytes = self.BUCKET_SIZE * self._SLOT.size
+        size = self._bucket_count * self._bucket_bytes
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Only ever extend a new (empty) file: shrinking a file other workers
+            # have mapped would make their next access fail with SIGBUS
+            if os.fstat(self._fd).st_size < size:
+                self._logger.info(f"Initializing nonce table - Path: {path}, Buckets: {self._bucket_count}")
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    def _scan_bucket(self, bucket: int, nonce: bytes, now: int):
+        """Return (found live nonce, reusable slot offsets) for a bucket"""
+        reusable = []
+        base = bucket * self._bucket_bytes
+        for offset in range(base, base + self._bucket_bytes, self._SLOT.size):
+            slot_nonce, slot_expiry = self._SLOT.unpack_from(self._map, offset)
+            if slot_expiry <= now:
+                reusable.append(offset)
+            elif slot_nonce == nonce:
+                return True, reusable
+        return False, reusable
+
+    def consume(self, nonce: bytes, expires_at: int, now: Optional[int] = None) -> bool:
+        """
+        Record a nonce as used. See TimingWheelNonceIndex.consume.
+        """
+        now = int(time.time()) if now is None else now
+        # Tokens are valid through their expires_at second, so keep one past it
+        expiry = max(expires_at, now) + 1
+        first = int.from_bytes(nonce[:4], "little") % self._bucket_count
+        second = int.from_bytes(nonce[4:8], "little") % self._bucket_count
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            found, first_free = self._scan_bucket(first, nonce, now)
+            if found:
+                return False
+            found, second_free = self._scan_bucket(second, nonce, now)
+            if found:
+                return False
+            free = first_free if len(first_free) >= len(second_free) else second_free
+            if not free:
+                raise NonceStoreFullError("Nonce table is full")
+            self._SLOT.pack_into(self._map, free[0], nonce, expiry)
+            return True
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class _NonceStoreCache:
+    """Process-wide nonce store"""
+    store = None
+
+
+def get_nonce_store():
+    """
+    Get the configured nonce store.
+
+    Returns:
+        TimingWheelNonceIndex or SharedNonceTable, per [TOKENS] nonce_store
+    """
+    if _NonceStoreCache.store is None:
+        token_settings = get_settings().tokens
+        if token_settings.nonce_store == "file":
+            _NonceStoreCache.store = SharedNonceTable(
+                get_state_dir() / TABLE_FILE_NAME.format(capacity=token_settings.nonce_capacity),
+                token_settings.nonce_capacity
+            )
+        else:
+            _NonceStoreCache.store = TimingWheelNonceIndex(
+                token_settings.nonce_capacity,
+                token_settings.nonce_horizon
+            )
+    return _NonceStoreCache.store
+
+
+def consume_nonce(nonce: bytes, expires_at: int) -> bool:
+    """
+    Mark a token nonce as used.
+
+    Args:
+        nonce: Token nonce
+        expires_at: Token expiry timestamp
+
+    Returns:
+        bool: True on first use, False if the nonce was already consumed
+
+    Raises:
+        NonceStoreFullError: If the store has no room
+    """
+    return get_nonce_store().consume(nonce, expires_at)
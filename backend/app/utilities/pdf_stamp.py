@@ -0,0 +1,276 @@
+"""
+Per-buyer text stamps on PDFs, written as an incremental update.
+
+The stamp is appended to the unchanged source file instead of rewriting it:
+a font, a "q" stream, a stamp stream per page size, the modified page
+objects (each page's content becomes [q, original..., stamp]) and a new
+cross-reference section pointing back at the original one.
+
+Everything except the stamp text is derived from the source alone, so it is
+computed once per source and process (StampTemplate); stamping an order
+only formats the stamp streams and the cross-reference section. This
+module only depends on pikepdf and the standard library, so it is cheap
+to import in the watermark worker processes.
+"""
+import os
+import shutil
+import zlib
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+import pikepdf
+
+
+FONT_RESOURCE_NAME = "/BOWm"
+_MARGIN = 18.0  # Points from the bottom-left corner of the page
+# Trailer keys written per update; everything else (/Root, /Info, /ID...) is carried over
+_UPDATE_TRAILER_KEYS = {"/Size", "/Prev", "/XRefStm", "/Type", "/W", "/Index", "/Filter", "/DecodeParms", "/Length"}
+
+
+def _escape_text(text: str) -> bytes:
+    """Encode text as a PDF literal string (WinAnsi)"""
+    raw = text.encode('cp1252', errors='replace')
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _find_startxref(data: bytes) -> int:
+    """Offset of the last cross-reference section"""
+    position = data.rfind(b"startxref", max(0, len(data) - 2048))
+    if position < 0:
+        raise ValueError("No startxref found")
+    return int(data[position + len(b"startxref"):].split()[0])
+
+
+def _inherited(page: pikepdf.Dictionary, key: str):
+    """Get a page attribute, following /Parent for inheritable ones"""
+    node = page
+    while node is not None:
+        if key in node:
+            return node[key]
+        node = node.get("/Parent")
+    return None
+
+
+def _unparse(value) -> bytes:
+    """Serialize a value read from a pikepdf dictionary (scalars come back as Python types)"""
+    if isinstance(value, pikepdf.Object):
+        return value.unparse()
+    if isinstance(value, bool):
+        return b"true" if value else b"false"
+    if isinstance(value, int):
+        return b"%d" % value
+    if isinstance(value, (float, Decimal)):
+        return str(value).encode('ascii')
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _unparse_dict(items: List[Tuple[str, bytes]]) -> bytes:
+    return b"<< " + b" ".join(key.encode('ascii') + b" " + value for key, value in items) + b" >>"
+
+
+class StampTemplate:
+    """
+    The buyer-independent part of the incremental update for one source PDF.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.path = path
+        self.size = len(data)
+        self.prev_xref = _find_startxref(data)
+        self.xref_stream = not data[self.prev_xref:self.prev_xref + 4].startswith(b"xref")
+        self.needs_newline = not data.endswith(b"\n")
+
+        with pikepdf.open(path) as pdf:
+            if pdf.is_encrypted:
+                raise ValueError("Encrypted PDFs cannot be stamped")
+            trailer = pdf.trailer
+            self.trailer_items = [
+                (key, _unparse(value)) for key, value in trailer.items() if key not in _UPDATE_TRAILER_KEYS
+            ]
+            next_number = int(trailer.Size)
+
+            # Objects shared by every page: font and the graphics state save
+            self.font_number, self.q_number = next_number, next_number + 1
+            next_number += 2
+
+            # One stamp stream per distinct page box, so text can be placed per size
+            self.stamp_numbers: Dict[Tuple[float, float], int] = {}
+            self.page_objects: List[Tuple[int, int, bytes]] = []
+            for page in pdf.pages:
+                box = _inherited(page.obj, "/CropBox") or _inherited(page.obj, "/MediaBox")
+                origin = (float(box[0]), float(box[1]))
+                if origin not in self.stamp_numbers:
+                    self.stamp_numbers[origin] = next_number
+                    next_number += 1
+                number, generation = page.obj.objgen
+                self.page_objects.append((
+                    number,
+                    generation,
+                    self._page_object(page.obj, self.stamp_numbers[origin])
+                ))
+            self.size_after = next_number
+        self.page_count = len(self.page_objects)
+
+    def _page_object(self, page: pikepdf.Dictionary, stamp_number: int) -> bytes:
+        """The page dictionary with the stamp appended to its content and font resources"""
+        contents = page.get("/Contents")
+        if contents is None:
+            original = b""
+        elif isinstance(contents, pikepdf.Array):
+            original = b" ".join(_unparse(item) for item in contents)
+        else:
+            original = _unparse(contents)
+        new_contents = b"[%d 0 R %s %d 0 R]" % (self.q_number, original, stamp_number)
+
+        resources = _inherited(page, "/Resources") or pikepdf.Dictionary()
+        fonts = resources.get("/Font") or pikepdf.Dictionary()
+        font_items = [(key, _unparse(value)) for key, value in fonts.items() if key != FONT_RESOURCE_NAME]
+        font_items.append((FONT_RESOURCE_NAME, b"%d 0 R" % self.font_number))
+        resource_items = [(key, _unparse(value)) for key, value in resources.items() if key != "/Font"]
+        resource_items.append(("/Font", _unparse_dict(font_items)))
+
+        items = [
+            (key, _unparse(value)) for key, value in page.items()
+            if key not in ("/Contents", "/Resources")
+        ]
+        items.append(("/Contents", new_contents))
+        items.append(("/Resources", _unparse_dict(resource_items)))
+        return _unparse_dict(items)
+
+    def render_update(self, text: str, font_size: float) -> bytes:
+        """
+        Build the incremental update stamping text on every page.
+
+        Args:
+            text: Stamp text
+            font_size: Font size in points
+
+        Returns:
+            bytes: Data to append to the source file
+        """
+        objects: List[Tuple[int, int, bytes]] = [
+            (self.font_number, 0, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"),
+            (self.q_number, 0, self._stream(b"q\n")),
+        ]
+        literal = _escape_text(text)
+        for (x, y), number in self.stamp_numbers.items():
+            content = b"Q\nq BT %s %g Tf 0.45 g 1 0 0 1 %g %g Tm %s Tj ET Q\n" % (
+                FONT_RESOURCE_NAME.encode('ascii'), font_size, x + _MARGIN, y + _MARGIN / 2, literal
+            )
+            objects.append((number, 0, self._stream(content)))
+        objects.extend(self.page_objects)
+
+        update = bytearray(b"\n" if self.needs_newline else b"")
+        offsets: Dict[int, Tuple[int, int]] = {}
+        for number, generation, body in objects:
+            offsets[number] = (self.size + len(update), generation)
+            update += b"%d %d obj\n%s\nendobj\n" % (number, generation, body)
+        xref_offset = self.size + len(update)
+        if self.xref_stream:
+            update += self._xref_stream(offsets, xref_offset)
+        else:
+            update += self._xref_table(offsets)
+        update += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+        return bytes(update)
+
+    @staticmethod
+    def _stream(content: bytes) -> bytes:
+        return b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+    def _trailer_items(self, size: int) -> List[Tuple[str, bytes]]:
+        return [("/Size", b"%d" % size), ("/Prev", b"%d" % self.prev_xref)] + self.trailer_items
+
+    @staticmethod
+    def _subsections(numbers: List[int]) -> List[List[int]]:
+        subsections: List[List[int]] = []
+        for number in numbers:
+            if subsections and subsections[-1][-1] == number - 1:
+                subsections[-1].append(number)
+            else:
+                subsections.append([number])
+        return subsections
+
+    def _xref_table(self, offsets: Dict[int, Tuple[int, int]]) -> bytes:
+        table = bytearray(b"xref\n")
+        for subsection in self._subsections(sorted(offsets)):
+            table += b"%d %d\n" % (subsection[0], len(subsection))
+            for number in subsection:
+                offset, generation = offsets[number]
+                table += b"%010d %05d n\r\n" % (offset, generation)
+        return bytes(table) + b"trailer\n" + _unparse_dict(self._trailer_items(self.size_after)) + b"\n"
+
+    def _xref_stream(self, offsets: Dict[int, Tuple[int, int]], xref_offset: int) -> bytes:
+        """Cross-reference stream (for sources whose own cross-reference is a stream)"""
+        xref_number = self.size_after
+        offsets = dict(offsets)
+        offsets[xref_number] = (xref_offset, 0)
+        index = []
+        rows = bytearray()
+        for subsection in self._subsections(sorted(offsets)):
+            index += [subsection[0], len(subsection)]
+            for number in subsection:
+                offset, generation = offsets[number]
+                rows += b"\x01" + offset.to_bytes(4, "big") + generation.to_bytes(2, "big")
+        data = zlib.compress(bytes(rows))
+        items = [
+            ("/Type", b"/XRef"),
+            ("/W", b"[1 4 2]"),
+            ("/Index", b"[" + b" ".join(b"%d" % value for value in index) + b"]"),
+            ("/Filter", b"/FlateDecode"),
+            ("/Length", b"%d" % len(data)),
+        ] + self._trailer_items(xref_number + 1)
+        return b"%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n" % (xref_number, _unparse_dict(items), data)
+
+
+# Templates parsed in this process, by source path (and its mtime)
+_TEMPLATES: Dict[str, Tuple[int, StampTemplate]] = {}
+
+
+def get_stamp_template(path: str, mtime_ns: int) -> StampTemplate:
+    """Get the template for a source, parsing it only on first use or after it changed"""
+    cached = _TEMPLATES.get(path)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    template = StampTemplate(path)
+    _TEMPLATES[path] = (mtime_ns, template)
+    return template
+
+
+def stamp_pdf(path: str, mtime_ns: int, text: str, destination: str, font_size: float) -> int:
+    """
+    Write a stamped copy of a PDF (runs in a watermark worker process).
+
+    Args:
+        path: Source PDF
+        mtime_ns: Source mtime, to detect a changed source
+        text: Stamp text
+        destination: File to write; replaced atomically
+        font_size: Font size in points
+
+    Returns:
+        int: Number of pages stamped
+
+    Raises:
+        ValueError: If the source changed since mtime_ns or cannot be stamped
+    """
+    template = get_stamp_template(path, mtime_ns)
+    update = template.render_update(text, font_size)
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        # copyfile copies in the kernel (sendfile) where it can
+        shutil.copyfile(path, tmp_path)
+        stat = os.stat(tmp_path)
+        if stat.st_size != template.size or os.stat(path).st_mtime_ns != mtime_ns:
+            raise ValueError(f"Source changed while stamping: {path}")
+        with open(tmp_path, 'ab') as target:
+            target.write(update)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return template.page_count
@@ -0,0 +1,254 @@
+"""
+Memory-mapped cache of the program PDFs delivered on fulfillment.
+
+Each program PDF (its smallest variant, see program_variants) is mapped
+read-only once per process (at warmup) and shared by every order:
+attachments are streamed straight from the mapping through read-only
+memoryviews, so an order costs neither a disk read nor a copy of the file.
+The page cache backs the mapping, so all workers share one copy.
+
+A file is remapped when its mtime or size changes (checked at most once per
+CHECK_INTERVAL seconds). The check, the remap and the ETag hash of a new
+mapping touch the disk, so async code goes through get_async, which runs
+them in a thread and only returns a mapping inline while it needs no check. Senders still streaming the old mapping keep it
+alive until they finish; program files must be replaced atomically (new
+file, then rename), never rewritten in place.
+"""
+import asyncio
+import hashlib
+import io
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.utilities.catalog import get_catalog
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment, set_gauge
+from app.utilities.program_variants import get_program_variants
+
+
+CHECK_INTERVAL = 1.0  # Seconds between program file mtime checks
+
+
+class AssetReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a memoryview.
+
+    Each reader has its own position, so concurrent sends can stream the same
+    mapping; read() copies only the requested chunk.
+    """
+
+    def __init__(self, view: memoryview):
+        super().__init__()
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}")
+        self._position = position
+        return position
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        chunk = self._view[self._position:end].tobytes() if end > self._position else b""
+        self._position = max(self._position, end)
+        return chunk
+
+    def close(self) -> None:
+        # Drop our view so a replaced mapping can be unmapped once senders finish
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+class ProgramAsset:
+    """
+    One mapped program PDF.
+    """
+
+    def __init__(self, file_name: str, path: Path):
+        self.file_name = file_name
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.mtime_ns = stat.st_mtime_ns
+            self.size = stat.st_size
+            # mmap cannot map empty files
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        if self._mmap is not None and hasattr(mmap, "MADV_WILLNEED"):
+            # Start reading the file into the page cache now rather than on the first order
+            self._mmap.madvise(mmap.MADV_WILLNEED)
+        self.checked_at = time.monotonic()
+        self._etag: Optional[str] = None
+
+    @property
+    def etag(self) -> str:
+        """Strong ETag derived from the file contents (hashed on first use)"""
+        if self._etag is None:
+            self._etag = f'"{hashlib.sha256(self.view()).hexdigest()[:32]}"'
+        return self._etag
+
+    @property
+    def hashed(self) -> bool:
+        """Whether etag is computed already (reading it costs nothing)"""
+        return self._etag is not None
+
+    def view(self) -> memoryview:
+        """Get a read-only view of the file contents"""
+        if self._mmap is None:
+            return memoryview(b"")
+        return memoryview(self._mmap)
+
+    def open(self) -> AssetReader:
+        """Get a new file object over the contents (e.g. for a multipart upload)"""
+        return AssetReader(self.view())
+
+    def is_stale(self, stat: os.stat_result) -> bool:
+        """Whether the file on disk differs from the mapped one"""
+        return stat.st_mtime_ns != self.mtime_ns or stat.st_size != self.size
+
+
+class ProgramAssetCache:
+    """
+    Singleton mapping program file names to their ProgramAsset.
+
+    Old mappings are not closed on invalidation: memoryviews handed out
+    before keep them valid, and they are unmapped once the last one is released.
+    """
+    _instance: Optional['ProgramAssetCache'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._assets: Dict[str, ProgramAsset] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'ProgramAssetCache':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def get(self, file_name: str) -> ProgramAsset:
+        """
+        Get a program PDF, mapping it on first use or when it changed on disk.
+
+        Blocking when the file is due for a check; async code uses get_async.
+
+        Args:
+            file_name: Program PDF file name (see Catalog.get_program_by_file)
+
+        Returns:
+            ProgramAsset: The mapped file
+
+        Raises:
+            KeyError: If the file is not a program in the catalog
+            OSError: If the file cannot be read
+        """
+        asset = self._assets.get(file_name)
+        now = time.monotonic()
+        if asset is not None and now - asset.checked_at < CHECK_INTERVAL:
+            increment("program_assets.hit")
+            return asset
+
+        program = get_catalog().get_program_by_file(file_name)
+        if program is None:
+            raise KeyError(f"Unknown program file: {file_name}")
+        try:
+            path = get_program_variants().select(program)
+            if asset is not None:
+                stat = os.stat(path)
+        except OSError:
+            self._assets.pop(file_name, None)
+            raise
+        if asset is not None:
+            if asset.path == path and not asset.is_stale(stat):
+                asset.checked_at = now
+                increment("program_assets.hit")
+                return asset
+            self._logger.info(f"Program file changed, remapping - File: {file_name}, Path: {path}")
+
+        asset = ProgramAsset(file_name, path)
+        self._assets[file_name] = asset
+        increment("program_assets.map")
+        self._publish()
+        return asset
+
+    def _get_hashed(self, file_name: str) -> ProgramAsset:
+        asset = self.get(file_name)
+        asset.etag  # Hash a new mapping here rather than on the caller's thread
+        return asset
+
+    async def get_async(self, file_name: str) -> ProgramAsset:
+        """
+        Get a program PDF without blocking the event loop.
+
+        A mapping checked within CHECK_INTERVAL is returned directly; otherwise
+        the stat, any remap and the ETag hash run in a thread. See get.
+        """
+        asset = self._assets.get(file_name)
+        if asset is not None and time.monotonic() - asset.checked_at < CHECK_INTERVAL and asset.hashed:
+            increment("program_assets.hit")
+            return asset
+        return await asyncio.to_thread(self._get_hashed, file_name)
+
+    def preload(self) -> int:
+        """
+        Map (and hash) every program in the catalog.
+
+        Returns:
+            int: Total mapped bytes
+
+        Raises:
+            OSError: If a program file cannot be read
+        """
+        total_bytes = 0
+        for program in get_catalog().programs:
+            asset = self.get(program.file_name)
+            asset.etag  # Hash now rather than on the first download
+            total_bytes += asset.size
+        self._logger.debug(f"Preloaded program files - Bytes: {total_bytes}")
+        return total_bytes
+
+    def _publish(self) -> None:
+        set_gauge("program_assets.mapped_bytes", sum(asset.size for asset in self._assets.values()))
+
+
+def get_program_assets() -> ProgramAssetCache:
+    """Get the singleton instance of ProgramAssetCache."""
+    return ProgramAssetCache.get_instance()
+
+
+def _prepare_program_assets() -> None:
+    get_program_variants().build()
+    get_program_assets().preload()
+
+
+async def preload_program_assets() -> None:
+    """Build the program PDF variants and map them off the event loop (warmup step)"""
+    await asyncio.to_thread(_prepare_program_assets)
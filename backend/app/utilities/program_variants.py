@@ -0,0 +1,292 @@
+"""
+Size-optimized variants of the program PDFs.
+
+For every program the pipeline builds, with the optional pikepdf package:
+    optimized   lossless: identical images merged, unreferenced objects
+                dropped, streams recompressed, object streams, linearized
+    compressed  as optimized, plus photos re-encoded as JPEG at image_quality
+The smallest of these and the original is what the program asset cache
+serves (attachments and download links alike).
+
+Variant files are named after the hash of their source and the pipeline
+parameters and live in the state directory with a manifest, so they are
+built once per source change and shared by all workers; the build runs
+under an flock, so one worker builds while the others wait and reuse it.
+It runs at startup (warmup) and can be run ahead of a deploy with:
+    ENV=production python -m app.utilities.program_variants
+Until a source's variants are built the source itself is served.
+"""
+import fcntl
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.utilities.catalog import Program, get_catalog
+from app.utilities.helpers import atomic_write_bytes
+from app.utilities.logger import get_logger
+from app.utilities.metrics import set_gauge
+from app.utilities.settings import get_settings, get_state_dir
+
+try:
+    import pikepdf
+except ImportError:  # Optional: without it only the original files are served
+    pikepdf = None
+
+
+VARIANTS_DIR_NAME = "program_variants"
+MANIFEST_FILE_NAME = "manifest.json"
+LOCK_FILE_NAME = "program_variants.lock"
+PIPELINE_VERSION = 1  # Bump when the build steps change to rebuild all variants
+
+# Re-encode an image only if that saves at least this share of its size.
+# Lossless (Flate) images are mostly text and line art, which JPEG degrades,
+# so they must shrink a lot more than images that are already JPEG.
+_MIN_SAVING = {"/DCTDecode": 0.1, "/FlateDecode": 0.5}
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dedupe_images(pdf: 'pikepdf.Pdf') -> int:
+    """Point every page at one copy of byte-identical image XObjects"""
+    canonical: Dict[str, Any] = {}
+    merged = 0
+    for page in pdf.pages:
+        xobjects = page.obj.get("/Resources", {}).get("/XObject", {})
+        for name in list(xobjects.keys()):
+            xobject = xobjects[name]
+            if xobject.get("/Subtype") != pikepdf.Name.Image:
+                continue
+            key = hashlib.sha256(
+                repr(sorted((k, repr(v)) for k, v in xobject.items() if k != "/Length")).encode('utf-8')
+                + xobject.read_raw_bytes()
+            ).hexdigest()
+            original = canonical.setdefault(key, xobject)
+            if original.objgen != xobject.objgen:
+                xobjects[name] = original
+                merged += 1
+    return merged
+
+
+def _recompress_images(pdf: 'pikepdf.Pdf', quality: int) -> int:
+    """Re-encode 8-bit RGB/gray images as JPEG where that saves enough space"""
+    recompressed = 0
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Stream) or obj.get("/Subtype") != pikepdf.Name.Image:
+            continue
+        min_saving = _MIN_SAVING.get(str(obj.get("/Filter")))
+        if min_saving is None or obj.get("/BitsPerComponent") != 8 or "/Mask" in obj or obj.get("/ImageMask"):
+            continue
+        try:
+            image = pikepdf.PdfImage(obj).as_pil_image()
+        except Exception:
+            continue  # Color spaces Pillow cannot handle are left as they are
+        if image.mode not in ("RGB", "L"):
+            continue
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= len(obj.read_raw_bytes()) * (1 - min_saving):
+            obj.write(buffer.getvalue(), filter=pikepdf.Name.DCTDecode)
+            if "/DecodeParms" in obj:
+                del obj["/DecodeParms"]
+            recompressed += 1
+    return recompressed
+
+
+def _build_variant(source: Path, destination: Path, image_quality: Optional[int]) -> Optional[int]:
+    """
+    Write one optimized variant of a PDF.
+
+    Args:
+        source: Source PDF
+        destination: Variant file to write
+        image_quality: JPEG quality to re-encode images at, or None to keep them
+
+    Returns:
+        Optional[int]: Size of the variant in bytes, or None if no image was
+        worth re-encoding (the variant would equal the lossless one)
+    """
+    with pikepdf.open(source) as pdf:
+        page_count = len(pdf.pages)
+        _dedupe_images(pdf)
+        if image_quality is not None and not _recompress_images(pdf, image_quality):
+            return None
+        pdf.remove_unreferenced_resources()
+        tmp_path = destination.with_name(f".{destination.name}.tmp")
+        pdf.save(
+            tmp_path,
+            compress_streams=True,
+            recompress_flate=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            linearize=True
+        )
+    # Never serve a variant that lost pages
+    with pikepdf.open(tmp_path) as check:
+        if len(check.pages) != page_count:
+            os.unlink(tmp_path)
+            raise ValueError(f"Variant has {len(check.pages)} pages, source has {page_count}")
+    os.replace(tmp_path, destination)
+    return destination.stat().st_size
+
+
+class ProgramVariants:
+    """
+    Singleton holding the variants manifest and picking the file to serve.
+    """
+    _instance: Optional['ProgramVariants'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'ProgramVariants':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _variants_dir() -> Path:
+        variants_dir = get_state_dir() / VARIANTS_DIR_NAME
+        variants_dir.mkdir(mode=0o700, exist_ok=True)
+        return variants_dir
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            manifest = json.loads((self._variants_dir() / MANIFEST_FILE_NAME).read_bytes())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self._logger.warning(f"Ignoring unreadable program variants manifest: {str(e)}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def _is_current(self, entry: Optional[Dict[str, Any]], pipeline: str) -> bool:
+        """Whether an entry's variant files exist and were built by this pipeline"""
+        if not entry or entry.get("pipeline") != pipeline:
+            return False
+        variants_dir = self._variants_dir()
+        return all(
+            variant["file"] is None or (variants_dir / variant["file"]).exists()
+            for variant in entry["variants"].values()
+        )
+
+    def _build_entry(self, program: Program, source_hash: str, pipeline: str) -> Dict[str, Any]:
+        source = program.pdf_path
+        variants: Dict[str, Dict[str, Any]] = {"original": {"file": None, "size": source.stat().st_size}}
+        if pikepdf is not None:
+            image_quality = get_settings().program_variants.image_quality
+            for variant, quality in (("optimized", None), ("compressed", image_quality)):
+                file_name = f"{source.stem}-{source_hash[:16]}-{pipeline}-{variant}.pdf"
+                try:
+                    size = _build_variant(source, self._variants_dir() / file_name, quality)
+                except Exception as e:
+                    self._logger.warning(f"Failed to build program variant - File: {program.file_name}, Variant: {variant}, Error: {str(e)}")
+                    continue
+                if size is None:
+                    continue
+                variants[variant] = {"file": file_name, "size": size}
+        best = min(variants, key=lambda name: variants[name]["size"])
+        sizes = {name: variant["size"] for name, variant in variants.items()}
+        self._logger.info(f"Built program variants - File: {program.file_name}, Sizes: {sizes}, Serving: {best}")
+        return {"source_hash": source_hash, "pipeline": pipeline, "variants": variants, "best": best}
+
+    def build(self) -> None:
+        """
+        Build missing or outdated variants for every program and load the manifest.
+
+        Blocking; run off the event loop.
+        """
+        if not get_settings().program_variants.enabled:
+            self._manifest = {}
+            return
+        if pikepdf is None:
+            self._logger.info("pikepdf is not installed, serving program files as authored")
+        # Rebuilds when the pipeline, its parameters or pikepdf availability change
+        pipeline = f"v{PIPELINE_VERSION}q{get_settings().program_variants.image_quality}" if pikepdf else "original"
+        state_dir = get_state_dir()
+        fd = os.open(state_dir / LOCK_FILE_NAME, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            manifest = self._read_manifest()
+            changed = False
+            for program in get_catalog().programs:
+                stat = program.pdf_path.stat()
+                entry = manifest.get(program.file_name)
+                if self._is_current(entry, pipeline) and (
+                    entry["source_mtime_ns"], entry["source_size"]) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                source_hash = _hash_file(program.pdf_path)
+                if not (self._is_current(entry, pipeline) and entry["source_hash"] == source_hash):
+                    entry = self._build_entry(program, source_hash, pipeline)
+                entry["source_mtime_ns"], entry["source_size"] = stat.st_mtime_ns, stat.st_size
+                manifest[program.file_name] = entry
+                changed = True
+            if changed:
+                atomic_write_bytes(self._variants_dir() / MANIFEST_FILE_NAME, json.dumps(manifest).encode('utf-8'))
+                self._remove_unused(manifest)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._manifest = manifest
+        set_gauge("program_variants.bytes_saved", sum(
+            entry["variants"]["original"]["size"] - entry["variants"][entry["best"]]["size"]
+            for entry in manifest.values()
+        ))
+
+    def _remove_unused(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        """Delete variant files of old sources (callers hold the lock)"""
+        in_use = {
+            variant["file"] for entry in manifest.values() for variant in entry["variants"].values()
+        }
+        for path in self._variants_dir().glob("*.pdf"):
+            if path.name not in in_use:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def select(self, program: Program) -> Path:
+        """
+        Get the file to serve for a program: its smallest variant, or the
+        source if it changed since the variants were built.
+
+        Args:
+            program: Program from the catalog
+
+        Returns:
+            Path: File to serve
+
+        Raises:
+            OSError: If the source file cannot be accessed
+        """
+        entry = self._manifest.get(program.file_name)
+        if entry is None or entry["best"] == "original":
+            return program.pdf_path
+        stat = program.pdf_path.stat()
+        if (entry["source_mtime_ns"], entry["source_size"]) != (stat.st_mtime_ns, stat.st_size):
+            return program.pdf_path
+        path = get_state_dir() / VARIANTS_DIR_NAME / entry["variants"][entry["best"]]["file"]
+        return path if path.exists() else program.pdf_path
+
+
+def get_program_variants() -> ProgramVariants:
+    """Get the singleton instance of ProgramVariants."""
+    return ProgramVariants.get_instance()
+
+
+if __name__ == "__main__":
+    from app.utilities.logger import init_logger
+
+    init_logger(log_level=logging.INFO)
+    get_program_variants().build()
@@ -6,6 +6,7 @@ from fastapi import HTTPException
 from app.utilities.logger import get_logger
 from app.utilities.doppler_utils import get_doppler_secret
 from app.utilities.helpers import is_dev
+from app.utilities.http_clients import get_http_client
 
 
 RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
@@ -48,50 +49,49 @@ async def verify_recaptcha_token(token: str) -> bool:
         return False
     
     try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"Sending reCAPTCHA verification request for token: {token[:10]}...")
-            response = await client.post(
-                RECAPTCHA_VERIFY_URL,
-                data={
-                    "secret": RECAPTCHA_SECRET_KEY,
-                    "response": token
-                },
-                timeout=15
-            )
+        client = get_http_client("recaptcha")
+        logger.debug(f"Sending reCAPTCHA verification request for token: {token[:10]}...")
+        response = await client.post(
+            RECAPTCHA_VERIFY_URL,
+            data={
+                "secret": RECAPTCHA_SECRET_KEY,
+                "response": token
+            }
+        )
+        
+        logger.debug(f"reCAPTCHA API response status: {response.status_code}")
+        
+        try:
+            result = response.json()
+            logger.debug(f"reCAPTCHA API response: {result}")
             
-            logger.debug(f"reCAPTCHA API response status: {response.status_code}")
+            if not isinstance(result, dict):
+                logger.error(f"Unexpected response format from reCAPTCHA API: {result}")
+                return False
             
-            try:
-                result = response.json()
-                logger.debug(f"reCAPTCHA API response: {result}")
-                
-                if not isinstance(result, dict):
-                    logger.error(f"Unexpected response format from reCAPTCHA API: {result}")
-                    return False
-                
-                if 'success' not in result:
-                    logger.error(f"Missing 'success' field in reCAPTCHA response: {result}")
-                    return False
-                
-                if not result['success']:
-                    error_codes = result.get('error-codes', [])
-                    logger.warning(f"reCAPTCHA verification failed. Error codes: {error_codes}")
-                    return False
-                
-                score = result.get('score', 0)
-                logger.info(f"reCAPTCHA verification successful. Score: {score}")
-                
-                # Bypass reCAPTCHA verification in development mode if is_dev() - Letting the above code run for testing purposes
-                if is_dev():
-                    logger.info("Development mode: Bypassing reCAPTCHA verification")
-                    return True
-
-                return score >= 0.5  # Adjust threshold as needed
-                
-            except ValueError as e:
-                logger.error(f"Error parsing reCAPTCHA response: {str(e)}. Response content: {response.text}")
+            if 'success' not in result:
+                logger.error(f"Missing 'success' field in reCAPTCHA response: {result}")
+                return False
+            
+            if not result['success']:
+                error_codes = result.get('error-codes', [])
+                logger.warning(f"reCAPTCHA verification failed. Error codes: {error_codes}")
                 return False
-                
+            
+            score = result.get('score', 0)
+            logger.info(f"reCAPTCHA verification successful. Score: {score}")
+            
+            # Bypass reCAPTCHA verification in development mode if is_dev() - Letting the above code run for testing purposes
+            if is_dev():
+                logger.info("Development mode: Bypassing reCAPTCHA verification")
+                return True
+
+            return score >= 0.5  # Adjust threshold as needed
+            
+        except ValueError as e:
+            logger.error(f"Error parsing reCAPTCHA response: {str(e)}. Response content: {response.text}")
+            return False
+            
     except httpx.TimeoutException:
         logger.error("reCAPTCHA verification request timed out")
         return False
@@ -0,0 +1,134 @@
+"""
+Encrypted secrets snapshot shared by all worker processes on a host.
+
+One worker fetches secrets from Doppler and writes the snapshot; the other
+workers read it from disk instead of making their own Doppler calls. The
+snapshot is encrypted with a key derived from DOPPLER_API_KEY, so it is
+never stored in plain text.
+"""
+import asyncio
+import base64
+import fcntl
+import json
+import os
+import struct
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple, AsyncIterator
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from app.utilities.helpers import atomic_write_bytes
+from app.utilities.settings import get_state_dir
+from app.utilities.logger import get_logger
+
+
+SNAPSHOT_FILE_NAME = "secrets.snapshot"
+LOCK_FILE_NAME = "secrets.lock"
+
+# magic, format version, generation
+_HEADER = struct.Struct("<4sHQ")
+_MAGIC = b"BOSS"
+_FORMAT_VERSION = 1
+
+
+class SharedSecretsStore:
+    """
+    File-backed secrets snapshot with a generation counter and a refresh lock.
+    """
+
+    def __init__(self, encryption_secret: str, directory: Optional[Path] = None):
+        self._logger = get_logger(__name__)
+        directory = directory or get_state_dir()
+        self._path = directory / SNAPSHOT_FILE_NAME
+        self._lock_path = directory / LOCK_FILE_NAME
+        self._fernet = Fernet(self._derive_key(encryption_secret))
+        self._generation = 0
+
+    @staticmethod
+    def _derive_key(encryption_secret: str) -> bytes:
+        """Derive a Fernet key from the given secret"""
+        key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"brawny-originals secrets snapshot"
+        ).derive(encryption_secret.encode('utf-8'))
+        return base64.urlsafe_b64encode(key)
+
+    @property
+    def generation(self) -> int:
+        """Generation of the last snapshot read or written by this process"""
+        return self._generation
+
+    def _read_header(self) -> Optional[Tuple[int, bytes]]:
+        """Read the snapshot file, returning its generation and encrypted payload"""
+        try:
+            data = self._path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, generation = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            self._logger.warning(f"Ignoring secrets snapshot with unknown format: {self._path}")
+            return None
+        return generation, data[_HEADER.size:]
+
+    def read(self) -> Optional[Tuple[Dict[str, str], float]]:
+        """
+        Read the current snapshot.
+
+        Returns:
+            Tuple of (secrets, fetched_at) or None if there is no usable snapshot
+        """
+        header = self._read_header()
+        if header is None:
+            return None
+        generation, token = header
+        try:
+            payload = json.loads(self._fernet.decrypt(token))
+        except (InvalidToken, ValueError):
+            # Written with a different DOPPLER_API_KEY or corrupted
+            self._logger.warning("Secrets snapshot could not be decrypted, ignoring it")
+            return None
+        self._generation = generation
+        return payload["secrets"], payload["fetched_at"]
+
+    def write(self, secrets: Dict[str, str], fetched_at: float) -> int:
+        """
+        Atomically replace the snapshot. Callers should hold the refresh lock.
+
+        Returns:
+            The generation of the new snapshot
+        """
+        header = self._read_header()
+        generation = (header[0] if header else 0) + 1
+        token = self._fernet.encrypt(
+            json.dumps({"secrets": secrets, "fetched_at": fetched_at}).encode('utf-8')
+        )
+        atomic_write_bytes(self._path, _HEADER.pack(_MAGIC, _FORMAT_VERSION, generation) + token)
+        self._generation = generation
+        self._logger.debug(f"Wrote secrets snapshot generation {generation}")
+        return generation
+
+    @asynccontextmanager
+    async def refresh_lock(self) -> AsyncIterator[None]:
+        """
+        Hold the cross-worker refresh lock.
+
+        Only one worker at a time refreshes from Doppler; the others wait here
+        and then pick up the snapshot it wrote.
+        """
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # flock blocks, so wait for it off the event loop
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
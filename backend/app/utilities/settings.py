@@ -0,0 +1,231 @@
+"""
+Typed, immutable application settings loaded from conf/{dev,prod}.ini.
+
+The INI file is parsed once per process. get_settings() returns the cached
+object and only re-reads the file when its mtime changes (checked at most
+once per CHECK_INTERVAL seconds) or after the process receives SIGHUP.
+"""
+import signal
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, field_validator
+
+from app.utilities.helpers import get_cfg_name
+
+
+CONF_DIR = Path(__file__).parent.parent / "conf"
+CHECK_INTERVAL = 1.0  # Seconds between config file mtime checks
+
+
+class _Section(BaseModel):
+    """Base class for frozen settings sections"""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
+
+class MailgunSettings(_Section):
+    """[MAILGUN] section"""
+    url: str
+    from_uri: str
+    contact_email: str
+
+
+class DopplerSettings(_Section):
+    """[DOPPLER] section"""
+    project: str
+    config: str
+
+
+class StripeSettings(_Section):
+    """[STRIPE] section"""
+    api_version: str
+    payment_method_configuration_id: str
+    valid_price_ids: Tuple[str, ...] = ()
+    threads: int = 4  # Concurrent Stripe API calls per worker
+    timeout: int = 30  # Seconds per Stripe API request
+
+    @field_validator('valid_price_ids', mode='before')
+    def split_price_ids(cls, v):
+        if isinstance(v, str):
+            return tuple(pid.strip() for pid in v.split(',') if pid.strip())
+        return v
+
+
+class RuntimeSettings(_Section):
+    """[RUNTIME] section"""
+    state_dir: str = "state"
+
+
+class WarmupSettings(_Section):
+    """[WARMUP] section"""
+    step_timeout: float = 20.0
+
+
+class TokenSettings(_Section):
+    """[TOKENS] section"""
+    key_grace_period: int = 900  # Seconds a rotated-out HMAC key still verifies
+    nonce_store: Literal["memory", "file"] = "memory"  # "file" shares consumed nonces across workers
+    nonce_capacity: int = 65536  # Maximum live consumed nonces
+    nonce_horizon: int = 600  # Seconds a consumed nonce is remembered (>= token lifetime)
+
+
+class YouTubeSettings(_Section):
+    """[YOUTUBE] section"""
+    cache_ttl: int = 86400  # Seconds a cached video/short is considered fresh
+    refresh_interval: int = 300  # Revalidate (conditional request) this often
+    refresh_lead: int = 600  # Refresh at least this many seconds before an entry expires
+    refresh_jitter: int = 300  # Up to this many extra seconds earlier, randomly (at most half the period)
+    retry_delay: int = 60  # Base delay before retrying a failed refresh
+    channel_ttl: int = 604800  # Seconds a resolved channel/uploads playlist ID is reused
+    quota_daily_limit: int = 10000  # YouTube Data API units per day for the project
+    quota_budget: float = 0.8  # Share of the daily limit after which only cached data is served
+
+
+class HttpSettings(_Section):
+    """[HTTP] section (per outbound host pool)"""
+    http2: bool = True  # Only used when the h2 package is installed
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60.0  # Seconds an idle connection is kept open
+    connect_timeout: float = 5.0
+    read_timeout: float = 15.0
+
+
+class WebSubSettings(_Section):
+    """[WEBSUB] section (push notifications for new YouTube uploads)"""
+    enabled: bool = False
+    hub_url: str = "https://pubsubhubbub.appspot.com/subscribe"
+    callback_url: str = ""  # Public URL of /api/websub/youtube
+    lease_seconds: int = 432000  # Requested subscription lifetime; renewed before it ends
+    retry_delay: int = 300  # Base delay before retrying a failed subscription
+
+
+class EmailSettings(_Section):
+    """[EMAIL] section (outbox senders per worker)"""
+    senders: int = 2  # Concurrent deliveries per worker
+    min_send_interval: float = 0.2  # Minimum seconds between sends from one worker
+    max_attempts: int = 8  # Attempts before a message is dead-lettered
+    retry_base_delay: int = 30  # Base delay before retrying a failed delivery
+    retry_max_delay: int = 3600
+    poll_interval: float = 5.0  # Seconds between checks for due retries when idle
+    claim_timeout: int = 120  # Seconds before a message claimed by a dead worker is retried
+
+
+class FulfillmentSettings(_Section):
+    """[FULFILLMENT] section (how purchased programs are delivered)"""
+    delivery: Literal["attachment", "link"] = "attachment"  # "link" emails signed download URLs
+    link_lifetime: int = 2592000  # Seconds a download link stays valid
+    base_url: str = ""  # Public origin the download links point at
+
+
+class ProgramVariantSettings(_Section):
+    """[PROGRAM_VARIANTS] section (size-optimized program PDFs)"""
+    enabled: bool = True
+    image_quality: int = 80  # JPEG quality for re-encoded images in the compressed variant
+
+
+class WatermarkSettings(_Section):
+    """[WATERMARK] section (per-buyer stamps on delivered programs)"""
+    enabled: bool = False
+    processes: int = 2  # Stamping processes per worker
+    font_size: float = 7.0
+
+
+class Settings(_Section):
+    """All application settings"""
+    mailgun: MailgunSettings
+    doppler: DopplerSettings
+    stripe: StripeSettings
+    runtime: RuntimeSettings = RuntimeSettings()
+    warmup: WarmupSettings = WarmupSettings()
+    tokens: TokenSettings = TokenSettings()
+    youtube: YouTubeSettings = YouTubeSettings()
+    http: HttpSettings = HttpSettings()
+    websub: WebSubSettings = WebSubSettings()
+    email: EmailSettings = EmailSettings()
+    fulfillment: FulfillmentSettings = FulfillmentSettings()
+    program_variants: ProgramVariantSettings = ProgramVariantSettings()
+    watermark: WatermarkSettings = WatermarkSettings()
+
+
+def get_config_path() -> Path:
+    """Get the path of the config file for the current environment"""
+    return CONF_DIR / f"{get_cfg_name()}.ini"
+
+
+def load_settings(config_path: Optional[Path] = None) -> Settings:
+    """
+    Parse a config file into a Settings object.
+
+    Args:
+        config_path: Path of the INI file (defaults to the current environment's)
+
+    Returns:
+        Settings: Parsed settings
+    """
+    cfg = ConfigParser()
+    cfg.read(config_path or get_config_path())
+    sections = {section.lower(): dict(cfg.items(section)) for section in cfg.sections()}
+    return Settings(**sections)
+
+
+class _SettingsCache:
+    """Process-wide cache of the parsed settings"""
+    settings: Optional[Settings] = None
+    mtime_ns: int = 0
+    next_check: float = 0.0
+    reload_requested: bool = False
+
+
+def _config_mtime_ns(config_path: Path) -> int:
+    try:
+        return config_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def get_settings() -> Settings:
+    """
+    Get the application settings.
+
+    Returns:
+        Settings: The cached settings, reloaded if the config file changed
+    """
+    cache = _SettingsCache
+    now = time.monotonic()
+    if cache.settings is not None and not cache.reload_requested and now < cache.next_check:
+        return cache.settings
+
+    cache.next_check = now + CHECK_INTERVAL
+    config_path = get_config_path()
+    mtime_ns = _config_mtime_ns(config_path)
+    if cache.settings is None or cache.reload_requested or mtime_ns != cache.mtime_ns:
+        cache.reload_requested = False
+        # Build the new object fully before swapping it in
+        cache.settings = load_settings(config_path)
+        cache.mtime_ns = mtime_ns
+    return cache.settings
+
+
+def request_reload(*_args) -> None:
+    """Force the next get_settings() call to re-read the config file"""
+    _SettingsCache.reload_requested = True
+
+
+def install_reload_signal_handler() -> None:
+    """Reload settings when the process receives SIGHUP"""
+    # Signal handlers can only be installed from the main thread (not e.g. under TestClient)
+    if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGHUP, request_reload)
+
+
+def get_state_dir() -> Path:
+    """Get (and create if needed) the directory for local runtime state shared by workers"""
+    state_dir = Path(get_settings().runtime.state_dir)
+    if not state_dir.is_absolute():
+        state_dir = Path(__file__).parent.parent / state_dir
+    state_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return state_dir
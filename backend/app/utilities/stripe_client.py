@@ -0,0 +1,129 @@
+"""
+Process-wide Stripe API client.
+
+The stripe SDK (pinned <8) only has blocking calls and reads its credentials
+from module globals. StripeClient keeps them off both paths:
+    - calls run in a small dedicated thread pool ([STRIPE] threads), so a
+      slow Stripe round trip occupies a pool thread instead of the worker's
+      event loop, and the number of concurrent Stripe calls is bounded
+    - the API key and version are passed with every call instead of being
+      assigned to stripe.api_key/stripe.api_version, so a rotated key
+      (Doppler refresh) applies to the next call without shared state
+    - requests go through one keep-alive requests.Session, with a
+      connection pool sized to the thread pool, installed once per process
+      as the SDK's HTTP client
+
+Per call, stripe.request times the round trip; stripe.in_flight is the
+number of calls running or waiting for a pool thread.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+import requests
+import stripe
+
+from app.utilities.doppler_utils import get_doppler_secret
+from app.utilities.logger import get_logger
+from app.utilities.metrics import observe, set_gauge
+from app.utilities.settings import get_settings
+
+
+T = TypeVar("T")
+
+
+class StripeClient:
+    """
+    Singleton running Stripe API calls in a bounded thread pool.
+    """
+    _instance: Optional['StripeClient'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._session: Optional[requests.Session] = None
+        self._in_flight = 0
+
+    @classmethod
+    def get_instance(cls) -> 'StripeClient':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _start(self) -> ThreadPoolExecutor:
+        """Create the thread pool and install the keep-alive HTTP client"""
+        if self._executor is None:
+            stripe_settings = get_settings().stripe
+            threads = max(1, stripe_settings.threads)
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=threads)
+            self._session.mount("https://", adapter)
+            # The SDK has no per-call transport; this is the only global it is given
+            stripe.default_http_client = stripe.RequestsClient(
+                timeout=stripe_settings.timeout,
+                session=self._session
+            )
+            self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="stripe")
+            self._logger.info(f"Started Stripe client - Threads: {threads}, API version: {stripe_settings.api_version}")
+        return self._executor
+
+    async def load(self) -> None:
+        """
+        Start the client and check that the API key is available (warmup step).
+
+        Raises:
+            ValueError: If the API key is not configured
+        """
+        self._start()
+        if not await get_doppler_secret("STRIPE_SECRET_KEY"):
+            raise ValueError("Stripe secret key is not configured")
+
+    async def call(self, method: Callable[..., T], **params: Any) -> T:
+        """
+        Call a Stripe API method in the thread pool with this process's credentials.
+
+        Args:
+            method: SDK method accepting api_key and stripe_version, e.g.
+                stripe.checkout.Session.create
+            **params: API parameters
+
+        Returns:
+            The method's result
+
+        Raises:
+            stripe.error.StripeError: If the Stripe API call fails
+        """
+        executor = self._start()
+        api_key = await get_doppler_secret("STRIPE_SECRET_KEY")
+        call = functools.partial(
+            method,
+            api_key=api_key,
+            stripe_version=get_settings().stripe.api_version,
+            **params
+        )
+        self._in_flight += 1
+        set_gauge("stripe.in_flight", self._in_flight)
+        start_time = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        finally:
+            self._in_flight -= 1
+            set_gauge("stripe.in_flight", self._in_flight)
+            observe("stripe.request", time.perf_counter() - start_time)
+
+    async def close(self) -> None:
+        """Stop the thread pool and close the pooled connections"""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True)
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def get_stripe_api() -> StripeClient:
+    """Get the singleton instance of StripeClient."""
+    return StripeClient.get_instance()
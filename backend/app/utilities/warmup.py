@@ -0,0 +1,87 @@
+"""
+Startup warmup and readiness tracking.
+
+The app lifespan runs the warmup steps concurrently before the worker starts
+serving; /api/ready reports 503 until they have all finished.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+from app.utilities.logger import get_logger
+from app.utilities.settings import get_settings
+
+
+WarmupStep = Callable[[], Awaitable[Any]]
+
+
+class WarmupState:
+    """
+    Singleton class tracking warmup progress for this worker.
+    """
+    _instance: Optional['WarmupState'] = None
+
+    def __init__(self):
+        self.ready: bool = False
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def get_instance(cls) -> 'WarmupState':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+
+def get_warmup_state() -> WarmupState:
+    """Get the singleton instance of WarmupState."""
+    return WarmupState.get_instance()
+
+
+def get_step_timeout() -> float:
+    """Get the per-step warmup timeout in seconds from config"""
+    return get_settings().warmup.step_timeout
+
+
+async def _run_step(name: str, step: WarmupStep, timeout: float) -> None:
+    """Run a single warmup step, recording its outcome and duration"""
+    logger = get_logger(__name__)
+    state = get_warmup_state()
+    state.steps[name] = {"status": "running", "duration": 0.0}
+    start_time = time.perf_counter()
+
+    try:
+        await asyncio.wait_for(step(), timeout=timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        status = "timeout"
+    except Exception as e:
+        logger.warning(f"Warmup step '{name}' failed: {str(e)}")
+        status = "failed"
+
+    duration = time.perf_counter() - start_time
+    state.steps[name] = {"status": status, "duration": round(duration, 4)}
+    logger.info(f"Warmup step '{name}' finished - Status: {status}, Duration: {duration * 1000:.1f}ms")
+
+
+async def run_warmup(steps: Dict[str, WarmupStep]) -> None:
+    """
+    Run all warmup steps concurrently and mark the worker ready.
+
+    A failed or timed out step is logged but does not keep the worker out of
+    rotation; the request path falls back to its usual lazy behaviour.
+
+    Args:
+        steps: Mapping of step name to a zero-argument coroutine function
+    """
+    logger = get_logger(__name__)
+    state = get_warmup_state()
+    timeout = get_step_timeout()
+
+    logger.info(f"Starting warmup - Steps: {list(steps)}, Timeout: {timeout}s")
+    start_time = time.perf_counter()
+
+    await asyncio.gather(*(_run_step(name, step, timeout) for name, step in steps.items()))
+
+    state.ready = True
+    logger.info(f"Warmup complete in {(time.perf_counter() - start_time) * 1000:.1f}ms")
@@ -0,0 +1,225 @@
+"""
+Per-buyer watermarks on delivered program PDFs.
+
+When [WATERMARK] is enabled, each delivered program is stamped with the
+buyer's email and order ID on every page (see pdf_stamp), so a leaked copy
+can be traced to its order. Stamping runs in a small process pool, never on
+the event loop; each pool process parses a source PDF once and then only
+formats the incremental update per order.
+
+Stamped files are cached in the state directory under a key derived from the
+source content, the stamp text and the font size, so outbox retries and repeated downloads
+reuse them. They are deleted once every download link that may point at
+them has expired. Watermarking needs the optional pikepdf package; without
+it, or if stamping fails, the unstamped file is delivered.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.utilities.catalog import get_catalog
+from app.utilities.download_links import RENDER_ID_SIZE
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment, observe
+from app.utilities.program_assets import ProgramAsset, get_program_assets
+from app.utilities.settings import get_settings, get_state_dir
+
+
+WATERMARK_AVAILABLE = importlib.util.find_spec("pikepdf") is not None
+WATERMARK_DIR_NAME = "watermarked"
+PRUNE_INTERVAL = 3600.0  # Seconds between sweeps of expired stamped files
+PRUNE_GRACE = 86400  # Extra seconds stamped files are kept after their links expire
+
+
+def get_watermark_text(email: str, order_id: str) -> str:
+    """Get the stamp text for an order"""
+    return f"Licensed to {email} - Order {order_id}"
+
+
+def _warm_worker(sources: List[Tuple[str, int]]) -> int:
+    """Parse the stamp templates in a pool process ahead of the first order"""
+    from app.utilities.pdf_stamp import get_stamp_template
+
+    return sum(get_stamp_template(path, mtime_ns).page_count for path, mtime_ns in sources)
+
+
+def _stamp(path: str, mtime_ns: int, text: str, destination: str, font_size: float) -> int:
+    # Imported in the pool process, so the web workers never load pikepdf for this
+    from app.utilities.pdf_stamp import stamp_pdf
+
+    return stamp_pdf(path, mtime_ns, text, destination, font_size)
+
+
+class WatermarkRenderer:
+    """
+    Singleton owning the stamping process pool and the stamped file cache.
+    """
+    _instance: Optional['WatermarkRenderer'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warm_task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+
+    @classmethod
+    def get_instance(cls) -> 'WatermarkRenderer':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        """Whether deliveries should be stamped"""
+        return get_settings().watermark.enabled and WATERMARK_AVAILABLE
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            processes = max(1, get_settings().watermark.processes)
+            # spawn: forking a process with running threads (asyncio.to_thread) is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            self._logger.info(f"Started watermark process pool - Processes: {processes}")
+        return self._executor
+
+    @staticmethod
+    def _directory() -> Path:
+        directory = get_state_dir() / WATERMARK_DIR_NAME
+        directory.mkdir(mode=0o700, exist_ok=True)
+        return directory
+
+    @staticmethod
+    def render_key(asset: ProgramAsset, text: str) -> bytes:
+        """Cache key of a stamped file: the source content, the stamp text and its size"""
+        font_size = get_settings().watermark.font_size
+        return hashlib.sha256(f"{asset.etag}\0{text}\0{font_size}".encode('utf-8')).digest()[:RENDER_ID_SIZE]
+
+    def get_path(self, render_id: bytes, file_name: str) -> Path:
+        """Get the cache path of a stamped file"""
+        return self._directory() / f"{render_id.hex()}-{file_name}"
+
+    async def render(self, asset: ProgramAsset, text: str) -> Tuple[bytes, Path]:
+        """
+        Get a stamped copy of a program file, stamping it if it is not cached.
+
+        Args:
+            asset: Program file to stamp
+            text: Stamp text
+
+        Returns:
+            Tuple of the render ID and the stamped file's path
+
+        Raises:
+            RuntimeError: If watermarking is unavailable
+            Exception: If stamping fails
+        """
+        if not WATERMARK_AVAILABLE:
+            raise RuntimeError("pikepdf is not installed")
+        render_id = self.render_key(asset, text)
+        path = self.get_path(render_id, asset.file_name)
+        if path.exists():
+            increment("watermark.cache_hit")
+            return render_id, path
+
+        start_time = time.perf_counter()
+        try:
+            pages = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                _stamp,
+                str(asset.path),
+                asset.mtime_ns,
+                text,
+                str(path),
+                get_settings().watermark.font_size
+            )
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next render
+            self._executor = None
+            raise
+        observe("watermark.render", time.perf_counter() - start_time)
+        increment("watermark.pages", pages)
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            await asyncio.to_thread(self._prune)
+        return render_id, path
+
+    async def render_for_delivery(self, asset: ProgramAsset, text: str) -> Optional[Tuple[bytes, Path]]:
+        """
+        Stamp a program file for delivery, or None to deliver it unstamped.
+
+        Failures are logged rather than raised: a paid order is never held up
+        by its watermark.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return await self.render(asset, text)
+        except Exception as e:
+            increment("watermark.failure")
+            self._logger.error(f"Failed to watermark program, delivering it unstamped - File: {asset.file_name}, Error: {str(e)}")
+            return None
+
+    def _prune(self) -> None:
+        """Delete stamped files no download link can still point at"""
+        max_age = get_settings().fulfillment.link_lifetime + PRUNE_GRACE
+        cutoff = time.time() - max_age
+        removed = 0
+        for path in self._directory().iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            self._logger.info(f"Pruned expired watermarked files - Count: {removed}")
+
+    def start(self) -> None:
+        """Start the pool and parse the program files in it, in the background"""
+        if not get_settings().watermark.enabled:
+            return
+        if not WATERMARK_AVAILABLE:
+            self._logger.warning("Watermarking is enabled but pikepdf is not installed, delivering programs unstamped")
+            return
+        if self._warm_task is None or self._warm_task.done():
+            self._warm_task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self) -> None:
+        try:
+            program_assets = get_program_assets()
+            sources = []
+            for program in get_catalog().programs:
+                asset = await program_assets.get_async(program.file_name)
+                sources.append((str(asset.path), asset.mtime_ns))
+            executor = self._get_executor()
+            loop = asyncio.get_running_loop()
+            # One job per process (best effort: the pool decides where each runs)
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, _warm_worker, sources)
+                for _ in range(max(1, get_settings().watermark.processes))
+            ))
+        except Exception as e:
+            self._logger.warning(f"Watermark pool warmup failed: {str(e)}")
+
+    async def close(self) -> None:
+        """Stop the pool"""
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            self._warm_task = None
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+
+def get_watermark_renderer() -> WatermarkRenderer:
+    """Get the singleton instance of WatermarkRenderer."""
+    return WatermarkRenderer.get_instance()
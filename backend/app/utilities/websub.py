@@ -0,0 +1,250 @@
+"""
+WebSub (PubSubHubbub) subscription to the channel's YouTube upload feed.
+
+YouTube's hub pushes an Atom notification to our callback whenever a video
+is published, updated or deleted, so the affected YouTubeCache entries can be
+refetched right away instead of on the next scheduled refresh.
+
+The hub verifies subscription requests by calling the callback with a
+verify token derived from the subscription secret, and signs notifications
+with X-Hub-Signature (HMAC of the body keyed with the same secret).
+
+Only one worker per host holds the subscription: the subscriber takes an
+flock on a file in the state directory before subscribing, and the other
+workers keep retrying it, so one of them takes over if the holder exits.
+"""
+import asyncio
+import fcntl
+import hashlib
+import hmac
+import os
+import random
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+from app.utilities.doppler_utils import get_doppler_secret
+from app.utilities.http_clients import get_http_client
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment
+from app.utilities.settings import get_settings, get_state_dir
+from app.utilities.youtube_quota import quota_consumer
+from app.utilities.youtube_utils import resolve_channel
+
+
+SECRET_NAME = "YOUTUBE_WEBSUB_SECRET"
+SUBSCRIBER_LOCK_FILE_NAME = "websub-subscriber.lock"
+TOPIC_URL_TEMPLATE = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+
+_SIGNATURE_ALGORITHMS = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+}
+_NAMESPACES = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+    "at": "http://purl.org/atompub/tombstones/1.0",
+}
+_DELETED_REF_PREFIX = "yt:video:"
+
+
+def get_topic_url(channel_id: str) -> str:
+    """Get the hub topic URL of a channel's upload feed"""
+    return TOPIC_URL_TEMPLATE.format(channel_id=channel_id)
+
+
+async def get_websub_secret() -> str:
+    """
+    Get the subscription secret.
+
+    Raises:
+        RuntimeError: If the secret is not configured
+    """
+    secret = await get_doppler_secret(SECRET_NAME)
+    if not secret:
+        raise RuntimeError(f"{SECRET_NAME} is not configured")
+    return secret
+
+
+def derive_verify_token(secret: str, topic: str) -> str:
+    """Derive the hub.verify_token for a topic from the subscription secret"""
+    return hmac.new(secret.encode('utf-8'), b"verify:" + topic.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature_header: Optional[str]) -> bool:
+    """
+    Check an X-Hub-Signature header ("<method>=<hex digest>") against the body.
+
+    Args:
+        secret: Subscription secret
+        body: Raw notification body
+        signature_header: Value of the X-Hub-Signature header
+
+    Returns:
+        bool: True if the signature is valid
+    """
+    if not signature_header or "=" not in signature_header:
+        return False
+    method, _, provided = signature_header.partition("=")
+    digestmod = _SIGNATURE_ALGORITHMS.get(method.lower())
+    if digestmod is None:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, digestmod).hexdigest()
+    # compare_digest rejects non-ASCII str, and the header is caller-controlled
+    return hmac.compare_digest(expected.encode('ascii'), provided.strip().lower().encode('utf-8'))
+
+
+def parse_notification(body: bytes) -> List[Dict[str, Optional[str]]]:
+    """
+    Extract the videos referenced by an Atom notification.
+
+    Args:
+        body: Raw notification body
+
+    Returns:
+        List of dicts with video_id, channel_id (None for deletions) and deleted
+
+    Raises:
+        ValueError: If the body is not a valid Atom feed
+    """
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError as e:
+        raise ValueError(f"Invalid notification body: {str(e)}") from e
+
+    videos = []
+    for entry in root.findall("atom:entry", _NAMESPACES):
+        video_id = entry.findtext("yt:videoId", namespaces=_NAMESPACES)
+        if video_id:
+            videos.append({
+                "video_id": video_id,
+                "channel_id": entry.findtext("yt:channelId", namespaces=_NAMESPACES),
+                "deleted": False
+            })
+    for entry in root.findall("at:deleted-entry", _NAMESPACES):
+        ref = entry.get("ref", "")
+        if ref.startswith(_DELETED_REF_PREFIX):
+            videos.append({
+                "video_id": ref[len(_DELETED_REF_PREFIX):],
+                "channel_id": None,
+                "deleted": True
+            })
+    return videos
+
+
+class WebSubSubscriber:
+    """
+    Singleton background task that keeps the upload feed subscription alive.
+
+    It subscribes at startup and renews before the lease runs out; failed
+    attempts are retried with jittered backoff. The hub confirms each request
+    asynchronously through the verification callback. Workers that do not
+    hold the subscriber lock wait for it instead of subscribing.
+    """
+    _instance: Optional['WebSubSubscriber'] = None
+    _max_retry_delay: float = 3600.0
+    _lock_retry_delay: float = 60.0
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._task: Optional[asyncio.Task] = None
+        self._lock_fd: Optional[int] = None
+
+    @classmethod
+    def get_instance(cls) -> 'WebSubSubscriber':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def start(self) -> None:
+        """Start the subscription loop"""
+        if self._task is None or self._task.done():
+            self._logger.info("Starting YouTube WebSub subscriber")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the subscription loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_fd is not None:
+            # Closing the file releases the lock for another worker
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _try_lock(self) -> bool:
+        """Take the cross-worker subscriber lock if no other worker holds it"""
+        fd = os.open(get_state_dir() / SUBSCRIBER_LOCK_FILE_NAME, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def subscribe(self) -> None:
+        """
+        Send a subscription request to the hub.
+
+        Raises:
+            RuntimeError: If the channel or secret is unavailable
+            httpx.HTTPError: If the hub rejects the request
+        """
+        websub_settings = get_settings().websub
+        channel = await resolve_channel()
+        if not channel:
+            raise RuntimeError("YouTube channel not found")
+        secret = await get_websub_secret()
+        topic = get_topic_url(channel['channel_id'])
+
+        response = await get_http_client("websub").post(
+            websub_settings.hub_url,
+            data={
+                "hub.callback": websub_settings.callback_url,
+                "hub.mode": "subscribe",
+                "hub.topic": topic,
+                "hub.verify": "async",
+                "hub.verify_token": derive_verify_token(secret, topic),
+                "hub.secret": secret,
+                "hub.lease_seconds": str(websub_settings.lease_seconds),
+            }
+        )
+        response.raise_for_status()
+        increment("websub.subscribe")
+        self._logger.info(f"Requested WebSub subscription - Topic: {topic}, Status: {response.status_code}")
+
+    async def _run(self) -> None:
+        quota_consumer.set("websub_subscriber")
+        while not self._try_lock():
+            await asyncio.sleep(self._lock_retry_delay)
+        self._logger.info("Holding the WebSub subscription for this host")
+        failures = 0
+        while True:
+            websub_settings = get_settings().websub
+            try:
+                await self.subscribe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(self._max_retry_delay, websub_settings.retry_delay * (2 ** (failures - 1)))
+                delay = random.uniform(delay / 2, delay)
+                increment("websub.subscribe_failure")
+                self._logger.warning(f"WebSub subscription failed, retrying in {delay:.0f}s - Error: {str(e)}")
+            else:
+                failures = 0
+                # Renew well before the lease expires
+                delay = websub_settings.lease_seconds * random.uniform(0.7, 0.8)
+            await asyncio.sleep(delay)
+
+
+def get_websub_subscriber() -> WebSubSubscriber:
+    """Get the singleton instance of WebSubSubscriber."""
+    return WebSubSubscriber.get_instance()
@@ -0,0 +1,199 @@
+"""
+Daily YouTube Data API quota accounting shared by all workers.
+
+Every API call is recorded with its quota cost, per endpoint and per
+consumer (the code path that triggered it), in a small JSON file in the
+state directory. The file is updated under an flock, so the counter covers
+all workers on the host. Once the day's usage crosses the configured share
+of the daily limit, fetches stop and the cache is served stale until the
+quota resets (midnight Pacific time, like YouTube's).
+
+The meter's methods block on the flock and an fsync'd write; async code goes
+through record_quota and is_quota_over_budget, which run them in a thread.
+"""
+import asyncio
+import fcntl
+import json
+import os
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utilities.helpers import atomic_write_bytes
+from app.utilities.logger import get_logger
+from app.utilities.metrics import increment, set_gauge
+from app.utilities.settings import get_settings, get_state_dir
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:  # No tz database available
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+
+QUOTA_FILE_NAME = "youtube_quota.json"
+QUOTA_LOCK_FILE_NAME = "youtube_quota.lock"
+
+# Units per request, from the YouTube Data API quota table
+QUOTA_COSTS = {
+    "search": 100,
+    "channels": 1,
+    "playlistItems": 1,
+    "videos": 1,
+}
+
+# Which code path is making YouTube calls; set by background tasks so usage can be attributed
+quota_consumer: ContextVar[str] = ContextVar("youtube_quota_consumer", default="on_demand")
+
+
+class YouTubeQuotaMeter:
+    """
+    Singleton recording YouTube API quota usage in a per-day counter file.
+    """
+    _instance: Optional['YouTubeQuotaMeter'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._over_budget_logged_day: Optional[str] = None
+
+    @classmethod
+    def get_instance(cls) -> 'YouTubeQuotaMeter':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    @staticmethod
+    def _empty_usage(day: str) -> Dict[str, Any]:
+        return {"day": day, "total": 0, "endpoints": {}, "consumers": {}}
+
+    def _read(self, log_rollover: bool = False) -> Dict[str, Any]:
+        """Read today's usage (callers hold the lock)"""
+        today = self._today()
+        try:
+            usage = json.loads((get_state_dir() / QUOTA_FILE_NAME).read_bytes())
+        except FileNotFoundError:
+            return self._empty_usage(today)
+        except (OSError, ValueError) as e:
+            self._logger.warning(f"Resetting unreadable YouTube quota file: {str(e)}")
+            return self._empty_usage(today)
+        if not isinstance(usage, dict) or usage.get("day") != today:
+            if log_rollover and isinstance(usage, dict) and usage.get("total"):
+                self._log_summary(usage, "YouTube quota usage for previous day")
+            return self._empty_usage(today)
+        return usage
+
+    def _locked(self, operation: int):
+        """Open and flock the lock file; returns the fd to pass to _unlock"""
+        fd = os.open(get_state_dir() / QUOTA_LOCK_FILE_NAME, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, operation)
+        return fd
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def record(self, endpoint: str) -> int:
+        """
+        Record one API call.
+
+        Args:
+            endpoint: YouTube Data API resource (search, channels, playlistItems, videos)
+
+        Returns:
+            int: Units used today across all workers, including this call
+        """
+        cost = QUOTA_COSTS.get(endpoint, 1)
+        consumer = quota_consumer.get()
+        fd = self._locked(fcntl.LOCK_EX)
+        try:
+            usage = self._read(log_rollover=True)
+            usage["total"] += cost
+            usage["endpoints"][endpoint] = usage["endpoints"].get(endpoint, 0) + cost
+            usage["consumers"][consumer] = usage["consumers"].get(consumer, 0) + cost
+            try:
+                atomic_write_bytes(get_state_dir() / QUOTA_FILE_NAME, json.dumps(usage).encode('utf-8'))
+            except OSError as e:
+                self._logger.warning(f"Failed to persist YouTube quota usage: {str(e)}")
+        finally:
+            self._unlock(fd)
+
+        increment(f"youtube.quota.units.{endpoint}", cost)
+        self._publish(usage)
+        self._check_budget(usage)
+        return usage["total"]
+
+    def usage(self) -> Dict[str, Any]:
+        """
+        Get today's usage across all workers.
+
+        Returns:
+            Dict with day, total, and units per endpoint and per consumer
+        """
+        fd = self._locked(fcntl.LOCK_SH)
+        try:
+            usage = self._read()
+        finally:
+            self._unlock(fd)
+        self._publish(usage)
+        return usage
+
+    def is_over_budget(self) -> bool:
+        """Whether today's usage has reached the configured budget"""
+        usage = self.usage()
+        self._check_budget(usage)
+        return usage["total"] >= self._budget_units()
+
+    @staticmethod
+    def _budget_units() -> int:
+        youtube_settings = get_settings().youtube
+        return int(youtube_settings.quota_daily_limit * youtube_settings.quota_budget)
+
+    @staticmethod
+    def top_consumers(usage: Dict[str, Any], limit: int = 5) -> List[Tuple[str, int]]:
+        """Largest quota consumers (endpoints and code paths) in a usage record"""
+        consumers = [(f"endpoint:{name}", units) for name, units in usage["endpoints"].items()]
+        consumers += [(f"consumer:{name}", units) for name, units in usage["consumers"].items()]
+        return sorted(consumers, key=lambda item: item[1], reverse=True)[:limit]
+
+    def _publish(self, usage: Dict[str, Any]) -> None:
+        set_gauge("youtube.quota.used_today", usage["total"])
+        set_gauge("youtube.quota.budget", self._budget_units())
+
+    def _log_summary(self, usage: Dict[str, Any], message: str) -> None:
+        self._logger.info(
+            f"{message} - Day: {usage.get('day')}, Units: {usage.get('total')}, "
+            f"Top consumers: {self.top_consumers(usage)}"
+        )
+
+    def _check_budget(self, usage: Dict[str, Any]) -> None:
+        """Log the top consumers once per day when the budget is crossed"""
+        if usage["total"] < self._budget_units() or self._over_budget_logged_day == usage["day"]:
+            return
+        self._over_budget_logged_day = usage["day"]
+        self._logger.warning(
+            f"YouTube quota budget reached, serving cached videos until reset - "
+            f"Units: {usage['total']}/{get_settings().youtube.quota_daily_limit}, "
+            f"Top consumers: {self.top_consumers(usage)}"
+        )
+
+
+def get_quota_meter() -> YouTubeQuotaMeter:
+    """Get the singleton instance of YouTubeQuotaMeter."""
+    return YouTubeQuotaMeter.get_instance()
+
+
+async def record_quota(endpoint: str) -> int:
+    """Record one YouTube API call off the event loop (see YouTubeQuotaMeter.record)"""
+    # to_thread copies the context, so quota_consumer is attributed as usual
+    return await asyncio.to_thread(get_quota_meter().record, endpoint)
+
+
+async def is_quota_over_budget() -> bool:
+    """Check the budget off the event loop (see YouTubeQuotaMeter.is_over_budget)"""
+    return await asyncio.to_thread(get_quota_meter().is_over_budget)
@@ -1,15 +1,83 @@
+import asyncio
+import json
+import random
 import time
-from typing import Dict, Optional, Any
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Any
 import httpx
 
 from fastapi import HTTPException, status
 from app.utilities.logger import get_logger
 from app.utilities.doppler_utils import get_doppler_secret
+from app.utilities.helpers import atomic_write_bytes
+from app.utilities.http_clients import get_http_client
+from app.utilities.metrics import increment
+from app.utilities.settings import get_settings, get_state_dir
+from app.utilities.youtube_quota import is_quota_over_budget, quota_consumer, record_quota
+
+
+SNAPSHOT_FILE_NAME = "youtube_cache.json"
+
+
+class _BackgroundFileWriter:
+    """
+    Persists a small state file off the event loop.
+    
+    write() records the latest content and returns at once; a background task
+    writes it (fsync'd) in a thread. Updates made while a write is running are
+    coalesced into one more write of the newest content, so the file always
+    ends up matching the last update. Without a running loop it writes inline.
+    """
+
+    def __init__(self, get_path: Callable[[], Path], description: str):
+        self._logger = get_logger(__name__)
+        self._get_path = get_path
+        self._description = description
+        self._pending: Optional[bytes] = None
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self, data: Optional[bytes]) -> None:
+        """Schedule the file to be replaced with data (or removed, for None)"""
+        self._pending, self._dirty = data, True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._persist(data)
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flush())
+
+    @property
+    def busy(self) -> bool:
+        """Whether an update is still being written (the file is not current yet)"""
+        return self._task is not None and not self._task.done()
+
+    async def _flush(self) -> None:
+        while self._dirty:
+            data, self._dirty = self._pending, False
+            await asyncio.to_thread(self._persist, data)
+
+    def _persist(self, data: Optional[bytes]) -> None:
+        try:
+            if data is None:
+                self._get_path().unlink(missing_ok=True)
+            else:
+                atomic_write_bytes(self._get_path(), data)
+        except OSError as e:
+            # The in-memory cache is still good; only a restart would be cold
+            self._logger.warning(f"Failed to write {self._description}: {str(e)}")
 
 
 class YouTubeCache:
     """
     Singleton class to cache YouTube videos and shorts with TTL.
+    
+    Updates are written through to a JSON snapshot in the state directory,
+    with their original timestamps, and the snapshot is loaded when the cache
+    is created. The writes happen in the background, off the event loop. A restarted worker therefore starts warm, with the entries'
+    remaining TTL intact.
     """
     _instance: Optional['YouTubeCache'] = None
     _cache: Dict[str, Dict[str, Any]] = {
@@ -30,7 +98,10 @@ class YouTubeCache:
         if hasattr(self, '_initialized'):
             return
         self._initialized = True
+        self._ttl = get_settings().youtube.cache_ttl
+        self._snapshot_writer = _BackgroundFileWriter(lambda: self._snapshot_path, "YouTube cache snapshot")
         self._logger.info("Initializing YouTubeCache")
+        self._load_snapshot()
 
     @classmethod
     def get_instance(cls) -> 'YouTubeCache':
@@ -39,8 +110,47 @@ class YouTubeCache:
             cls._instance = cls()  # This will call both __new__ and __init__
         return cls._instance
 
-    def get(self, cache_key: str) -> Optional[Dict]:
-        """Get cached data if it exists and is not expired"""
+    @property
+    def _snapshot_path(self):
+        return get_state_dir() / SNAPSHOT_FILE_NAME
+
+    def _load_snapshot(self) -> None:
+        """Adopt entries from the on-disk snapshot that we lack or that are newer than ours"""
+        try:
+            snapshot = json.loads(self._snapshot_path.read_bytes())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self._logger.warning(f"Ignoring unreadable YouTube cache snapshot: {str(e)}")
+            return
+        if not isinstance(snapshot, dict):
+            return
+        
+        for cache_key, entry in snapshot.items():
+            if (
+                cache_key not in self._cache
+                or not isinstance(entry, dict)
+                or not isinstance(entry.get('data'), dict)
+                or not isinstance(entry.get('timestamp'), (int, float))
+            ):
+                continue
+            current = self._cache[cache_key]
+            if not current['data'] or entry['timestamp'] > current['timestamp']:
+                self._cache[cache_key] = {'data': entry['data'], 'timestamp': entry['timestamp']}
+                self._logger.info(
+                    f"Loaded {cache_key} from cache snapshot "
+                    f"(age: {(time.time() - entry['timestamp'])/60:.1f}m)"
+                )
+
+    def _save_snapshot(self) -> None:
+        """Write the current entries through to the on-disk snapshot"""
+        snapshot = {
+            cache_key: entry for cache_key, entry in self._cache.items() if entry['data']
+        }
+        self._snapshot_writer.write(json.dumps(snapshot).encode('utf-8'))
+
+    def get(self, cache_key: str, allow_stale: bool = False) -> Optional[Dict]:
+        """Get cached data if it exists and is not expired (or at all, if allow_stale)"""
         cache_entry = self._cache.get(cache_key)
         if not cache_entry or not cache_entry['data']:
             self._logger.info(f"Cache miss - No data for {cache_key}")
@@ -50,6 +160,13 @@ class YouTubeCache:
         time_since_update = current_time - cache_entry['timestamp']
         
         if time_since_update > self._ttl:
+            if allow_stale:
+                self._logger.info(
+                    f"Serving stale cache for {cache_key} "
+                    f"(age: {time_since_update/3600:.1f}h > {self._ttl/3600:.1f}h)"
+                )
+                increment(f"youtube.stale_serve.{cache_key}")
+                return cache_entry['data']
             self._logger.info(
                 f"Cache expired for {cache_key} "
                 f"(age: {time_since_update/3600:.1f}h > {self._ttl/3600:.1f}h)"
@@ -62,6 +179,35 @@ class YouTubeCache:
         )
         return cache_entry['data']
 
+    def get_timestamp(self, cache_key: str) -> float:
+        """Get when an entry was last updated (0 if never)"""
+        cache_entry = self._cache.get(cache_key)
+        return cache_entry['timestamp'] if cache_entry else 0
+
+    def touch(self, cache_key: str) -> None:
+        """Mark an entry as fresh without changing its data (e.g. after a 304)"""
+        cache_entry = self._cache.get(cache_key)
+        if not cache_entry or not cache_entry['data']:
+            return
+        cache_entry['timestamp'] = time.time()
+        self._logger.debug(f"Revalidated cache for {cache_key}")
+        self._save_snapshot()
+
+    def invalidate(self, cache_key: str) -> None:
+        """Mark an entry as expired; its data is still served until it is refetched"""
+        cache_entry = self._cache.get(cache_key)
+        if cache_entry:
+            cache_entry['timestamp'] = 0
+            self._logger.info(f"Invalidated cache for {cache_key}")
+            self._save_snapshot()
+
+    def get_cached_id(self, cache_key: str) -> Optional[str]:
+        """Get the video ID held in an entry, regardless of age"""
+        cache_entry = self._cache.get(cache_key)
+        if not cache_entry or not cache_entry['data']:
+            return None
+        return cache_entry['data'].get('id')
+
     def set(self, cache_key: str, data: Dict) -> None:
         """Store data in cache with current timestamp"""
         self._cache[cache_key] = {
@@ -69,6 +215,7 @@ class YouTubeCache:
             'timestamp': time.time()
         }
         self._logger.info(f"Updated cache for {cache_key}")
+        self._save_snapshot()
         if cache_key in data.get('id', ''):
             self._logger.debug(f"Cached data: {data.get('id')}")
         else:
@@ -86,6 +233,96 @@ def get_youtube_cache() -> YouTubeCache:
 # YouTube Data API v3 configuration
 YOUTUBE_API_BASE_URL = "https://www.googleapis.com/youtube/v3"
 CHANNEL_NAME = "brawnyoriginals"
+CHANNEL_CACHE_FILE_NAME = "youtube_channel.json"
+
+
+class YouTubeChannelCache:
+    """
+    Singleton cache of the resolved channel ID and uploads playlist ID.
+    
+    Resolving these costs a 100-unit /search call plus a /channels call and
+    the values almost never change, so they are kept for channel_ttl seconds
+    in a small JSON file in the state directory, shared by all workers. The
+    file is written in the background, off the event loop.
+    """
+    _instance: Optional['YouTubeChannelCache'] = None
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        self._entry: Optional[Dict[str, Any]] = None
+        self._writer = _BackgroundFileWriter(lambda: self._path, "YouTube channel cache")
+
+    @classmethod
+    def get_instance(cls) -> 'YouTubeChannelCache':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def _path(self):
+        return get_state_dir() / CHANNEL_CACHE_FILE_NAME
+
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        try:
+            entry = json.loads(self._path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self._logger.warning(f"Ignoring unreadable YouTube channel cache: {str(e)}")
+            return None
+        if not isinstance(entry, dict) or not {'channel_name', 'channel_id', 'uploads_playlist_id', 'resolved_at'} <= entry.keys():
+            return None
+        return entry
+
+    def get(self, channel_name: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get the resolved IDs for a channel.
+        
+        Args:
+            channel_name: The name of the YouTube channel
+            allow_stale: Return the entry even if it is older than channel_ttl
+            
+        Returns:
+            Dict with channel_id and uploads_playlist_id, or None
+        """
+        entry = self._entry
+        if entry is None or entry['channel_name'] != channel_name:
+            if self._writer.busy:
+                # Our own newer update has not reached the file yet
+                return None
+            # Another worker may already have resolved it
+            entry = self._read_file()
+            if entry is None or entry['channel_name'] != channel_name:
+                return None
+            self._entry = entry
+        if not allow_stale and time.time() - entry['resolved_at'] > get_settings().youtube.channel_ttl:
+            return None
+        return entry
+
+    def set(self, channel_name: str, channel_id: str, uploads_playlist_id: str) -> Dict[str, Any]:
+        """Store newly resolved IDs in memory and on disk"""
+        entry = {
+            'channel_name': channel_name,
+            'channel_id': channel_id,
+            'uploads_playlist_id': uploads_playlist_id,
+            'resolved_at': time.time()
+        }
+        self._entry = entry
+        self._writer.write(json.dumps(entry).encode('utf-8'))
+        self._logger.info(f"Cached YouTube channel - ID: {channel_id}, Uploads playlist: {uploads_playlist_id}")
+        return entry
+
+    def invalidate(self) -> None:
+        """Forget the resolved IDs, e.g. after the uploads playlist disappears"""
+        self._entry = None
+        # Through the writer, so a write still in flight cannot bring the file back
+        self._writer.write(None)
+
+
+def get_youtube_channel_cache() -> YouTubeChannelCache:
+    """Get the singleton instance of YouTubeChannelCache."""
+    return YouTubeChannelCache.get_instance()
 
 
 async def get_channel_id(channel_name: str = CHANNEL_NAME) -> Optional[str]:
@@ -114,38 +351,39 @@ async def get_channel_id(channel_name: str = CHANNEL_NAME) -> Optional[str]:
                 detail="Server configuration error: Missing YouTube API key"
             )
             
-        async with httpx.AsyncClient() as client:
-            url = f"{YOUTUBE_API_BASE_URL}/search"
-            params = {
-                "part": "snippet",
-                "q": channel_name,
-                "type": "channel",
-                "key": api_key,
-                "maxResults": 1
-            }
-            
-            logger.debug(f"Making request to: {url}")
-            logger.debug(f"Request params: { {k: v for k, v in params.items() if k != 'key'} }")
-            
-            response = await client.get(url, params=params, timeout=15)
-            
-            # Log response status and headers for debugging
-            logger.debug(f"Response status: {response.status_code}")
-            logger.debug(f"Response headers: {dict(response.headers)}")
-            
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.debug(f"Response data: {data}")
-            
-            if data.get("items"):
-                channel_id = data["items"][0]["snippet"]["channelId"]
-                logger.debug(f"Found channel ID: {channel_id}")
-                return channel_id
-                
-            logger.warning(f"No channel found for: {channel_name}")
-            return None
+        client = get_http_client("youtube")
+        url = f"{YOUTUBE_API_BASE_URL}/search"
+        params = {
+            "part": "snippet",
+            "q": channel_name,
+            "type": "channel",
+            "key": api_key,
+            "maxResults": 1
+        }
+        
+        logger.debug(f"Making request to: {url}")
+        logger.debug(f"Request params: { {k: v for k, v in params.items() if k != 'key'} }")
+        
+        await record_quota("search")
+        response = await client.get(url, params=params)
+        
+        # Log response status and headers for debugging
+        logger.debug(f"Response status: {response.status_code}")
+        logger.debug(f"Response headers: {dict(response.headers)}")
+        
+        response.raise_for_status()
+        
+        data = response.json()
+        logger.debug(f"Response data: {data}")
+        
+        if data.get("items"):
+            channel_id = data["items"][0]["snippet"]["channelId"]
+            logger.debug(f"Found channel ID: {channel_id}")
+            return channel_id
             
+        logger.warning(f"No channel found for: {channel_name}")
+        return None
+        
     except httpx.HTTPStatusError as e:
         logger.error(f"Failed to fetch channel ID: {str(e)}")
         raise HTTPException(
@@ -157,22 +395,20 @@ async def get_channel_id(channel_name: str = CHANNEL_NAME) -> Optional[str]:
         raise
 
 
-async def get_latest_videos(channel_id: str, is_short: bool = False) -> Optional[Dict]:
+async def get_uploads_playlist_id(channel_id: str) -> Optional[str]:
     """
-    Get the latest video or short from a YouTube channel using YouTube Data API v3.
+    Get the uploads playlist ID of a YouTube channel using YouTube Data API v3.
     
     Args:
         channel_id: YouTube channel ID
-        is_short: Whether to filter for YouTube Shorts (videos < 60 seconds)
         
     Returns:
-        Dictionary with video ID if found, None otherwise
+        Uploads playlist ID if found, None otherwise
         
     Raises:
         HTTPException: If there's an error with the YouTube API request
     """
-    logger = get_logger(f"{__name__}.get_latest_videos")
-    logger.debug(f"Fetching latest {'short' if is_short else 'video'} for channel: {channel_id}")
+    logger = get_logger(f"{__name__}.get_uploads_playlist_id")
     
     try:
         api_key = await get_doppler_secret("YOUTUBE_API_KEY")
@@ -184,82 +420,217 @@ async def get_latest_videos(channel_id: str, is_short: bool = False) -> Optional
         )
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Get channel uploads playlist ID
-            channel_response = await client.get(
-                f"{YOUTUBE_API_BASE_URL}/channels",
-                params={
-                    "part": "contentDetails",
-                    "id": channel_id,
-                    "key": api_key
-                },
-                timeout=15
-            )
-            channel_response.raise_for_status()
-            channel_data = channel_response.json()
+        client = get_http_client("youtube")
+        await record_quota("channels")
+        channel_response = await client.get(
+            f"{YOUTUBE_API_BASE_URL}/channels",
+            params={
+                "part": "contentDetails",
+                "id": channel_id,
+                "key": api_key
+            }
+        )
+        channel_response.raise_for_status()
+        channel_data = channel_response.json()
+        
+        if not channel_data.get("items"):
+            logger.warning(f"No channel details found for: {channel_id}")
+            return None
             
-            if not channel_data.get("items"):
-                return None
-                
-            uploads_playlist_id = channel_data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        return channel_data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    except Exception as e:
+        logger.error(f"Unexpected error fetching channel details: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch channel information from YouTube"
+        )
+
+
+async def resolve_channel(channel_name: str = CHANNEL_NAME) -> Optional[Dict[str, Any]]:
+    """
+    Get the channel ID and uploads playlist ID, from the channel cache if possible.
+    
+    If the cached entry has expired and resolving it again fails, the
+    expired entry is used rather than failing the fetch.
+    
+    Args:
+        channel_name: The name of the YouTube channel
+        
+    Returns:
+        Dict with channel_id and uploads_playlist_id, or None if the channel does not exist
+        
+    Raises:
+        HTTPException: If there's an error with the YouTube API request
+    """
+    logger = get_logger(f"{__name__}.resolve_channel")
+    channel_cache = get_youtube_channel_cache()
+    entry = channel_cache.get(channel_name)
+    if entry is not None:
+        increment("youtube.channel_cache_hit")
+        return entry
+    
+    increment("youtube.channel_cache_miss")
+    try:
+        channel_id = await get_channel_id(channel_name)
+        uploads_playlist_id = await get_uploads_playlist_id(channel_id) if channel_id else None
+    except Exception:
+        stale_entry = channel_cache.get(channel_name, allow_stale=True)
+        if stale_entry is None:
+            raise
+        logger.warning("Failed to re-resolve YouTube channel, using expired channel cache")
+        return stale_entry
+    
+    if not channel_id or not uploads_playlist_id:
+        return None
+    return channel_cache.set(channel_name, channel_id, uploads_playlist_id)
+
+
+class _ConditionalCache:
+    """Last ETag and parsed result per YouTube endpoint, for If-None-Match revalidation"""
+    entries: Dict[str, Tuple[str, str, Any]] = {}  # path -> (request key, ETag, parsed result)
+
+
+async def _conditional_get(
+    client: httpx.AsyncClient,
+    path: str,
+    params: Dict[str, Any],
+    parse: Callable[[Dict], Any]
+) -> Tuple[Any, bool]:
+    """
+    GET a YouTube Data API resource, revalidating the last response with its ETag.
+    
+    Args:
+        client: HTTP client
+        path: Endpoint path under YOUTUBE_API_BASE_URL
+        params: Query parameters
+        parse: Turns the JSON response into the result that is stored and returned
+        
+    Returns:
+        Tuple of (parsed result, whether it changed since the last request)
+        
+    Raises:
+        httpx.HTTPStatusError: If the API returns an error status
+    """
+    request_key = json.dumps({k: v for k, v in params.items() if k != "key"}, sort_keys=True)
+    entry = _ConditionalCache.entries.get(path)
+    headers = {}
+    if entry is not None and entry[0] == request_key:
+        headers["If-None-Match"] = entry[1]
+    
+    await record_quota(path)
+    response = await client.get(f"{YOUTUBE_API_BASE_URL}/{path}", params=params, headers=headers)
+    if response.status_code == status.HTTP_304_NOT_MODIFIED and headers:
+        increment(f"youtube.not_modified.{path}")
+        return entry[2], False
+    response.raise_for_status()
+    
+    result = parse(response.json())
+    etag = response.headers.get("ETag")
+    if etag:
+        _ConditionalCache.entries[path] = (request_key, etag, result)
+    return result, True
+
+
+def _classify_uploads(video_details: Dict) -> Dict[str, Optional[Dict]]:
+    """Pick the latest public regular video and short from a /videos response"""
+    logger = get_logger(f"{__name__}.get_latest_uploads")
+    latest: Dict[str, Optional[Dict]] = {'video': None, 'short': None}
+    if not video_details.get("items"):
+        logger.warning("No video details found for any videos")
+        return latest
+    
+    # Classify videos in order, keeping the first of each type
+    for video_info in video_details["items"]:
+        # Skip unplayable videos
+        if video_info.get("status", {}).get("privacyStatus") != "public":
+            continue
             
-            # Get multiple recent videos from the uploads playlist
-            videos_response = await client.get(
-                f"{YOUTUBE_API_BASE_URL}/playlistItems",
-                params={
+        duration = video_info["contentDetails"]["duration"]
+        video_id = video_info["id"]
+        
+        # Check if this is a short (less than 60 seconds)
+        is_video_short = "M" not in duration and "H" not in duration and "S" in duration
+        cache_key = 'short' if is_video_short else 'video'
+        
+        if latest[cache_key] is None:
+            logger.debug(f"Found latest {'short' if is_video_short else 'regular'} video: {video_id}")
+            latest[cache_key] = {"id": video_id, "is_short": is_video_short}
+            if latest['video'] is not None and latest['short'] is not None:
+                break
+    
+    for cache_key, video in latest.items():
+        if video is None:
+            logger.debug(f"No {'short' if cache_key == 'short' else 'regular'} videos found in the first {len(video_details['items'])} videos")
+    return latest
+
+
+async def get_latest_uploads(uploads_playlist_id: str) -> Tuple[Dict[str, Optional[Dict]], bool]:
+    """
+    Get the latest regular video and the latest short from a channel's uploads
+    playlist using YouTube Data API v3, in a single pass over the recent uploads.
+    
+    Both requests are conditional: when YouTube answers 304 Not Modified the
+    result parsed from the previous response is reused.
+    
+    Args:
+        uploads_playlist_id: The channel's uploads playlist ID
+        
+    Returns:
+        Tuple of (dictionary with 'video' and 'short' entries, each None if not
+        found; whether anything changed since the previous call)
+        
+    Raises:
+        HTTPException: If there's an error with the YouTube API request
+    """
+    logger = get_logger(f"{__name__}.get_latest_uploads")
+    logger.debug(f"Fetching latest uploads from playlist: {uploads_playlist_id}")
+    
+    try:
+        api_key = await get_doppler_secret("YOUTUBE_API_KEY")
+    except Exception as e:
+        logger.error(f"Failed to get YouTube API key from Doppler: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server configuration error: Missing YouTube API key"
+        )
+    
+    try:
+        client = get_http_client("youtube")
+        # Get multiple recent videos from the uploads playlist
+        try:
+            video_ids, playlist_changed = await _conditional_get(
+                client,
+                "playlistItems",
+                {
                     "part": "contentDetails",
                     "playlistId": uploads_playlist_id,
                     "key": api_key,
                     "maxResults": 50  # Get enough videos to find both a short and regular video
                 },
-                timeout=15
+                lambda data: [item["contentDetails"]["videoId"] for item in data.get("items", [])]
             )
-            videos_response.raise_for_status()
-            videos_data = videos_response.json()
-            
-            if not videos_data.get("items"):
-                return None
-            
-            # Get video IDs in batches of 50 (YouTube API limit)
-            video_ids = [item["contentDetails"]["videoId"] for item in videos_data["items"]]
-            
-            # Get video details in a single batch request
-            video_response = await client.get(
-                f"{YOUTUBE_API_BASE_URL}/videos",
-                params={
-                    "part": "contentDetails,status",
-                    "id": ",".join(video_ids),
-                    "key": api_key
-                },
-                timeout=15
-            )
-            video_response.raise_for_status()
-            video_details = video_response.json()
-            
-            if not video_details.get("items"):
-                logger.warning("No video details found for any videos")
-                return None
-            
-            # Process videos in order until we find the first matching video
-            for video_info in video_details["items"]:
-                # Skip unplayable videos
-                if video_info.get("status", {}).get("privacyStatus") != "public":
-                    continue
-                    
-                duration = video_info["contentDetails"]["duration"]
-                video_id = video_info["id"]
-                
-                # Check if this is a short (less than 60 seconds)
-                is_video_short = "M" not in duration and "H" not in duration and "S" in duration
-                
-                # If we found a video of the requested type, return it
-                if is_short == is_video_short:
-                    logger.debug(f"Found matching {'short' if is_short else 'regular'} video: {video_id}")
-                    return {"id": video_id, "is_short": is_video_short}
-            
-            logger.debug(f"No {'short' if is_short else 'regular'} videos found in the first {len(video_ids)} videos")
-
-            return None
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == status.HTTP_404_NOT_FOUND:
+                # The cached playlist is gone; resolve the channel again next time
+                logger.warning(f"Uploads playlist not found: {uploads_playlist_id}")
+                get_youtube_channel_cache().invalidate()
+            raise
+        
+        if not video_ids:
+            return {'video': None, 'short': None}, playlist_changed
+        
+        # Get video details in a single batch request (50 IDs is the API limit)
+        latest, videos_changed = await _conditional_get(
+            client,
+            "videos",
+            {
+                "part": "contentDetails,status",
+                "id": ",".join(video_ids),
+                "key": api_key
+            },
+            _classify_uploads
+        )
+        return latest, playlist_changed or videos_changed
     except Exception as e:
         logger.error(f"Unexpected error fetching videos: {str(e)}")
         raise HTTPException(
@@ -268,10 +639,141 @@ async def get_latest_videos(channel_id: str, is_short: bool = False) -> Optional
         )
 
 
+async def _fetch_and_cache_uploads() -> Dict[str, Optional[Dict]]:
+    """Fetch the latest video and short together and update both cache entries"""
+    logger = get_logger(f"{__name__}.refresh_latest_uploads")
+    
+    if await is_quota_over_budget():
+        increment("youtube.quota.fetch_skipped")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="YouTube quota budget reached"
+        )
+    
+    channel = await resolve_channel()
+    if not channel:
+        logger.warning("YouTube channel not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="YouTube channel not found"
+        )
+    
+    logger.debug(f"Found channel ID: {channel['channel_id']}, fetching latest uploads")
+    latest, changed = await get_latest_uploads(channel['uploads_playlist_id'])
+    
+    # Update cache; a type missing from this batch keeps its last good value
+    cache = get_youtube_cache()
+    for cache_key, video in latest.items():
+        if video is None:
+            continue
+        if changed:
+            cache.set(cache_key, video)
+        else:
+            cache.touch(cache_key)
+    logger.info(f"{'Updated' if changed else 'Revalidated'} video and short cache")
+    
+    return latest
+
+
+class _UploadsFetch:
+    """The combined YouTube fetch currently in flight, shared by all callers"""
+    task: Optional[asyncio.Task] = None
+
+
+async def refresh_latest_uploads() -> Dict[str, Optional[Dict]]:
+    """
+    Fetch the latest video and short from YouTube Data API v3 and update the
+    cache, joining any fetch already in flight.
+    
+    Returns:
+        Dictionary with 'video' and 'short' entries, each None if not found
+        
+    Raises:
+        HTTPException: If channel not found or the YouTube API request fails
+    """
+    if _UploadsFetch.task is None or _UploadsFetch.task.done():
+        _UploadsFetch.task = asyncio.create_task(_fetch_and_cache_uploads())
+    # Shield so a cancelled caller does not cancel the shared fetch
+    return await asyncio.shield(_UploadsFetch.task)
+
+
+def get_refresh_period() -> int:
+    """Seconds between background revalidations of the cache entries"""
+    settings = get_settings().youtube
+    return min(settings.cache_ttl - settings.refresh_lead, settings.refresh_interval)
+
+
+def get_cache_lifetime(cache_key: str) -> Tuple[int, int]:
+    """
+    How long clients may cache a response built from a cache entry.
+    
+    Responses are fresh until the entry's next scheduled revalidation and may
+    be served stale for one more period while the client revalidates.
+    
+    Args:
+        cache_key: YouTubeCache key ('video' or 'short')
+        
+    Returns:
+        Tuple of (max-age, stale-while-revalidate) in seconds
+    """
+    period = get_refresh_period()
+    age = time.time() - get_youtube_cache().get_timestamp(cache_key)
+    return max(0, int(period - age)), period
+
+
+def schedule_uploads_refresh() -> None:
+    """Start a combined fetch in the background unless one is already running"""
+    if _UploadsFetch.task is not None and not _UploadsFetch.task.done():
+        return
+    _UploadsFetch.task = asyncio.create_task(_fetch_and_cache_uploads())
+    _UploadsFetch.task.add_done_callback(_log_background_fetch_result)
+
+
+def _log_background_fetch_result(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        # The cached values stay in place and the refresher retries on its schedule
+        get_logger(__name__).warning(f"Background YouTube fetch failed - Error: {str(task.exception())}")
+
+
+def handle_upload_notification(video_ids: List[str]) -> List[str]:
+    """
+    Invalidate the cache entries affected by changed videos and refetch them
+    in the background.
+    
+    A video already in the cache only affects its own entry; any other video
+    may be a new upload of either type, so it affects every entry.
+    
+    Args:
+        video_ids: IDs of videos that were published, updated or deleted
+        
+    Returns:
+        List of invalidated cache keys
+    """
+    cache = get_youtube_cache()
+    cached = {cache_key: cache.get_cached_id(cache_key) for cache_key in ('video', 'short')}
+    affected = set()
+    for video_id in video_ids:
+        matching = [cache_key for cache_key, cached_id in cached.items() if cached_id == video_id]
+        affected.update(matching or cached.keys())
+    
+    for cache_key in sorted(affected):
+        cache.invalidate(cache_key)
+    if affected:
+        token = quota_consumer.set("websub")
+        try:
+            schedule_uploads_refresh()
+        finally:
+            quota_consumer.reset(token)
+    return sorted(affected)
+
+
 async def get_latest_video() -> Dict:
     """
     Get the latest regular video from the channel using cache or YouTube Data API v3.
     
+    Once the cache has been filled, this always answers from it (even past
+    the TTL); keeping it fresh is the background refresher's job.
+    
     Returns:
         Dictionary containing video details
         
@@ -283,37 +785,19 @@ async def get_latest_video() -> Dict:
     
     # Try to get from cache first
     cache = get_youtube_cache()
-    cached_video = cache.get('video')
+    cached_video = cache.get('video', allow_stale=True)
     if cached_video:
         logger.info("Returning cached video")
         return cached_video
     
     logger.info("Cache miss, fetching from YouTube API")
-    channel_id = await get_channel_id()
-    if not channel_id:
-        logger.warning("YouTube channel not found")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="YouTube channel not found"
-        )
-    
-    logger.debug(f"Found channel ID: {channel_id}, fetching latest video")
-    video = await get_latest_videos(channel_id, is_short=False)
-    
+    video = (await refresh_latest_uploads())['video']
     if not video:
         logger.warning("No regular videos found for channel")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No videos found"
         )
-    
-    logger.debug(f"Found video with ID: {video.get('id')}")
-    
-    # Update cache
-    cache = get_youtube_cache()
-    cache.set('video', video)
-    logger.info("Updated video cache")
-    
     return video
 
 
@@ -321,6 +805,9 @@ async def get_latest_short() -> Dict:
     """
     Get the latest short from the channel using cache or YouTube Data API v3.
     
+    Once the cache has been filled, this always answers from it (even past
+    the TTL); keeping it fresh is the background refresher's job.
+    
     Returns:
         Dictionary containing short video details
         
@@ -332,35 +819,136 @@ async def get_latest_short() -> Dict:
     
     # Try to get from cache first
     cache = get_youtube_cache()
-    cached_short = cache.get('short')
+    cached_short = cache.get('short', allow_stale=True)
     if cached_short:
         logger.info("Returning cached short")
         return cached_short
     
     logger.info("Cache miss, fetching from YouTube API")
-    channel_id = await get_channel_id()
-    if not channel_id:
-        logger.warning("YouTube channel not found")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="YouTube channel not found"
-        )
-    
-    logger.debug(f"Found channel ID: {channel_id}, fetching latest short")
-    video = await get_latest_videos(channel_id, is_short=True)
-    
-    if not video:
+    short = (await refresh_latest_uploads())['short']
+    if not short:
         logger.warning("No short videos found for channel")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No shorts found"
         )
+    return short
+
+
+class YouTubeRefresher:
+    """
+    Singleton background task that refreshes the YouTubeCache entries before
+    they expire, so user requests never wait on the YouTube API.
     
-    logger.debug(f"Found short with ID: {video.get('id')}")
-    
-    # Update cache
-    cache = get_youtube_cache()
-    cache.set('short', video)
-    logger.info("Updated short video cache")
-    
-    return video
+    Entries are revalidated every refresh_interval seconds, and at the latest
+    refresh_lead seconds before their TTL runs out, minus random jitter. A
+    failed refresh leaves the last good value in place and is retried with
+    exponential backoff.
+    """
+    _instance: Optional['YouTubeRefresher'] = None
+    _max_sleep: float = 60.0  # Re-evaluate the schedule at least this often
+    _max_retry_delay: float = 3600.0
+
+    def __init__(self):
+        self._logger = get_logger(__name__)
+        # Each job refreshes the listed cache keys together
+        self._refreshers: Dict[str, Callable[[], Awaitable[Dict]]] = {
+            'uploads': refresh_latest_uploads
+        }
+        self._cache_keys: Dict[str, Tuple[str, ...]] = {
+            'uploads': ('video', 'short')
+        }
+        self._task: Optional[asyncio.Task] = None
+        self._jitter: Dict[str, float] = {key: self._new_jitter() for key in self._refreshers}
+        self._retry_at: Dict[str, float] = {}
+        self._last_attempt: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {key: 0 for key in self._refreshers}
+
+    @classmethod
+    def get_instance(cls) -> 'YouTubeRefresher':
+        """Get or create the singleton instance"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _new_jitter() -> float:
+        """Fraction of the allowed jitter to refresh early by"""
+        return random.random()
+
+    def start(self) -> None:
+        """Start the background refresh loop"""
+        if self._task is None or self._task.done():
+            self._logger.info("Starting YouTube cache refresher")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background refresh loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _next_refresh_time(self, job: str) -> float:
+        """When the given refresh job should next run"""
+        if job in self._retry_at:
+            return self._retry_at[job]
+        # Entries are written together; one may lag if the last fetch had nothing new for it.
+        # A refresh that stored nothing (e.g. an empty playlist) still counts as the last run
+        cache = get_youtube_cache()
+        timestamp = max(
+            self._last_attempt.get(job, 0.0),
+            *(cache.get_timestamp(cache_key) for cache_key in self._cache_keys[job])
+        )
+        # Revalidating is cheap, so check every refresh_interval even though the TTL is much longer
+        period = get_refresh_period()
+        jitter = self._jitter[job] * min(get_settings().youtube.refresh_jitter, period / 2)
+        return timestamp + period - jitter
+
+    async def _run(self) -> None:
+        quota_consumer.set("refresher")
+        while True:
+            job, refresh_time = min(
+                ((key, self._next_refresh_time(key)) for key in self._refreshers),
+                key=lambda item: item[1]
+            )
+            delay = refresh_time - time.time()
+            if delay > 0:
+                await asyncio.sleep(min(delay, self._max_sleep))
+                continue
+            await self._refresh(job)
+
+    async def _refresh(self, job: str) -> None:
+        """Run one refresh job, scheduling a retry if it fails"""
+        self._last_attempt[job] = time.time()
+        try:
+            await self._refreshers[job]()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failures[job] += 1
+            delay = min(
+                self._max_retry_delay,
+                get_settings().youtube.retry_delay * (2 ** (self._failures[job] - 1))
+            )
+            delay = random.uniform(delay / 2, delay)
+            self._retry_at[job] = time.time() + delay
+            increment(f"youtube.refresh_failure.{job}")
+            self._logger.warning(
+                f"Background refresh of {job} failed, keeping cached value. "
+                f"Retrying in {delay:.0f}s - Error: {str(e)}"
+            )
+            return
+
+        self._failures[job] = 0
+        self._retry_at.pop(job, None)
+        self._jitter[job] = self._new_jitter()
+        increment(f"youtube.refresh_success.{job}")
+
+
+def get_youtube_refresher() -> YouTubeRefresher:
+    """Get the singleton instance of YouTubeRefresher."""
+    return YouTubeRefresher.get_instance()
@@ -0,0 +1,63 @@
+"""
+Benchmark: consumed-nonce store insert and lookup throughput.
+
+Measures first-use inserts and replay lookups for the in-process timing wheel
+and the shared file-backed table, with the clock advancing so expiry runs.
+
+Run from the backend directory:
+    ENV=development python -m benchmarks.bench_nonce
+"""
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("ENV", "development")
+
+from app.utilities.logger import init_logger
+
+init_logger(log_level=logging.WARNING)
+
+from app.utilities.nonce_store import SharedNonceTable, TimingWheelNonceIndex
+
+
+OPERATIONS = 200000
+CAPACITY = 65536
+HORIZON = 600
+TOKEN_LIFETIME = 300
+RATE_PER_SECOND = 100  # Simulated tokens per second of clock time
+
+
+def run(name: str, store) -> None:
+    nonces = [os.urandom(8) for _ in range(OPERATIONS)]
+    start_clock = int(time.time())
+
+    start = time.perf_counter()
+    for i, nonce in enumerate(nonces):
+        now = start_clock + i // RATE_PER_SECOND
+        assert store.consume(nonce, now + TOKEN_LIFETIME, now=now)
+    insert_elapsed = time.perf_counter() - start
+
+    # Replays of recent, still-live tokens
+    recent = nonces[-(TOKEN_LIFETIME * RATE_PER_SECOND) // 2:]
+    now = start_clock + (OPERATIONS - 1) // RATE_PER_SECOND
+    start = time.perf_counter()
+    for nonce in recent:
+        assert not store.consume(nonce, now + TOKEN_LIFETIME, now=now)
+    lookup_elapsed = time.perf_counter() - start
+
+    print(
+        f"{name:>14}: insert {OPERATIONS / insert_elapsed:>10,.0f} ops/s, "
+        f"replay lookup {len(recent) / lookup_elapsed:>10,.0f} ops/s"
+    )
+
+
+def main() -> None:
+    run("timing wheel", TimingWheelNonceIndex(CAPACITY, HORIZON))
+    with tempfile.TemporaryDirectory() as tmp:
+        run("shared table", SharedNonceTable(Path(tmp) / "nonces.table", CAPACITY))
+
+
+if __name__ == "__main__":
+    main()
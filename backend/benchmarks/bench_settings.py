@@ -0,0 +1,42 @@
+"""
+Microbenchmark: per-call cost of reading configuration.
+
+Compares re-parsing the INI file on every call (the old get_cfg() behaviour)
+with the memoized get_settings().
+
+Run from the backend directory:
+    ENV=development python -m benchmarks.bench_settings
+"""
+import os
+import timeit
+from configparser import ConfigParser
+
+os.environ.setdefault("ENV", "development")
+
+from app.utilities.settings import get_config_path, get_settings
+
+
+ITERATIONS = 20000
+
+
+def parse_every_call() -> str:
+    """Old behaviour: build a ConfigParser and read the file each time"""
+    cfg = ConfigParser()
+    cfg.read(get_config_path())
+    return cfg.get("STRIPE", "payment_method_configuration_id")
+
+
+def memoized() -> str:
+    """New behaviour: cached, typed settings object"""
+    return get_settings().stripe.payment_method_configuration_id
+
+
+def main() -> None:
+    for name, func in (("parse every call", parse_every_call), ("get_settings()", memoized)):
+        func()  # Prime caches
+        total = min(timeit.repeat(func, number=ITERATIONS, repeat=3))
+        print(f"{name:>18}: {total / ITERATIONS * 1e6:8.3f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Microbenchmark: checkout token size and sign/verify cost.
+
+Compares the legacy base64(JSON) token format with the compact binary format.
+
+Run from the backend directory:
+    ENV=development python -m benchmarks.bench_tokens
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import timeit
+
+os.environ.setdefault("ENV", "development")
+
+from app.utilities.logger import init_logger
+
+init_logger(log_level=logging.WARNING)
+
+from app.utilities.catalog import get_catalog
+from app.utilities.hmac import sign_compact_token, verify_compact_token, _verify_legacy_token
+from app.utilities.keyring import HmacKeyring
+
+
+ITERATIONS = 20000
+SECRET = b"benchmark-secret-key"
+
+
+def sign_legacy(secret: bytes, data: dict) -> str:
+    """The original token encoding"""
+    json_data = json.dumps(data, sort_keys=True).encode('utf-8')
+    signature = hmac.new(secret, json_data, hashlib.sha256).digest()
+    token_data = {'data': data, 'signature': base64.b64encode(signature).decode('utf-8')}
+    return base64.b64encode(json.dumps(token_data).encode('utf-8')).decode('utf-8')
+
+
+def main() -> None:
+    keyring = HmacKeyring()
+    keyring.load({"HMAC_SECRET_KEY": SECRET.decode('utf-8')})
+    now = int(time.time())
+    data = {'price_ids': list(get_catalog().price_ids), 'created_at': now, 'expires_at': now + 300}
+
+    legacy_token = sign_legacy(SECRET, data)
+    compact_token = sign_compact_token(keyring, data)
+    assert _verify_legacy_token(keyring, legacy_token)['price_ids'] == data['price_ids']
+    assert verify_compact_token(keyring, compact_token)['price_ids'] == data['price_ids']
+
+    print(f"{'token size':>16}: legacy {len(legacy_token)} chars, compact {len(compact_token)} chars")
+    cases = (
+        ("sign legacy", lambda: sign_legacy(SECRET, data)),
+        ("sign compact", lambda: sign_compact_token(keyring, data)),
+        ("verify legacy", lambda: _verify_legacy_token(keyring, legacy_token)),
+        ("verify compact", lambda: verify_compact_token(keyring, compact_token)),
+    )
+    for name, func in cases:
+        total = min(timeit.repeat(func, number=ITERATIONS, repeat=3))
+        print(f"{name:>16}: {total / ITERATIONS * 1e6:8.3f} us/call")
+
+
+if __name__ == "__main__":
+    main()
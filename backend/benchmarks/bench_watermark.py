@@ -0,0 +1,92 @@
+"""
+Benchmark: per-buyer watermark throughput.
+
+Compares stamping by rewriting the whole PDF with pikepdf against the
+incremental update of pdf_stamp (template parsed once per process), in one
+process and across a process pool like the watermark renderer's.
+
+Run from the backend directory:
+    ENV=development python -m benchmarks.bench_watermark
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("ENV", "development")
+
+from app.utilities.logger import init_logger
+
+init_logger(log_level=logging.WARNING)
+
+import pikepdf
+
+from app.utilities.catalog import get_catalog
+from app.utilities.pdf_stamp import get_stamp_template, stamp_pdf
+
+
+ITERATIONS = 50
+FONT_SIZE = 7.0
+
+
+def stamp_rewrite(path: str, text: str, destination: str) -> int:
+    """Naive stamping: parse, add a content stream to every page, save the whole file"""
+    with pikepdf.open(path) as pdf:
+        font = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name.Helvetica
+        ))
+        for page in pdf.pages:
+            page.add_resource(font, pikepdf.Name.Font, "/BOWm")
+            page.contents_add(pikepdf.Stream(pdf, b"q BT /BOWm %g Tf 18 9 Td (%s) Tj ET Q" % (
+                FONT_SIZE, text.encode('latin-1')
+            )))
+        pdf.save(destination)
+        return len(pdf.pages)
+
+
+def stamp_batch(sources: list, destination_dir: str, count: int) -> int:
+    """Pool job: stamp each source count times with distinct texts"""
+    pages = 0
+    for i in range(count):
+        for path, mtime_ns in sources:
+            destination = os.path.join(destination_dir, f"{os.getpid()}-{i}-{os.path.basename(path)}")
+            pages += stamp_pdf(path, mtime_ns, f"Licensed to buyer{i}@example.com - Order pi_{i}", destination, FONT_SIZE)
+    return pages
+
+
+def main() -> None:
+    sources = [(str(program.pdf_path), program.pdf_path.stat().st_mtime_ns) for program in get_catalog().programs]
+    with tempfile.TemporaryDirectory() as destination_dir:
+        destination = os.path.join(destination_dir, "stamped.pdf")
+
+        for name, stamp in (
+            ("rewrite", lambda path, mtime_ns, text: stamp_rewrite(path, text, destination)),
+            ("incremental", lambda path, mtime_ns, text: stamp_pdf(path, mtime_ns, text, destination, FONT_SIZE)),
+        ):
+            pages = 0
+            start = time.perf_counter()
+            for i in range(ITERATIONS):
+                for path, mtime_ns in sources:
+                    pages += stamp(path, mtime_ns, f"Licensed to buyer{i}@example.com - Order pi_{i}")
+            elapsed = time.perf_counter() - start
+            print(f"{name:>12}: {pages / elapsed:8.0f} pages/s in one process ({elapsed / (ITERATIONS * len(sources)) * 1e3:.2f} ms/file)")
+
+        first_update = len(get_stamp_template(*sources[0]).render_update("Licensed to buyer@example.com - Order pi_0", FONT_SIZE))
+        print(f"{'update size':>12}: {first_update} bytes appended to {os.path.basename(sources[0][0])}")
+
+        processes = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Start the processes and parse the templates before timing
+            list(pool.map(stamp_batch, [sources] * processes, [destination_dir] * processes, [1] * processes))
+            start = time.perf_counter()
+            pages = sum(pool.map(
+                stamp_batch, [sources] * processes, [destination_dir] * processes, [ITERATIONS] * processes
+            ))
+            elapsed = time.perf_counter() - start
+        print(f"{'pool':>12}: {pages / elapsed:8.0f} pages/s with {processes} processes ({pages / elapsed / processes:.0f} pages/s per core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Local stand-in for the YouTube WebSub hub, for testing the subscriber and
+callback endpoints without a public callback URL.
+
+It accepts subscription requests, verifies them against the callback like
+the real hub (GET with hub.challenge and hub.verify_token), and publishes
+signed Atom notifications for made-up uploads on request.
+
+Run from the backend directory:
+    python -m scripts.websub_hub --port 8001
+
+then point the dev server at it in app/conf/dev.ini:
+    [WEBSUB]
+    enabled=true
+    hub_url=http://localhost:8001/subscribe
+
+and publish an upload (or a deletion) to every verified subscriber:
+    curl -X POST 'http://localhost:8001/publish?video_id=abc123'
+    curl -X POST 'http://localhost:8001/publish?video_id=abc123&deleted=true'
+"""
+import argparse
+import hashlib
+import hmac
+import logging
+import secrets
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import uvicorn
+from fastapi import BackgroundTasks, FastAPI, Form, Response
+
+
+logger = logging.getLogger("websub_hub")
+
+ATOM_ENTRY = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <title>YouTube video feed</title>
+  <entry>
+    <id>yt:video:{video_id}</id>
+    <yt:videoId>{video_id}</yt:videoId>
+    <yt:channelId>{channel_id}</yt:channelId>
+    <title>Stand-in upload {video_id}</title>
+    <published>{now}</published>
+    <updated>{now}</updated>
+  </entry>
+</feed>
+"""
+
+ATOM_DELETED_ENTRY = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:at="http://purl.org/atompub/tombstones/1.0" xmlns="http://www.w3.org/2005/Atom">
+  <at:deleted-entry ref="yt:video:{video_id}" when="{now}"/>
+</feed>
+"""
+
+app = FastAPI(title="Stand-in WebSub hub")
+
+# (callback, topic) -> secret, for subscriptions the callback has confirmed
+subscriptions: Dict[Tuple[str, str], str] = {}
+
+
+async def verify_intent(mode: str, callback: str, topic: str, verify_token: str, lease_seconds: str, secret: str) -> None:
+    """Confirm a (un)subscription with the callback, as the hub does asynchronously"""
+    challenge = secrets.token_urlsafe(16)
+    params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge, "hub.verify_token": verify_token}
+    if mode == "subscribe":
+        params["hub.lease_seconds"] = lease_seconds
+    async with httpx.AsyncClient() as client:
+        response = await client.get(callback, params=params)
+
+    if response.status_code // 100 != 2 or response.text != challenge:
+        logger.warning(f"Callback did not confirm {mode} - Callback: {callback}, Status: {response.status_code}")
+        return
+    if mode == "subscribe":
+        subscriptions[(callback, topic)] = secret
+    else:
+        subscriptions.pop((callback, topic), None)
+    logger.info(f"Verified {mode} - Callback: {callback}, Topic: {topic}")
+
+
+@app.post("/subscribe", status_code=202)
+async def subscribe(
+    background_tasks: BackgroundTasks,
+    callback: str = Form(..., alias="hub.callback"),
+    mode: str = Form(..., alias="hub.mode"),
+    topic: str = Form(..., alias="hub.topic"),
+    verify_token: str = Form("", alias="hub.verify_token"),
+    lease_seconds: str = Form("432000", alias="hub.lease_seconds"),
+    secret: str = Form("", alias="hub.secret"),
+) -> Response:
+    """Accept a subscription request and verify it after responding"""
+    if mode not in ("subscribe", "unsubscribe"):
+        return Response(status_code=400, content=f"Unsupported hub.mode: {mode}")
+    logger.info(f"Received {mode} request - Callback: {callback}, Topic: {topic}")
+    background_tasks.add_task(verify_intent, mode, callback, topic, verify_token, lease_seconds, secret)
+    return Response(status_code=202)
+
+
+@app.post("/publish")
+async def publish(video_id: str, deleted: bool = False) -> Dict[str, int]:
+    """Push a signed notification about a video to every verified subscriber"""
+    now = datetime.now(timezone.utc).isoformat()
+    results = {}
+    async with httpx.AsyncClient() as client:
+        for (callback, topic), secret in subscriptions.items():
+            channel_id = parse_qs(urlsplit(topic).query).get("channel_id", [""])[0]
+            template = ATOM_DELETED_ENTRY if deleted else ATOM_ENTRY
+            body = template.format(video_id=video_id, channel_id=channel_id, now=now).encode('utf-8')
+            headers = {"Content-Type": "application/atom+xml"}
+            if secret:
+                signature = hmac.new(secret.encode('utf-8'), body, hashlib.sha1).hexdigest()
+                headers["X-Hub-Signature"] = f"sha1={signature}"
+            response = await client.post(callback, content=body, headers=headers)
+            results[callback] = response.status_code
+            logger.info(f"Published {video_id} - Callback: {callback}, Status: {response.status_code}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in WebSub hub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,27 @@ import { getBaseUrl } from '../utils/helpers';
 
 type VideoType = 'youtube' | 'short' | 'tiktok';
 
+type LatestFeed = Record<VideoType, { video_id: string } | null>;
+
+// Loaders that mount together share one /api/latest request
+let pendingFeed: Promise<LatestFeed> | null = null;
+
+const fetchLatestFeed = (): Promise<LatestFeed> => {
+  if (!pendingFeed) {
+    pendingFeed = fetch(`${getBaseUrl()}/api/latest`)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error('Failed to fetch latest videos');
+        }
+        return response.json();
+      })
+      .finally(() => {
+        pendingFeed = null;
+      });
+  }
+  return pendingFeed;
+};
+
 interface VideoLoaderProps {
   type: VideoType;
   children: (props: { videoId: string }) => React.ReactNode;
@@ -20,20 +41,9 @@ const VideoLoader: React.FC<VideoLoaderProps> = ({ type, children }) => {
         setIsLoading(true);
         setError(null);
         
-        const baseUrl = getBaseUrl();
-        const endpoint = 
-          type === 'youtube' ? `${baseUrl}/api/latest/youtube` :
-          type === 'short' ? `${baseUrl}/api/latest/short` :
-          `${baseUrl}/api/latest/tiktok`;
-        
-        const response = await fetch(endpoint);
-        
-        if (!response.ok) {
-          throw new Error(`Failed to fetch ${type} video`);
-        }
-        
-        const data = await response.json();
-        if (!data.video_id) {
+        const feed = await fetchLatestFeed();
+        const data = feed[type];
+        if (!data?.video_id) {
           throw new Error('No video ID returned');
         }
         setVideoId(data.video_id);